@@ -5,15 +5,20 @@ from linebot.v3 import WebhookHandler
 from linebot.v3.exceptions import InvalidSignatureError
 from linebot.v3.messaging import (
     Configuration, ApiClient, MessagingApi, ReplyMessageRequest,
-    TextMessage, FlexMessage, FlexContainer, QuickReply, QuickReplyItem,
-    MessageAction, PushMessageRequest
+    TextMessage, FlexMessage, FlexContainer, PushMessageRequest,
+    MulticastRequest, BroadcastRequest
 )
+from linebot.v3.insight import ApiClient as InsightApiClient, Insight
 from linebot.v3.webhooks import MessageEvent, TextMessageContent, FollowEvent
 from datetime import datetime, date, timedelta
 import os
 from supabase import create_client, Client
 import re
 import time
+import hmac
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 from dotenv import load_dotenv
 import tempfile
 
@@ -24,36 +29,47 @@ from contact_management import (
     validate_phone_number, search_contacts_multi_keyword, add_contact, 
     edit_contact, delete_contact, get_all_contacts, export_contacts_to_excel,
     create_contact_flex_message, search_contacts_by_category, get_contacts_stats,
-    bulk_search_contacts
+    search_contacts_page, contact_store, search_cache, local_replica, replica_table, fuzzy_index
 )
+from command_matcher import command_matcher
+from quick_replies import (
+    get_quick_reply, create_main_quick_reply, create_admin_quick_reply, create_contact_quick_reply,
+    create_smart_search_quick_reply, create_cancel_quick_reply, create_comprehensive_quick_reply,
+    create_event_quick_reply, create_compact_contact_quick_reply, create_all_commands_quick_reply,
+    create_search_commands_quick_reply, create_admin_all_commands_quick_reply,
+    create_date_commands_quick_reply, create_pagination_quick_reply, create_delete_confirm_quick_reply,
+    create_date_quick_reply, create_edit_date_quick_reply, create_suggestion_quick_reply
+)
+from fast_reply import static_text_payload, text_payload, flex_payload, send_reply_payloads
+from query_specs import select_spec, count_query, execute_count, count_rows, ilike_any_filter
+from notification_scheduler import scheduler_enabled, create_scheduler_from_env
+from notification_ledger import reminder_kind, fetch_delivered, plan_deliveries, DeliveryRecorder
+from broadcast_executor import create_broadcast_executor_from_env
+from notification_templates import NotificationTemplates
+from thai_dates import format_thai_date
+from subscriber_registry import create_subscriber_registry_from_env
+from change_feed import ChangeFeed, start_change_feed_from_env
+from snapshot_store import create_snapshot_from_env
+from user_state_store import create_user_state_store_from_env
+from event_store import create_event_store_from_env
+from event_search import EventSearchIndex, parse_search_query
+from event_date_index import EventDateIndex
+from message_quota import (
+    create_quota_tracker_from_env, format_plan_preview, is_quota_error, is_rate_limit_error, chunked,
+    MULTICAST_MAX_RECIPIENTS, MAX_MESSAGES_PER_REQUEST, RATE_LIMIT_BACKOFF_SECONDS
+)
+
 # Contact management helper functions (inline to avoid circular imports)
 def convert_thai_to_english_command(text):
     """Convert Thai natural language to English commands"""
     text = text.lower().strip()
-    
-    # เพิ่มเบอร์ commands
-    add_patterns = ["เพิ่มเบอร์", "บันทึกเบอร์", "เพิ่มชื่อ", "บันทึกชื่อ", "เก็บเบอร์"]
-    # ค้นหา commands  
-    search_patterns = ["หาเบอร์", "ค้นหา", "หาชื่อ", "เบอร์ของ", "ชื่อ", "เบอร์", "หา"]
-    
-    # Check if it's an add command
-    for pattern in add_patterns:
-        if text.startswith(pattern):
-            remaining = text.replace(pattern, "").strip()
-            if remaining:
-                return f"add_phone {remaining}"
-            else:
-                return "add_phone "
-    
-    # Check if it's a search command
-    for pattern in search_patterns:
-        if text.startswith(pattern):
-            remaining = text.replace(pattern, "").strip()
-            if remaining:
-                return f"search_phone {remaining}"
-            else:
-                return "search_phone "
-    
+
+    # Single-pass longest-prefix match over all intents (add_phone, search_phone, ...)
+    match = command_matcher.match(text)
+    if match:
+        intent, remaining = match
+        return f"{intent} {remaining}"
+
     return text
 
 def detect_incomplete_command(text):
@@ -78,36 +94,14 @@ def detect_incomplete_command(text):
     
     return None
 
-def create_contact_quick_reply():
-    """Create quick reply for contact management"""
-    return QuickReply(items=[
-        QuickReplyItem(action=MessageAction(label="📞 เพิ่มเบอร์", text="เพิ่มเบอร์ ")),
-        QuickReplyItem(action=MessageAction(label="🔍 ค้นหาอัจฉริยะ", text="ค้นหาเบอร์อัจฉริยะ")),
-        QuickReplyItem(action=MessageAction(label="📊 สถิติเบอร์", text="สถิติเบอร์")),
-        QuickReplyItem(action=MessageAction(label="📄 ส่งออกข้อมูล", text="ส่งออกเบอร์")),
-        QuickReplyItem(action=MessageAction(label="🏠 เมนูหลัก", text="สวัสดี"))
-    ])
-
-def create_smart_search_quick_reply():
-    """Create smart search quick reply for large datasets"""
-    return QuickReply(items=[
-        QuickReplyItem(action=MessageAction(label="📱 มือถือ", text="หาเบอร์ mobile")),
-        QuickReplyItem(action=MessageAction(label="☎️ บ้าน", text="หาเบอร์ landline")),
-        QuickReplyItem(action=MessageAction(label="🕐 ล่าสุด", text="หาเบอร์ recent")),
-        QuickReplyItem(action=MessageAction(label="📋 ทั้งหมด", text="เบอร์ทั้งหมด")),
-        QuickReplyItem(action=MessageAction(label="🔍 ค้นหาชื่อ", text="หาเบอร์ "))
-    ])
-
 def handle_add_contact_simple(data, event, user_id):
     """Handle add contact with simple interface"""
+    global contacts_written_at
     parts = data.strip().split()
     
     if len(parts) < 2:
         error_msg = "❌ กรุณาใส่ข้อมูลครบ\n\n💡 รูปแบบ: เพิ่มเบอร์ ชื่อ เบอร์โทร\n🔤 ตัวอย่าง: เพิ่มเบอร์ สมชาย 081-234-5678"
-        quick_reply = QuickReply(items=[
-            QuickReplyItem(action=MessageAction(label="💡 เพิ่มเบอร์ สมชาย 081-234-5678", text="เพิ่มเบอร์ สมชาย 081-234-5678")),
-            QuickReplyItem(action=MessageAction(label="💡 เพิ่มเบอร์ ดาว 089-999-8888", text="เพิ่มเบอร์ ดาว 089-999-8888"))
-        ])
+        quick_reply = get_quick_reply("add_contact_examples")
         
         safe_line_api_call(line_bot_api.reply_message,
             ReplyMessageRequest(
@@ -124,6 +118,9 @@ def handle_add_contact_simple(data, event, user_id):
     result = add_contact(name, phone, user_id)
     
     if result["success"]:
+        contacts_written_at = time.time()
+        if snapshot_refresher:
+            snapshot_refresher.request_refresh()
         contact_data = result["data"]
         success_msg = f"✅ บันทึกเบอร์เรียบร้อย!\n\n📝 ชื่อ: {contact_data['name']}\n📞 เบอร์: {contact_data['phone_number']}\n\n💡 ลองค้นหาดู: หาเบอร์ {name}"
         quick_reply = create_contact_quick_reply()
@@ -138,9 +135,18 @@ def handle_add_contact_simple(data, event, user_id):
         )
     )
 
+CONTACT_PAGE_SIZE = 10  # bubbles per search carousel
+CONTACT_PAGE_SUFFIX = re.compile(r'^(.*\S)\s+หน้า\s*(\d+)$')
+
 def handle_search_contact_simple(query, event):
-    """Handle search with simple interface using optimized bulk search"""
-    contacts = bulk_search_contacts(query, limit=50)
+    """Handle search with simple interface, one carousel page at a time ("หาเบอร์ <คำค้น> หน้า 2")"""
+    page = 1
+    match = CONTACT_PAGE_SUFFIX.match(query.strip())
+    if match:
+        query, page = match.group(1), int(match.group(2))
+    
+    result = search_contacts_page(query, page, per_page=CONTACT_PAGE_SIZE)
+    contacts, total = result["contacts"], result["total"]
     
     if not contacts:
         error_msg = "❌ ไม่พบเบอร์ที่ต้องการ\n\n💡 ลองค้นหาด้วยชื่ออื่น หรือดูรายการทั้งหมด"
@@ -154,36 +160,36 @@ def handle_search_contact_simple(query, event):
         )
         return
     
-    if len(contacts) == 1:
+    if result.get("fuzzy"):
+        # No exact match - show the closest names
+        bubbles = [create_contact_flex_message(contact) for contact in contacts]
+        carousel_content = {"type": "carousel", "contents": bubbles}
+        flex_message = flex_payload("ชื่อที่ใกล้เคียง", carousel_content, builder='contact_carousel')
+        
+        fuzzy_msg = f"🤔 ไม่พบ '{query}' ตรงตัว - ชื่อที่ใกล้เคียง {total} คน"
+        fast_reply(event, flex_message, text_payload(fuzzy_msg, "contact"))
+    elif total == 1:
         # Single result - show detailed
         contact = contacts[0]
         flex_content = create_contact_flex_message(contact, is_single=True)
-        flex_message = FlexMessage(alt_text="ผลการค้นหา", contents=FlexContainer.from_dict(flex_content))
-        
-        success_msg = f"🎯 พบแล้ว! ({len(contacts)} คน)"
-        quick_reply = create_contact_quick_reply()
+        flex_message = flex_payload("ผลการค้นหา", flex_content, builder='contact_single')
         
-        safe_line_api_call(line_bot_api.reply_message,
-            ReplyMessageRequest(
-                reply_token=event.reply_token,
-                messages=[flex_message, TextMessage(text=success_msg, quick_reply=quick_reply)]
-            )
-        )
+        success_msg = f"🎯 พบแล้ว! ({total} คน)"
+        fast_reply(event, flex_message, text_payload(success_msg, "contact"))
     else:
-        # Multiple results - show carousel
-        bubbles = [create_contact_flex_message(contact) for contact in contacts[:10]]
+        # Multiple results - show this page as a carousel
+        bubbles = [create_contact_flex_message(contact) for contact in contacts]
         carousel_content = {"type": "carousel", "contents": bubbles}
-        flex_message = FlexMessage(alt_text="ผลการค้นหา", contents=FlexContainer.from_dict(carousel_content))
-        
-        success_msg = f"🎯 พบ {len(contacts)} คน{' (แสดง 10 คนแรก)' if len(contacts) > 10 else ''}"
-        quick_reply = create_contact_quick_reply()
+        flex_message = flex_payload("ผลการค้นหา", carousel_content, builder='contact_carousel')
         
-        safe_line_api_call(line_bot_api.reply_message,
-            ReplyMessageRequest(
-                reply_token=event.reply_token,
-                messages=[flex_message, TextMessage(text=success_msg, quick_reply=quick_reply)]
-            )
-        )
+        page, total_pages = result["page"], result["total_pages"]
+        if total_pages > 1:
+            success_msg = f"🎯 พบ {total} คน - หน้า {page}/{total_pages}"
+            quick_reply = create_pagination_quick_reply(page, total_pages, f"หาเบอร์ {query} หน้า")
+        else:
+            success_msg = f"🎯 พบ {total} คน"
+            quick_reply = "contact"
+        fast_reply(event, flex_message, text_payload(success_msg, quick_reply))
 
 app = Flask(__name__)
 
@@ -213,8 +219,8 @@ supabase_url = os.getenv('SUPABASE_URL')
 supabase_key = os.getenv('SUPABASE_SERVICE_KEY')  # Use service role key for full permissions
 supabase_client: Client = create_client(supabase_url, supabase_key)
 
-# Simple in-memory storage for user states (in production, use Redis or database)
-user_states = {}
+# Conversation states per user, expiring after USER_STATE_TTL_SECONDS without a reply
+user_states = create_user_state_store_from_env(app.logger)
 
 # Get LINE Channel Access Token and Channel Secret from environment variables
 configuration = Configuration(access_token=os.getenv('LINE_CHANNEL_ACCESS_TOKEN'))
@@ -224,6 +230,196 @@ admin_ids = os.getenv('ADMIN_IDS', '').split(',') if os.getenv('ADMIN_IDS') else
 # Initialize LINE Bot API
 line_bot_api = MessagingApi(ApiClient(configuration))
 
+def fast_reply(event, *payloads):
+    """Reply with pre-serialized message payloads, skipping SDK model construction"""
+    return safe_line_api_call(send_reply_payloads, line_bot_api, event.reply_token, list(payloads))
+
+# Monthly message quota - every fan-out is costed before sending
+quota_tracker = create_quota_tracker_from_env(line_bot_api, Insight(InsightApiClient(configuration)), app.logger)
+
+# Background pool for subscriber broadcasts
+broadcast_executor = create_broadcast_executor_from_env(app.logger)
+
+# Subscriber ids kept in memory (loaded lazily on first use)
+subscriber_registry = create_subscriber_registry_from_env(supabase_client, app.logger)
+
+# Shared mmap snapshot of events/contacts, rebuilt by one worker (SNAPSHOT_PATH enables it)
+try:
+    snapshot_reader, snapshot_refresher = create_snapshot_from_env(supabase_client, app.logger)
+except Exception as e:
+    app.logger.error(f"Failed to start snapshot refresher: {e}")
+    snapshot_reader = snapshot_refresher = None
+contacts_written_at = 0.0  # last contact added by this worker
+
+# Events kept in memory for search (loaded lazily on first use; EVENT_STORE, on with a change feed or snapshot)
+event_store = create_event_store_from_env(
+    supabase_client, snapshot=snapshot_reader,
+    on_write=snapshot_refresher.request_refresh if snapshot_refresher else None, logger=app.logger)
+event_search = event_store.attach(EventSearchIndex())
+event_dates = event_store.attach(EventDateIndex())
+
+# Row changes from other workers / the dashboard, applied to local caches
+change_feed = ChangeFeed(app.logger)
+change_feed.subscribe('subscribers', subscriber_registry.apply_change)
+change_feed.subscribe('events', event_store.apply_change)
+change_feed.subscribe('contacts', search_cache.invalidate)
+if local_replica:
+    event_store.attach(local_replica.event_writes())
+    change_feed.subscribe('events', partial(local_replica.apply_change, 'events'))
+    change_feed.subscribe('contacts', partial(local_replica.apply_change, 'contacts'))
+if contact_store:
+    contact_store.snapshot = snapshot_reader
+    change_feed.subscribe('contacts', contact_store.apply_change)
+if fuzzy_index:
+    fuzzy_index.snapshot = snapshot_reader
+    change_feed.subscribe('contacts', fuzzy_index.apply_change)
+    fuzzy_index.start()
+try:
+    change_feed_source = start_change_feed_from_env(change_feed, supabase_client, supabase_url, supabase_key, app.logger)
+except Exception as e:
+    app.logger.error(f"Failed to start change feed: {e}")
+    change_feed_source = None
+
+def read_events(read, database_query):
+    """read(event_dates), or read(local replica) if the store is off or cannot load; database_query() as a last resort"""
+    if event_store.enabled:
+        try:
+            event_store.ensure_fresh()
+            return read(event_dates)
+        except Exception as e:
+            app.logger.error(f"Event store unavailable: {e}")
+    replica = replica_table('events')
+    if replica:
+        try:
+            return read(replica)
+        except Exception as e:
+            app.logger.error(f"Local replica unavailable: {e}")
+    return database_query().execute().data
+
+def search_events(search_term):
+    """Ranked events matching every term; the local replica or the database if the index cannot load"""
+    if event_store.enabled:
+        try:
+            event_store.ensure_fresh()
+            return event_search.search(search_term)
+        except Exception as e:
+            app.logger.error(f"Event index unavailable: {e}")
+    replica = replica_table('events')
+    if replica:
+        try:
+            return replica.search_events(search_term)
+        except Exception as e:
+            app.logger.error(f"Local replica unavailable, searching the database: {e}")
+
+    terms, date_from, date_to = parse_search_query(search_term)
+    if not terms and not date_from:
+        return []
+    query = select_spec(supabase_client, 'events.display')
+    for term in terms:
+        query = query.or_(ilike_any_filter(('event_title', 'event_description'), term))
+    if date_from:
+        query = query.gte('event_date', date_from).lte('event_date', date_to)
+    return query.order('event_date', desc=False).execute().data
+
+def deliver_messages(recipients, messages, plan):
+    """Send messages to recipients with the planned method
+
+    Messages go out in batches of 5 per request (one quota unit per recipient
+    per batch); multicast requests run in parallel on the bounded broadcast
+    request pool. Returns delivered/failed user ids and whether the monthly
+    limit was hit.
+    """
+    delivered = list(recipients)
+    failed = []
+    quota_hit = threading.Event()
+
+    for batch in chunked(messages, MAX_MESSAGES_PER_REQUEST):
+        if plan['method'] == 'broadcast':
+            groups = [delivered]
+        else:
+            groups = chunked(delivered, MULTICAST_MAX_RECIPIENTS)
+
+        def send_group(group):
+            for wait_seconds in RATE_LIMIT_BACKOFF_SECONDS + (None,):
+                if quota_hit.is_set():
+                    return False
+                try:
+                    if plan['method'] == 'broadcast':
+                        safe_line_api_call(line_bot_api.broadcast, BroadcastRequest(messages=batch))
+                        quota_tracker.record(quota_tracker.followers or len(group))
+                    else:
+                        safe_line_api_call(line_bot_api.multicast, MulticastRequest(to=group, messages=batch))
+                        quota_tracker.record(len(group))
+                    return True
+                except Exception as e:
+                    if is_rate_limit_error(e) and wait_seconds is not None:
+                        app.logger.warning(f"LINE API rate limited, retrying {plan['method']} in {wait_seconds}s")
+                        time.sleep(wait_seconds)
+                        continue
+                    app.logger.error(f"Failed to {plan['method']} to {len(group)} recipients: {e}")
+                    if is_quota_error(e):
+                        app.logger.error("LINE API monthly limit hit - stopping notifications")
+                        quota_tracker.mark_exhausted()
+                        quota_hit.set()
+                    return False
+
+        outcomes = broadcast_executor.map_requests(send_group, groups)
+        delivered = [user_id for group, ok in zip(groups, outcomes) if ok for user_id in group]
+        failed.extend(user_id for group, ok in zip(groups, outcomes) if not ok for user_id in group)
+        if quota_hit.is_set():
+            break
+
+    return {"delivered": delivered, "failed": failed, "quota_exceeded": quota_hit.is_set()}
+
+def queue_subscriber_broadcast(event, recipients, messages, summary_title, detail_line):
+    """Cost a fan-out, queue it in the background and reply to the admin right away
+
+    The admin gets a push with sent/failed/duration when the job finishes.
+    """
+    admin_id = event.source.user_id
+    quota_tracker.maybe_sync()
+    plan = quota_tracker.plan(len(recipients), len(messages))
+
+    if not plan['allowed']:
+        reply_text = f"⛔ ยังไม่ได้ส่งข้อความ - โควต้าข้อความไม่พอ\n\n{format_plan_preview(plan)}"
+    else:
+        def on_done(result, duration):
+            if 'error' in result:
+                summary = f"❌ ส่งข้อความไม่สำเร็จ\n\n{detail_line}\n⚠️ {result['error']}"
+            else:
+                sent_count = len(result['delivered'])
+                failed_count = len(result['failed'])
+                summary = f"""{summary_title}
+
+{detail_line}
+✅ **ส่งสำเร็จ:** {sent_count} คน
+❌ **ส่งไม่สำเร็จ:** {failed_count} คน
+⏱️ **ใช้เวลา:** {duration:.1f} วินาที
+
+📊 **รวม:** {sent_count + failed_count} คน
+💰 **ใช้โควต้า:** {plan['cost']:,} ข้อความ ({plan['method']})"""
+                if result['quota_exceeded']:
+                    summary += "\n\n⛔ โควต้าข้อความเดือนนี้หมด - หยุดส่งส่วนที่เหลือ"
+            safe_line_api_call(line_bot_api.push_message,
+                PushMessageRequest(to=admin_id, messages=[TextMessage(text=summary)])
+            )
+            quota_tracker.record(1)
+
+        broadcast_executor.submit(lambda: deliver_messages(recipients, messages, plan), on_done)
+        reply_text = f"""⏳ รับคำสั่งแล้ว กำลังส่งถึงผู้สมัคร {len(recipients)} คน
+
+{detail_line}
+{format_plan_preview(plan)}
+
+📬 จะแจ้งผลการส่งให้ทราบเมื่อเสร็จ"""
+
+    safe_line_api_call(line_bot_api.reply_message,
+        ReplyMessageRequest(
+            reply_token=event.reply_token,
+            messages=[TextMessage(text=reply_text, quick_reply=create_admin_quick_reply())]
+        )
+    )
+
 # ==================== CONTACT MANAGEMENT FUNCTIONS ====================
 # Functions imported from contact_management.py
 
@@ -233,17 +429,8 @@ def is_admin_user(user_id):
 
 # ==================== END CONTACT MANAGEMENT ====================
 
-def format_thai_date(date_str):
-    """Convert date string to Thai format"""
-    try:
-        date_obj = datetime.strptime(date_str, '%Y-%m-%d').date()
-        thai_months = [
-            '', 'มกราคม', 'กุมภาพันธ์', 'มีนาคม', 'เมษายน', 'พฤษภาคม', 'มิถุนายน',
-            'กรกฎาคม', 'สิงหาคม', 'กันยายน', 'ตุลาคม', 'พฤศจิกายน', 'ธันวาคม'
-        ]
-        return f"{date_obj.day} {thai_months[date_obj.month]} {date_obj.year + 543}"
-    except:
-        return date_str
+# Notification texts rendered once per event version and shared by all recipients
+notification_templates = NotificationTemplates(format_thai_date)
 
 def create_event_flex_message(event_data, is_admin=False):
     """Create Flex Message for a single event using Supabase data structure"""
@@ -390,7 +577,8 @@ def get_single_flex_message(event_data, is_admin=False):
     flex_message_content = create_event_flex_message(event_data, is_admin)
     return FlexMessage(alt_text="กิจกรรมล่าสุด", contents=FlexContainer.from_dict(flex_message_content))
 
-def create_events_carousel_message(events_list, is_admin=False, page=1, total_events=None):
+def create_events_carousel_contents(events_list, is_admin=False, page=1):
+    """Build the carousel dict for one page of events"""
     # Limit to 10 events per carousel (LINE limit is 12)
     max_per_page = 10
     start_idx = (page - 1) * max_per_page
@@ -402,270 +590,152 @@ def create_events_carousel_message(events_list, is_admin=False, page=1, total_ev
         bubble_content = create_event_flex_message(event_data, is_admin)
         bubbles.append(bubble_content)
     
-    carousel_content = {
+    return {
         "type": "carousel",
         "contents": bubbles
     }
-    
+
+def create_events_carousel_message(events_list, is_admin=False, page=1, total_events=None):
+    carousel_content = create_events_carousel_contents(events_list, is_admin, page)
     return FlexMessage(alt_text=f"กิจกรรมหน้า {page}", contents=FlexContainer.from_dict(carousel_content))
 
-def create_pagination_quick_reply(page, total_pages, command_prefix="ล่าสุด"):
-    """Create pagination quick reply buttons"""
-    items = []
-    
-    if page > 1:
-        items.append(QuickReplyItem(action=MessageAction(label="◀️ ก่อนหน้า", text=f"{command_prefix} {page-1}")))
-    
-    items.append(QuickReplyItem(action=MessageAction(label=f"📄 {page}/{total_pages}", text=f"{command_prefix} 1")))
-    
-    if page < total_pages:
-        items.append(QuickReplyItem(action=MessageAction(label="▶️ ถัดไป", text=f"{command_prefix} {page+1}")))
-    
-    items.append(QuickReplyItem(action=MessageAction(label="🏠 เมนูหลัก", text="สวัสดี")))
-    
-    return QuickReply(items=items)
-
-def create_main_quick_reply():
-    """Create main menu quick reply buttons - Modern, intuitive design"""
-    return QuickReply(items=[
-        QuickReplyItem(action=MessageAction(label="🎯 กิจกรรมวันนี้", text="/today")),
-        QuickReplyItem(action=MessageAction(label="🔍 ค้นหากิจกรรม", text="/search")),
-        QuickReplyItem(action=MessageAction(label="📞 สมุดเบอร์", text="ค้นหาเบอร์อัจฉริยะ")),
-        QuickReplyItem(action=MessageAction(label="📅 กิจกรรมทั้งหมด", text="ล่าสุด")),
-        QuickReplyItem(action=MessageAction(label="📝 คำสั่งทั้งหมด", text="คำสั่งทั้งหมด")),
-        QuickReplyItem(action=MessageAction(label="💡 วิธีใช้", text="help"))
-    ])
-
-def create_admin_quick_reply():
-    """Create admin menu quick reply buttons - Organized and streamlined"""
-    return QuickReply(items=[
-        QuickReplyItem(action=MessageAction(label="➕ เพิ่มกิจกรรม", text="เพิ่มกิจกรรม")),
-        QuickReplyItem(action=MessageAction(label="⚙️ จัดการกิจกรรม", text="จัดการกิจกรรม")),
-        QuickReplyItem(action=MessageAction(label="📋 จัดการเบอร์", text="/contacts")),
-        QuickReplyItem(action=MessageAction(label="📢 ส่งแจ้งเตือน", text="ส่งแจ้งเตือน")),
-        QuickReplyItem(action=MessageAction(label="📊 รายงาน", text="admin_reports")),
-        QuickReplyItem(action=MessageAction(label="🏠 เมนูหลัก", text="สวัสดี"))
-    ])
-
-def create_delete_confirm_quick_reply(event_id):
-    """Create delete confirmation quick reply buttons"""
-    return QuickReply(items=[
-        QuickReplyItem(action=MessageAction(label="✅ ยืนยันลบ", text=f"ยืนยันลบ {event_id}")),
-        QuickReplyItem(action=MessageAction(label="❌ ยกเลิก", text="สวัสดี")),
-        QuickReplyItem(action=MessageAction(label="🏠 เมนูหลัก", text="สวัสดี"))
-    ])
-
-def create_date_quick_reply():
-    """Create quick date selection buttons"""
-    today = date.today()
-    dates = []
-    for i in range(10):  # Next 10 days (safe limit with buffer for LINE Bot API)
-        future_date = today + timedelta(days=i)
-        label = "วันนี้" if i == 0 else f"{future_date.day}/{future_date.month}"
-        dates.append(QuickReplyItem(action=MessageAction(label=label, text=str(future_date))))
-    
-    dates.append(QuickReplyItem(action=MessageAction(label="📅 วันอื่น", text="วันอื่น")))
-    dates.append(QuickReplyItem(action=MessageAction(label="❌ ยกเลิก", text="สวัสดี")))
-    
-    return QuickReply(items=dates)
-
-def create_cancel_quick_reply():
-    """Create cancel operation quick reply"""
-    return QuickReply(items=[
-        QuickReplyItem(action=MessageAction(label="❌ ยกเลิก", text="สวัสดี")),
-        QuickReplyItem(action=MessageAction(label="🏠 เมนูหลัก", text="สวัสดี"))
-    ])
-
-def create_comprehensive_quick_reply():
-    """Create comprehensive quick reply with all main features"""
-    return QuickReply(items=[
-        QuickReplyItem(action=MessageAction(label="📅 วันนี้", text="/today")),
-        QuickReplyItem(action=MessageAction(label="🔍 ค้นหา", text="/search")),
-        QuickReplyItem(action=MessageAction(label="📞 เบอร์", text="ค้นหาเบอร์อัจฉริยะ")),
-        QuickReplyItem(action=MessageAction(label="📊 สถิติ", text="สถิติเบอร์")),
-        QuickReplyItem(action=MessageAction(label="➕ เพิ่ม", text="เพิ่มเบอร์ ")),
-        QuickReplyItem(action=MessageAction(label="📋 ทั้งหมด", text="ล่าสุด")),
-        QuickReplyItem(action=MessageAction(label="💡 Help", text="help")),
-        QuickReplyItem(action=MessageAction(label="🏠 หลัก", text="สวัสดี"))
-    ])
-
-def create_event_quick_reply():
-    """Create event-focused quick reply menu"""
-    return QuickReply(items=[
-        QuickReplyItem(action=MessageAction(label="📅 วันนี้", text="/today")),
-        QuickReplyItem(action=MessageAction(label="🔜 ถัดไป", text="/next")),
-        QuickReplyItem(action=MessageAction(label="📆 เดือนนี้", text="/month")),
-        QuickReplyItem(action=MessageAction(label="🔍 ค้นหา", text="/search")),
-        QuickReplyItem(action=MessageAction(label="📋 ทั้งหมด", text="ล่าสุด")),
-        QuickReplyItem(action=MessageAction(label="🏠 หลัก", text="สวัสดี"))
-    ])
-
-def create_compact_contact_quick_reply():
-    """Create compact contact management menu"""
-    return QuickReply(items=[
-        QuickReplyItem(action=MessageAction(label="➕ เพิ่ม", text="เพิ่มเบอร์ ")),
-        QuickReplyItem(action=MessageAction(label="🔍 หา", text="ค้นหาเบอร์อัจฉริยะ")),
-        QuickReplyItem(action=MessageAction(label="📊 สถิติ", text="สถิติเบอร์")),
-        QuickReplyItem(action=MessageAction(label="📱 มือถือ", text="หาเบอร์ mobile")),
-        QuickReplyItem(action=MessageAction(label="☎️ บ้าน", text="หาเบอร์ landline")),
-        QuickReplyItem(action=MessageAction(label="🏠 หลัก", text="สวัสดี"))
-    ])
-
-def create_all_commands_quick_reply():
-    """Create comprehensive quick reply for ALL system commands"""
-    return QuickReply(items=[
-        QuickReplyItem(action=MessageAction(label="📅 วันนี้", text="/today")),
-        QuickReplyItem(action=MessageAction(label="🔜 ถัดไป", text="/next")),
-        QuickReplyItem(action=MessageAction(label="📆 เดือน", text="/month")),
-        QuickReplyItem(action=MessageAction(label="🔍 ค้นหา", text="/search")),
-        QuickReplyItem(action=MessageAction(label="📋 ล่าสุด", text="ล่าสุด")),
-        QuickReplyItem(action=MessageAction(label="📞 เบอร์", text="ค้นหาเบอร์อัจฉริยะ")),
-        QuickReplyItem(action=MessageAction(label="➕ เพิ่ม", text="เพิ่มเบอร์ ")),
-        QuickReplyItem(action=MessageAction(label="📊 สถิติ", text="สถิติเบอร์")),
-        QuickReplyItem(action=MessageAction(label="💡 Help", text="help")),
-        QuickReplyItem(action=MessageAction(label="🏠 หลัก", text="สวัสดี")),
-        QuickReplyItem(action=MessageAction(label="🔔 ติดตาม", text="/subscribe")),
-        QuickReplyItem(action=MessageAction(label="⚙️ Admin", text="/admin"))
-    ])
-
-def create_search_commands_quick_reply():
-    """Quick reply for all search-related commands"""
-    return QuickReply(items=[
-        QuickReplyItem(action=MessageAction(label="🔍 กิจกรรม", text="/search")),
-        QuickReplyItem(action=MessageAction(label="📞 เบอร์อัจฉริยะ", text="ค้นหาเบอร์อัจฉริยะ")),
-        QuickReplyItem(action=MessageAction(label="📱 มือถือ", text="หาเบอร์ mobile")),
-        QuickReplyItem(action=MessageAction(label="☎️ บ้าน", text="หาเบอร์ landline")),
-        QuickReplyItem(action=MessageAction(label="🕐 ล่าสุด", text="หาเบอร์ recent")),
-        QuickReplyItem(action=MessageAction(label="📋 ทั้งหมด", text="เบอร์ทั้งหมด")),
-        QuickReplyItem(action=MessageAction(label="🏠 หลัก", text="สวัสดี"))
-    ])
-
-def create_admin_all_commands_quick_reply():
-    """Quick reply for ALL admin commands"""
-    return QuickReply(items=[
-        QuickReplyItem(action=MessageAction(label="➕ เพิ่มกิจกรรม", text="เพิ่มกิจกรรม")),
-        QuickReplyItem(action=MessageAction(label="⚙️ จัดการ", text="จัดการกิจกรรม")),
-        QuickReplyItem(action=MessageAction(label="📢 แจ้งเตือน", text="ส่งแจ้งเตือน")),
-        QuickReplyItem(action=MessageAction(label="📋 รายการ", text="/list")),
-        QuickReplyItem(action=MessageAction(label="📞 จัดการเบอร์", text="/contacts")),
-        QuickReplyItem(action=MessageAction(label="📄 ส่งออก", text="ส่งออกเบอร์")),
-        QuickReplyItem(action=MessageAction(label="📊 รายงาน", text="admin_reports")),
-        QuickReplyItem(action=MessageAction(label="🏠 หลัก", text="สวัสดี"))
-    ])
-
-def create_date_commands_quick_reply():
-    """Quick reply for date-related commands"""  
-    return QuickReply(items=[
-        QuickReplyItem(action=MessageAction(label="📅 วันนี้", text="/today")),
-        QuickReplyItem(action=MessageAction(label="🔜 ถัดไป", text="/next")),
-        QuickReplyItem(action=MessageAction(label="📆 เดือนนี้", text="/month")),
-        QuickReplyItem(action=MessageAction(label="📋 ล่าสุด 5", text="ล่าสุด")),
-        QuickReplyItem(action=MessageAction(label="📋 ล่าสุด 10", text="ล่าสุด 10")),
-        QuickReplyItem(action=MessageAction(label="📋 ล่าสุด 20", text="ล่าสุด 20")),
-        QuickReplyItem(action=MessageAction(label="🏠 หลัก", text="สวัสดี"))
-    ])
-
-def send_automatic_notifications():
-    """Send automatic notifications for events happening today or tomorrow"""
+def create_events_carousel_payload(events_list, is_admin=False, page=1):
+    """Pre-serialized equivalent of create_events_carousel_message for fast_reply"""
+    carousel_content = create_events_carousel_contents(events_list, is_admin, page)
+    return flex_payload(f"กิจกรรมหน้า {page}", carousel_content, builder='events_carousel')
+
+def fetch_notification_data(today, tomorrow):
+    """Fetch today's/tomorrow's events while refreshing the subscriber registry concurrently"""
+    def fetch_events():
+        return select_spec(supabase_client, 'events.notification') \
+            .in_('event_date', [str(today), str(tomorrow)]).execute()
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        events_future = executor.submit(fetch_events)
+        subscribers_future = executor.submit(lambda: subscriber_registry.ensure_fresh().recipients())
+        return events_future.result(), subscribers_future.result()
+
+def send_automatic_notifications(today=None, dry_run=False):
+    """Send automatic notifications for events happening today or tomorrow
+
+    today defaults to the server date; the scheduler passes the Thai date of its slot.
+    Reminders already recorded in the delivery ledger are skipped. Recipients
+    with the same pending reminders share multicast requests, up to 5 reminders
+    per request. With dry_run nothing is pushed; the result reports how many
+    pushes the run would cost.
+    """
     try:
-        # Check if we've hit rate limits recently
-        current_time = datetime.now()
-        last_limit_check = getattr(send_automatic_notifications, '_last_limit_check', None)
-        
-        if last_limit_check and (current_time - last_limit_check).seconds < 3600:  # 1 hour cooldown
-            app.logger.warning("Skipping notifications due to recent rate limit")
-            return "Rate limit cooldown in effect", 429
-        today = date.today()
+        quota_tracker.maybe_sync()
+        if not dry_run and quota_tracker.is_exhausted():
+            app.logger.warning("Skipping notifications - LINE monthly quota exhausted")
+            return "LINE API monthly limit exceeded", 429
+        today = today or date.today()
         tomorrow = today + timedelta(days=1)
+        timings = {}
         
-        # Get events for today and tomorrow with proper error validation
-        events_today = supabase_client.table('events').select('*').eq('event_date', str(today)).execute()
-        if not hasattr(events_today, 'data') or events_today.data is None:
-            app.logger.error("Failed to fetch today's events - no data attribute or data is None")
-            return {"status": "error", "message": "Database query failed for today's events"}
-            
-        events_tomorrow = supabase_client.table('events').select('*').eq('event_date', str(tomorrow)).execute()
-        if not hasattr(events_tomorrow, 'data') or events_tomorrow.data is None:
-            app.logger.error("Failed to fetch tomorrow's events - no data attribute or data is None")
-            return {"status": "error", "message": "Database query failed for tomorrow's events"}
-        
-        # Get all subscribers with validation
-        subscribers_response = supabase_client.table('subscribers').select('user_id').execute()
-        if not hasattr(subscribers_response, 'data') or not subscribers_response.data:
-            app.logger.warning("No subscribers found or invalid response structure")
-            return {"status": "no_subscribers", "message": "No subscribers found or database error"}
-        
-        notifications_sent = 0
-        
-        # Send notifications for today's events
-        if events_today.data:
-            for event in events_today.data:
-                formatted_date = format_thai_date(event.get('event_date', ''))
-                message = f"""🔔 เตือนกิจกรรมวันนี้!
+        # One date-range query for both days plus the subscriber list, in parallel
+        started = time.perf_counter()
+        events_response, recipients = fetch_notification_data(today, tomorrow)
 
-📝 **{event.get('event_title', '')}**
-📋 {event.get('event_description', '')}
-📅 **วันที่:** {formatted_date} (วันนี้)
-
-⏰ อย่าลืมเข้าร่วมนะครับ!
-
-📲 แจ้งเตือนอัตโนมัติ"""
-                
-                for subscriber in subscribers_response.data:
-                    try:
-                        safe_line_api_call(line_bot_api.push_message,
-                            PushMessageRequest(
-                                to=subscriber['user_id'],
-                                messages=[TextMessage(text=message)]
-                            )
-                        )
-                        notifications_sent += 1
-                    except Exception as e:
-                        app.logger.error(f"Failed to send today notification to {subscriber['user_id']}: {e}")
-                        # Check if it's a rate limit error
-                        if "429" in str(e) or "monthly limit" in str(e).lower():
-                            app.logger.error("LINE API rate limit hit - stopping notifications")
-                            send_automatic_notifications._last_limit_check = datetime.now()
-                            return "LINE API monthly limit exceeded", 429
+        if not hasattr(events_response, 'data') or events_response.data is None:
+            app.logger.error("Failed to fetch events - no data attribute or data is None")
+            return {"status": "error", "message": "Database query failed for today's/tomorrow's events", "timings": timings}
         
-        # Send notifications for tomorrow's events
-        if events_tomorrow.data:
-            for event in events_tomorrow.data:
-                formatted_date = format_thai_date(event.get('event_date', ''))
-                message = f"""🔔 เตือนกิจกรรมพรุ่งนี้!
+        if not recipients:
+            app.logger.warning("No subscribers found")
+            return {"status": "no_subscribers", "message": "No subscribers found or database error", "timings": timings}
+
+        today_str = str(today)
+        events_today = [e for e in events_response.data if e.get('event_date') == today_str]
+        events_tomorrow = [e for e in events_response.data if e.get('event_date') != today_str]
+        reminders = [
+            {"event": e, "event_id": e.get('id'), "label": label, "kind": reminder_kind(label, e.get('event_date'))}
+            for label, events in (('today', events_today), ('tomorrow', events_tomorrow))
+            for e in events
+        ]
 
-📝 **{event.get('event_title', '')}**
-📋 {event.get('event_description', '')}
-📅 **วันที่:** {formatted_date} (พรุ่งนี้)
+        # Skip reminders the ledger says were already delivered
+        try:
+            delivered = fetch_delivered(supabase_client,
+                                        {r['event_id'] for r in reminders},
+                                        {r['kind'] for r in reminders})
+        except Exception as e:
+            # Without the ledger every run would re-push everything, so refuse to send
+            app.logger.error(f"Notification ledger unavailable: {e}")
+            return {"status": "error", "message": f"Notification ledger unavailable: {e}", "timings": timings}
+        plan, already_delivered = plan_deliveries(reminders, recipients, delivered)
+        timings['fetch_ms'] = round((time.perf_counter() - started) * 1000, 1)
+
+        # Group recipients that are missing exactly the same reminders
+        pending_by_user = {}
+        for index, (reminder, pending) in enumerate(plan):
+            for user_id in pending:
+                pending_by_user.setdefault(user_id, []).append(index)
+        groups = {}
+        for user_id, indexes in pending_by_user.items():
+            groups.setdefault(tuple(indexes), []).append(user_id)
+
+        group_plans = [
+            (indexes, users, quota_tracker.plan(len(users), len(indexes), all_subscribers=len(users) == len(recipients)))
+            for indexes, users in groups.items()
+        ]
+        quota_cost = sum(group_plan['cost'] for _, _, group_plan in group_plans)
+        remaining = quota_tracker.remaining
+
+        summary = {
+            "events_today": len(events_today),
+            "events_tomorrow": len(events_tomorrow),
+            "subscribers": len(recipients),
+            "already_delivered": already_delivered,
+            "quota_cost": quota_cost,
+            "quota_remaining": remaining,
+        }
+        if dry_run:
+            return dict(summary, status="dry_run", pushes_pending=sum(len(p) for _, p in plan),
+                        methods=sorted({group_plan['method'] for _, _, group_plan in group_plans}), timings=timings)
 
-⏰ เตรียมตัวไว้นะครับ!
+        if remaining is not None and quota_cost > remaining:
+            app.logger.warning(f"Notification run needs {quota_cost} messages but only {remaining} remain")
+            return dict(summary, status="quota_exceeded", message="Not enough LINE message quota for this run", timings=timings)
+        
+        # Render every pending reminder once (cached by event version) before delivering
+        started = time.perf_counter()
+        messages = [notification_templates.reminder_message(reminder['event'], reminder['label']) for reminder, _ in plan]
+        timings['render_ms'] = round((time.perf_counter() - started) * 1000, 1)
 
-📲 แจ้งเตือนอัตโนมัติ"""
-                
-                for subscriber in subscribers_response.data:
-                    try:
-                        safe_line_api_call(line_bot_api.push_message,
-                            PushMessageRequest(
-                                to=subscriber['user_id'],
-                                messages=[TextMessage(text=message)]
-                            )
-                        )
-                        notifications_sent += 1
-                    except Exception as e:
-                        app.logger.error(f"Failed to send tomorrow notification to {subscriber['user_id']}: {e}")
-                        # Check if it's a rate limit error
-                        if "429" in str(e) or "monthly limit" in str(e).lower():
-                            app.logger.error("LINE API rate limit hit - stopping notifications")
-                            send_automatic_notifications._last_limit_check = datetime.now()
-                            return "LINE API monthly limit exceeded", 429
+        notifications_sent = 0
+        quota_exceeded = False
+        recorder = DeliveryRecorder(supabase_client)
+        started = time.perf_counter()
+        try:
+            for indexes, users, group_plan in group_plans:
+                result = deliver_messages(users, [messages[i] for i in indexes], group_plan)
+                for user_id in result['delivered']:
+                    for i in indexes:
+                        recorder.add(plan[i][0]['event_id'], plan[i][0]['kind'], user_id)
+                notifications_sent += len(result['delivered']) * len(indexes)
+                try:
+                    recorder.flush_if_full()
+                except Exception as e:
+                    # Unwritten keys stay buffered for the next flush; keep delivering the other groups
+                    app.logger.error(f"Error writing notification ledger (will retry): {e}")
+                if result['quota_exceeded']:
+                    quota_exceeded = True
+                    break
+        finally:
+            # Record what was delivered even when the run stops early
+            try:
+                recorder.flush()
+            except Exception as e:
+                app.logger.error(f"Error writing notification ledger, {len(recorder.pending)} deliveries unrecorded: {e}")
+        timings['deliver_ms'] = round((time.perf_counter() - started) * 1000, 1)
         
-        return {
-            "status": "success", 
-            "notifications_sent": notifications_sent,
-            "events_today": len(events_today.data) if events_today.data else 0,
-            "events_tomorrow": len(events_tomorrow.data) if events_tomorrow.data else 0,
-            "subscribers": len(subscribers_response.data)
-        }
+        if quota_exceeded:
+            return dict(summary, status="quota_exceeded", message="LINE API monthly limit exceeded",
+                        notifications_sent=notifications_sent, ledger_unrecorded=len(recorder.pending),
+                        timings=timings), 429
+        return dict(summary, status="success", notifications_sent=notifications_sent,
+                    ledger_unrecorded=len(recorder.pending), timings=timings)
         
     except Exception as e:
         app.logger.error(f"Error in automatic notifications: {e}")
@@ -676,12 +746,45 @@ def health_check():
     """Health check endpoint for monitoring services"""
     return {"status": "ok", "service": "LINE Bot Event Notification System", "version": "v3.9-import-fix"}, 200
 
+@app.route("/metrics")
+def metrics():
+    """Cache hit/miss counters and in-memory index sizes for this worker"""
+    return {
+        "pid": os.getpid(),
+        "contact_search_cache": search_cache.stats(),
+        "notification_templates": notification_templates.stats(),
+        "event_index": dict(event_search.stats(), enabled=event_store.enabled, loaded=bool(event_store.loaded_at)),
+        "subscribers": len(subscriber_registry),
+        "change_feed_events": change_feed.events_received,
+        "local_replica": local_replica.stats() if local_replica else None,
+        "contact_fuzzy_index": fuzzy_index.stats() if fuzzy_index else None,
+        "user_states": user_states.stats(),
+    }, 200
+
 @app.route("/send-notifications", methods=['GET', 'POST'])
 def trigger_notifications():
     """Endpoint to trigger automatic notifications - can be called by scheduler"""
-    result = send_automatic_notifications()
+    trigger_token = os.getenv('NOTIFICATION_TRIGGER_TOKEN')
+    if trigger_token:
+        supplied = request.headers.get('X-Trigger-Token') or request.args.get('token', '')
+        if not hmac.compare_digest(supplied, trigger_token):
+            abort(403)
+    dry_run = request.args.get('dry_run', '').lower() in ('1', 'true', 'yes')
+    result = send_automatic_notifications(dry_run=dry_run)
+    if isinstance(result, tuple):
+        return result  # (body, status) from a quota stop
     return result, 200
 
+# Optional in-process scheduler (replaces the external cron when enabled)
+notification_scheduler = None
+if scheduler_enabled():
+    try:
+        notification_scheduler = create_scheduler_from_env(send_automatic_notifications, app.logger)
+        notification_scheduler.start()
+        app.logger.info("Internal notification scheduler started")
+    except Exception as e:
+        app.logger.error(f"Failed to start internal notification scheduler: {e}")
+
 @app.route("/force-restart", methods=['POST'])
 def force_restart():
     """Emergency endpoint to force application restart - helps with deployment issues"""
@@ -711,25 +814,23 @@ def callback():
 @handler.add(FollowEvent)
 def handle_follow(event):
     """Handle when user follows the bot"""
-    welcome_message = TextMessage(
-        text="🚀 **ยินดีต้อนรับ!**\n\nขอบคุณที่เป็นส่วนหนึ่งของเรา! 🎉\n\n✨ **เราจะช่วยคุณ:**\n🎯 ไม่พลาดกิจกรรมสำคัญ\n📞 จัดการเบอร์โทรอัจฉริยะ\n📢 รับแจ้งเตือนอัตโนมัติ\n\n🚀 **เริ่มต้นใช้งานกันเลย!**",
-        quick_reply=create_main_quick_reply()
-    )
-    safe_line_api_call(line_bot_api.reply_message,
-        ReplyMessageRequest(reply_token=event.reply_token, messages=[welcome_message])
+    welcome_message = static_text_payload(
+        "🚀 **ยินดีต้อนรับ!**\n\nขอบคุณที่เป็นส่วนหนึ่งของเรา! 🎉\n\n✨ **เราจะช่วยคุณ:**\n🎯 ไม่พลาดกิจกรรมสำคัญ\n📞 จัดการเบอร์โทรอัจฉริยะ\n📢 รับแจ้งเตือนอัตโนมัติ\n\n🚀 **เริ่มต้นใช้งานกันเลย!**",
+        "main"
     )
+    fast_reply(event, welcome_message)
 
 @handler.add(MessageEvent, message=TextMessageContent)
 def handle_message(event):
     text = event.message.text
+    # Step of a flow that timed out since this user's last message; answered in the fallback below
+    expired_step = user_states.pop_expired(event.source.user_id)
     if text == "สวัสดี":
-        message = TextMessage(
-            text="👋 **สวัสดีครับ!**\n\n🤖 **LINE Bot ครบเครื่อง**\n📅 ระบบจัดการกิจกรรม\n📞 สมุดเบอร์โทรอัจฉริยะ\n\n💡 **ใช้งานง่าย เพียงกดปุ่มด้านล่าง**",
-            quick_reply=create_main_quick_reply()
-        )
-        safe_line_api_call(line_bot_api.reply_message,
-            ReplyMessageRequest(reply_token=event.reply_token, messages=[message])
+        message = static_text_payload(
+            "👋 **สวัสดีครับ!**\n\n🤖 **LINE Bot ครบเครื่อง**\n📅 ระบบจัดการกิจกรรม\n📞 สมุดเบอร์โทรอัจฉริยะ\n\n💡 **ใช้งานง่าย เพียงกดปุ่มด้านล่าง**",
+            "main"
         )
+        fast_reply(event, message)
         return
     elif text.startswith("ล่าสุด"):
         try:
@@ -737,7 +838,7 @@ def handle_message(event):
             parts = text.split()
             page = int(parts[1]) if len(parts) > 1 and parts[1].isdigit() else 1
             
-            response = supabase_client.table('events').select('*').order('event_date', desc=False).execute()
+            response = select_spec(supabase_client, 'events.display').order('event_date', desc=False).execute()
             events = response.data
 
             if events:
@@ -757,12 +858,9 @@ def handle_message(event):
                         )
                     )
                 else:
-                    flex_message = create_events_carousel_message(events, is_admin)
-                    safe_line_api_call(line_bot_api.reply_message,
-                        ReplyMessageRequest(
-                            reply_token=event.reply_token,
-                            messages=[flex_message, TextMessage(text="เลือกดูกิจกรรมอื่นๆ ได้เลยครับ", quick_reply=create_main_quick_reply())]
-                        )
+                    fast_reply(event,
+                        create_events_carousel_payload(events, is_admin),
+                        static_text_payload("เลือกดูกิจกรรมอื่นๆ ได้เลยครับ", "main")
                     )
             else:
                 safe_line_api_call(line_bot_api.reply_message,
@@ -783,9 +881,8 @@ def handle_message(event):
     elif text == "/subscribe":
         user_id = event.source.user_id
         try:
-            # Check if user is already subscribed
-            response = supabase_client.table('subscribers').select('user_id').eq('user_id', user_id).execute()
-            if response.data:
+            # Check if user is already subscribed (in-memory, no query)
+            if user_id in subscriber_registry.ensure_fresh():
                 safe_line_api_call(line_bot_api.reply_message,
                     ReplyMessageRequest(
                         reply_token=event.reply_token,
@@ -793,8 +890,11 @@ def handle_message(event):
                     )
                 )
             else:
-                # Add user to subscribers table
-                supabase_client.table('subscribers').insert({'user_id': user_id}).execute()
+                # Add user to subscribers table; another worker may have added them already
+                supabase_client.table('subscribers').upsert(
+                    {'user_id': user_id}, on_conflict='user_id', ignore_duplicates=True
+                ).execute()
+                subscriber_registry.add(user_id)
                 safe_line_api_call(line_bot_api.reply_message,
                     ReplyMessageRequest(
                         reply_token=event.reply_token,
@@ -911,6 +1011,7 @@ def handle_message(event):
                 'event_date': str(event_date),
                 'created_by': user_id
             }).execute()
+            event_store.record(response.data)
             
             app.logger.info(f"Supabase response: {response}")
             
@@ -954,8 +1055,8 @@ def handle_message(event):
     elif text == "/today":
         try:
             today = date.today()
-            response = supabase_client.table('events').select('*').eq('event_date', str(today)).execute()
-            events = response.data
+            events = read_events(lambda dates: dates.on_date(str(today)),
+                                 lambda: select_spec(supabase_client, 'events.display').eq('event_date', str(today)))
 
             if events:
                 is_admin = event.source.user_id in admin_ids
@@ -995,8 +1096,8 @@ def handle_message(event):
     elif text == "/next":
         try:
             today = date.today()
-            response = supabase_client.table('events').select('*').gte('event_date', str(today)).order('event_date', desc=False).limit(5).execute()
-            events = response.data
+            events = read_events(lambda dates: dates.upcoming(str(today), 5),
+                                 lambda: select_spec(supabase_client, 'events.display').gte('event_date', str(today)).order('event_date', desc=False).limit(5))
 
             if events:
                 is_admin = event.source.user_id in admin_ids
@@ -1043,8 +1144,8 @@ def handle_message(event):
             else:
                 end_of_month = date(today.year, today.month + 1, 1) - timedelta(days=1)
             
-            response = supabase_client.table('events').select('*').gte('event_date', str(start_of_month)).lte('event_date', str(end_of_month)).order('event_date', desc=False).execute()
-            events = response.data
+            events = read_events(lambda dates: dates.between(str(start_of_month), str(end_of_month)),
+                                 lambda: select_spec(supabase_client, 'events.display').gte('event_date', str(start_of_month)).lte('event_date', str(end_of_month)).order('event_date', desc=False))
 
             if events:
                 is_admin = event.source.user_id in admin_ids
@@ -1109,12 +1210,7 @@ def handle_message(event):
 
 ⚡ **ใช้ปุ่มด้านล่างเลย**"""
         
-        safe_line_api_call(line_bot_api.reply_message,
-            ReplyMessageRequest(
-                reply_token=event.reply_token,
-                messages=[TextMessage(text=admin_help_text, quick_reply=create_admin_quick_reply())]
-            )
-        )
+        fast_reply(event, static_text_payload(admin_help_text, "admin"))
         return
     elif text == "เพิ่มกิจกรรม" and event.source.user_id in admin_ids:
         # Start guided event creation
@@ -1143,7 +1239,7 @@ def handle_message(event):
             # Log for debugging
             app.logger.info(f"Admin {event.source.user_id} requested event management")
             
-            response = supabase_client.table('events').select('*').order('event_date', desc=False).execute()
+            response = select_spec(supabase_client, 'events.display').order('event_date', desc=False).execute()
             events = response.data
             
             app.logger.info(f"Found {len(events) if events else 0} events")
@@ -1202,30 +1298,29 @@ def handle_message(event):
         # Start guided notification sending
         try:
             # Get subscriber count
-            subscribers_response = supabase_client.table('subscribers').select('user_id').execute()
-            subscriber_count = len(subscribers_response.data) if subscribers_response.data else 0
+            subscriber_count = len(subscriber_registry.ensure_fresh())
             
             # Get upcoming events for quick notification options
             today = date.today()
-            upcoming_response = supabase_client.table('events').select('*').gte('event_date', str(today)).order('event_date', desc=False).limit(5).execute()
+            upcoming_response = select_spec(supabase_client, 'events.ids').gte('event_date', str(today)).order('event_date', desc=False).limit(5).execute()
             upcoming_events = upcoming_response.data if upcoming_response.data else []
             
             user_states[event.source.user_id] = {"step": "notify_menu"}
+
+            # Cost of one message to every subscriber
+            quota_tracker.maybe_sync()
+            cost_preview = format_plan_preview(quota_tracker.plan(subscriber_count))
             
-            # Create notification menu
-            notify_menu = QuickReply(items=[
-                QuickReplyItem(action=MessageAction(label="📝 ข้อความกำหนดเอง", text="ข้อความกำหนดเอง")),
-                QuickReplyItem(action=MessageAction(label="📅 แจ้งกิจกรรมถัดไป", text="แจ้งกิจกรรมถัดไป")),
-                QuickReplyItem(action=MessageAction(label="🤖 ทดสอบแจ้งเตือนอัตโนมัติ", text="ทดสอบแจ้งเตือนอัตโนมัติ")),
-                QuickReplyItem(action=MessageAction(label="📊 ดูสถิติผู้สมัคร", text="ดูสถิติผู้สมัคร")),
-                QuickReplyItem(action=MessageAction(label="❌ ยกเลิก", text="สวัสดี"))
-            ])
+            # Notification menu
+            notify_menu = get_quick_reply("notify_menu")
             
             guide_text = f"""📢 ส่งแจ้งเตือนให้ผู้สมัคร
 
 👥 **จำนวนผู้สมัครปัจจุบัน:** {subscriber_count} คน
 📅 **กิจกรรมถัดไป:** {len(upcoming_events)} รายการ
 
+{cost_preview}
+
 🔸 **เลือกประเภทการแจ้งเตือน:**
 
 • **ข้อความกำหนดเอง** - พิมพ์ข้อความเอง
@@ -1254,7 +1349,7 @@ def handle_message(event):
             return
     elif text == "/list" and event.source.user_id in admin_ids:
         try:
-            response = supabase_client.table('events').select('*').order('event_date', desc=False).execute()
+            response = select_spec(supabase_client, 'events.display').order('event_date', desc=False).execute()
             events = response.data
             
             if events:
@@ -1329,6 +1424,7 @@ def handle_message(event):
                 'event_description': new_description,
                 'event_date': str(new_date)
             }).eq('id', event_id).execute()
+            event_store.record(response.data)
             
             if response.data and len(response.data) > 0:
                 safe_line_api_call(line_bot_api.reply_message,
@@ -1367,7 +1463,7 @@ def handle_message(event):
             event_id = int(event_id_str)
             
             # First get event details for confirmation
-            get_response = supabase_client.table('events').select('*').eq('id', event_id).execute()
+            get_response = select_spec(supabase_client, 'events.display').eq('id', event_id).execute()
             
             if get_response.data and len(get_response.data) > 0:
                 event_data = get_response.data[0]
@@ -1376,6 +1472,7 @@ def handle_message(event):
                 delete_response = supabase_client.table('events').delete().eq('id', event_id).execute()
                 
                 if delete_response.data:
+                    event_store.remove(event_id)
                     safe_line_api_call(line_bot_api.reply_message,
                         ReplyMessageRequest(
                             reply_token=event.reply_token,
@@ -1418,7 +1515,7 @@ def handle_message(event):
             event_id = int(text[len("แก้ไข "):].strip())
             
             # Get current event data
-            response = supabase_client.table('events').select('*').eq('id', event_id).execute()
+            response = select_spec(supabase_client, 'events.display').eq('id', event_id).execute()
             if response.data and len(response.data) > 0:
                 event_data = response.data[0]
                 current_date = event_data.get('event_date', '2025-01-01')
@@ -1430,14 +1527,8 @@ def handle_message(event):
                     "current_data": event_data
                 }
                 
-                # Create selection buttons for what to edit
-                edit_menu = QuickReply(items=[
-                    QuickReplyItem(action=MessageAction(label="📝 แก้ชื่อ", text="แก้ชื่อ")),
-                    QuickReplyItem(action=MessageAction(label="📋 แก้รายละเอียด", text="แก้รายละเอียด")),
-                    QuickReplyItem(action=MessageAction(label="📅 แก้วันที่", text="แก้วันที่")),
-                    QuickReplyItem(action=MessageAction(label="🔄 แก้ทั้งหมด", text="แก้ทั้งหมด")),
-                    QuickReplyItem(action=MessageAction(label="❌ ยกเลิก", text="สวัสดี"))
-                ])
+                # Selection buttons for what to edit
+                edit_menu = get_quick_reply("edit_menu")
                 
                 guide_text = f"""✏️ แก้ไขกิจกรรม ID: {event_id}
 
@@ -1482,7 +1573,7 @@ def handle_message(event):
             event_id = int(text[len("ลบ "):].strip())
             
             # Get event details for confirmation
-            response = supabase_client.table('events').select('*').eq('id', event_id).execute()
+            response = select_spec(supabase_client, 'events.display').eq('id', event_id).execute()
             if response.data and len(response.data) > 0:
                 event_data = response.data[0]
                 
@@ -1532,7 +1623,7 @@ def handle_message(event):
             event_id = int(text[len("ยืนยันลบ "):].strip())
             
             # Get event details before deleting
-            get_response = supabase_client.table('events').select('*').eq('id', event_id).execute()
+            get_response = select_spec(supabase_client, 'events.display').eq('id', event_id).execute()
             
             if get_response.data and len(get_response.data) > 0:
                 event_data = get_response.data[0]
@@ -1541,6 +1632,7 @@ def handle_message(event):
                 delete_response = supabase_client.table('events').delete().eq('id', event_id).execute()
                 
                 if delete_response.data:
+                    event_store.remove(event_id)
                     success_text = f"🗑️ ลบกิจกรรมเรียบร้อยแล้วครับ!\n\n📝 {event_data.get('event_title', '')}\n🆔 ID: {event_id}\n\n✅ การลบสำเร็จ"
                     safe_line_api_call(line_bot_api.reply_message,
                         ReplyMessageRequest(
@@ -1661,9 +1753,8 @@ def handle_message(event):
                 del user_states[user_id]  # Clear state
                 
                 try:
-                    # Search in title and description
-                    response = supabase_client.table('events').select('*').or_(f"event_title.ilike.%{search_term}%,event_description.ilike.%{search_term}%").order('event_date', desc=False).execute()
-                    events = response.data
+                    # Search in title and description (in-memory index)
+                    events = search_events(search_term)
                     
                     if events:
                         is_admin = user_id in admin_ids
@@ -1764,8 +1855,8 @@ def handle_message(event):
                         return
                 
                 try:
-                    response = supabase_client.table('events').select('*').eq('event_date', actual_date).execute()
-                    events = response.data
+                    events = read_events(lambda dates: dates.on_date(actual_date),
+                                         lambda: select_spec(supabase_client, 'events.display').eq('event_date', actual_date))
                     
                     if events:
                         is_admin = user_id in admin_ids
@@ -1839,14 +1930,8 @@ def handle_message(event):
                     elif search_term.lower() in ["เมื่อวาน", "yesterday"]:
                         actual_search_term = str(date.today() - timedelta(days=1))
                     
-                    # Check if search term is a date (original or converted)
-                    if re.match(r'\d{4}-\d{2}-\d{2}', actual_search_term):
-                        response = supabase_client.table('events').select('*').eq('event_date', actual_search_term).execute()
-                    else:
-                        # Search in title and description
-                        response = supabase_client.table('events').select('*').or_(f"event_title.ilike.%{actual_search_term}%,event_description.ilike.%{actual_search_term}%").order('event_date', desc=False).execute()
-                    
-                    events = response.data
+                    # Dates (YYYY-MM-DD / YYYY-MM) become filters, other words must all match
+                    events = search_events(actual_search_term)
                     
                     if events:
                         is_admin = user_id in admin_ids
@@ -1904,8 +1989,10 @@ def handle_message(event):
                 
                 if selected_option == "ข้อความกำหนดเอง":
                     state["step"] = "notify_custom_input"
+                    quota_tracker.maybe_sync()
+                    cost_preview = format_plan_preview(quota_tracker.plan(len(subscriber_registry.ensure_fresh())))
                     
-                    guide_text = """📝 ข้อความกำหนดเอง
+                    guide_text = f"""📝 ข้อความกำหนดเอง
 
 🔸 **พิมพ์ข้อความที่ต้องการส่ง:**
 
@@ -1914,7 +2001,9 @@ def handle_message(event):
 • ⚠️ เลื่องกิจกรรมประชุม เนื่องจากฝนตก
 • 🎉 ขอเชิญร่วมกิจกรรมวันแม่ วันอาทิตย์นี้
 
-💬 พิมพ์ข้อความแล้วส่งมา (จะส่งให้ผู้สมัครทุกคน)"""
+💬 พิมพ์ข้อความแล้วส่งมา (จะส่งให้ผู้สมัครทุกคน)
+
+{cost_preview}"""
                     
                     safe_line_api_call(line_bot_api.reply_message,
                         ReplyMessageRequest(
@@ -1928,53 +2017,19 @@ def handle_message(event):
                     # Get next upcoming event
                     try:
                         today = date.today()
-                        response = supabase_client.table('events').select('*').gte('event_date', str(today)).order('event_date', desc=False).limit(1).execute()
+                        upcoming = read_events(lambda dates: dates.upcoming(str(today), 1),
+                                               lambda: select_spec(supabase_client, 'events.display').gte('event_date', str(today)).order('event_date', desc=False).limit(1))
                         
-                        if response.data and len(response.data) > 0:
-                            event_data = response.data[0]
-                            formatted_date = format_thai_date(event_data.get('event_date', ''))
-                            
-                            notification_message = f"""🔔 แจ้งเตือนกิจกرรม
-
-📝 **{event_data.get('event_title', '')}**
-📋 {event_data.get('event_description', '')}
-📅 **วันที่:** {formatted_date}
-
-📲 ส่งจาก: ระบบแจ้งเตือนกิจกรรม"""
+                        if upcoming:
+                            event_data = upcoming[0]
+                            notification_message = notification_templates.event_message('next_event', event_data)
                             
                             # Send to all subscribers
-                            subscribers_response = supabase_client.table('subscribers').select('user_id').execute()
-                            if subscribers_response.data:
-                                sent_count = 0
-                                failed_count = 0
-                                
-                                for subscriber in subscribers_response.data:
-                                    try:
-                                        safe_line_api_call(line_bot_api.push_message,
-                                            PushMessageRequest(
-                                                to=subscriber['user_id'],
-                                                messages=[TextMessage(text=notification_message)]
-                                            )
-                                        )
-                                        sent_count += 1
-                                    except Exception as e:
-                                        app.logger.error(f"Failed to send notification to {subscriber['user_id']}: {e}")
-                                        failed_count += 1
-                                
-                                success_message = f"""📢 ส่งแจ้งเตือนสำเร็จ!
-
-📝 **กิจกรรม:** {event_data.get('event_title', '')}
-✅ **ส่งสำเร็จ:** {sent_count} คน
-❌ **ส่งไม่สำเร็จ:** {failed_count} คน
-
-📊 **รวม:** {sent_count + failed_count} คน"""
-                                
-                                safe_line_api_call(line_bot_api.reply_message,
-                                    ReplyMessageRequest(
-                                        reply_token=event.reply_token,
-                                        messages=[TextMessage(text=success_message, quick_reply=create_admin_quick_reply())]
-                                    )
-                                )
+                            recipients = subscriber_registry.ensure_fresh().recipients()
+                            if recipients:
+                                queue_subscriber_broadcast(event, recipients, [notification_message],
+                                                           "📢 ส่งแจ้งเตือนสำเร็จ!",
+                                                           f"📝 **กิจกรรม:** {event_data.get('event_title', '')}")
                             else:
                                 safe_line_api_call(line_bot_api.reply_message,
                                     ReplyMessageRequest(
@@ -2016,6 +2071,7 @@ def handle_message(event):
 
 📊 **ผลการส่ง:**
 ✅ ส่งแจ้งเตือนได้: {result['notifications_sent']} ข้อความ
+⏭️ เคยส่งแล้ว (ข้าม): {result['already_delivered']} ข้อความ
 📅 กิจกรรมวันนี้: {result['events_today']} รายการ
 📅 กิจกรรมพรุ่งนี้: {result['events_tomorrow']} รายการ  
 👥 ผู้สมัครทั้งหมด: {result['subscribers']} คน
@@ -2062,17 +2118,14 @@ https://notibot-1234.onrender.com/send-notifications"""
                 elif selected_option == "ดูสถิติผู้สมัคร":
                     try:
                         # Get subscriber statistics
-                        subscribers_response = supabase_client.table('subscribers').select('user_id').execute()
-                        subscriber_count = len(subscribers_response.data) if subscribers_response.data else 0
+                        subscriber_count = len(subscriber_registry.ensure_fresh())
                         
                         # Get total events
-                        events_response = supabase_client.table('events').select('id').execute()
-                        total_events = len(events_response.data) if events_response.data else 0
+                        total_events = count_rows(supabase_client, 'events')
                         
                         # Get upcoming events
                         today = date.today()
-                        upcoming_response = supabase_client.table('events').select('id').gte('event_date', str(today)).execute()
-                        upcoming_events = len(upcoming_response.data) if upcoming_response.data else 0
+                        upcoming_events = execute_count(count_query(supabase_client, 'events').gte('event_date', str(today)))
                         
                         stats_text = f"""📊 สถิติระบบแจ้งเตือน
 
@@ -2114,43 +2167,14 @@ https://notibot-1234.onrender.com/send-notifications"""
                 
                 try:
                     # Send custom message to all subscribers
-                    subscribers_response = supabase_client.table('subscribers').select('user_id').execute()
+                    recipients = subscriber_registry.ensure_fresh().recipients()
                     
-                    if subscribers_response.data:
-                        sent_count = 0
-                        failed_count = 0
+                    if recipients:
+                        notification_message = notification_templates.announcement_message(custom_message)
                         
-                        notification_text = f"""📢 {custom_message}
-
-📲 ส่งจาก: ระบบแจ้งเตือนกิจกรรม"""
-                        
-                        for subscriber in subscribers_response.data:
-                            try:
-                                safe_line_api_call(line_bot_api.push_message,
-                                    PushMessageRequest(
-                                        to=subscriber['user_id'],
-                                        messages=[TextMessage(text=notification_text)]
-                                    )
-                                )
-                                sent_count += 1
-                            except Exception as e:
-                                app.logger.error(f"Failed to send custom notification to {subscriber['user_id']}: {e}")
-                                failed_count += 1
-                        
-                        success_message = f"""📢 ส่งข้อความกำหนดเองสำเร็จ!
-
-💬 **ข้อความ:** {custom_message}
-✅ **ส่งสำเร็จ:** {sent_count} คน
-❌ **ส่งไม่สำเร็จ:** {failed_count} คน
-
-📊 **รวม:** {sent_count + failed_count} คน"""
-                        
-                        safe_line_api_call(line_bot_api.reply_message,
-                            ReplyMessageRequest(
-                                reply_token=event.reply_token,
-                                messages=[TextMessage(text=success_message, quick_reply=create_admin_quick_reply())]
-                            )
-                        )
+                        queue_subscriber_broadcast(event, recipients, [notification_message],
+                                                   "📢 ส่งข้อความกำหนดเองสำเร็จ!",
+                                                   f"💬 **ข้อความ:** {custom_message}")
                     else:
                         safe_line_api_call(line_bot_api.reply_message,
                             ReplyMessageRequest(
@@ -2264,6 +2288,7 @@ https://notibot-1234.onrender.com/send-notifications"""
                         'event_date': str(event_date),
                         'created_by': user_id
                     }).execute()
+                    event_store.record(response.data)
                     
                     if response.data and len(response.data) > 0:
                         event_id = response.data[0]['id']
@@ -2401,6 +2426,7 @@ https://notibot-1234.onrender.com/send-notifications"""
                     response = supabase_client.table('events').update({
                         'event_title': new_title
                     }).eq('id', state["event_id"]).execute()
+                    event_store.record(response.data)
                     
                     if response.data and len(response.data) > 0:
                         success_text = f"""🎉 แก้ไขชื่อสำเร็จ!
@@ -2447,6 +2473,7 @@ https://notibot-1234.onrender.com/send-notifications"""
                     response = supabase_client.table('events').update({
                         'event_description': new_description
                     }).eq('id', state["event_id"]).execute()
+                    event_store.record(response.data)
                     
                     if response.data and len(response.data) > 0:
                         success_text = f"""🎉 แก้ไขรายละเอียดสำเร็จ!
@@ -2527,6 +2554,7 @@ https://notibot-1234.onrender.com/send-notifications"""
                     response = supabase_client.table('events').update({
                         'event_date': event_date_str
                     }).eq('id', state["event_id"]).execute()
+                    event_store.record(response.data)
                     
                     if response.data and len(response.data) > 0:
                         success_text = f"""🎉 แก้ไขวันที่สำเร็จ!
@@ -2595,12 +2623,9 @@ https://notibot-1234.onrender.com/send-notifications"""
                 state["event_data"]["description"] = new_description
                 state["step"] = "edit_waiting_date"
                 
-                # Add current date as first option
+                # Current date is offered as the first option
                 current_date_str = state["current_data"].get('event_date', '')
-                same_date_button = QuickReplyItem(action=MessageAction(label="📅 วันเดิม", text="เหมือนเดิม"))
-                
-                date_buttons = create_date_quick_reply()
-                date_buttons.items.insert(0, same_date_button)
+                date_buttons = create_edit_date_quick_reply()
                 
                 guide_text = f"""✏️ แก้ไขกิจกรรม - ขั้นตอน 3/3
 
@@ -2666,6 +2691,7 @@ https://notibot-1234.onrender.com/send-notifications"""
                         'event_description': state["event_data"]["description"],
                         'event_date': event_date_str
                     }).eq('id', state["event_id"]).execute()
+                    event_store.record(response.data)
                     
                     if response.data and len(response.data) > 0:
                         success_text = f"""🎉 แก้ไขกิจกรรมสำเร็จ!
@@ -2732,43 +2758,14 @@ https://notibot-1234.onrender.com/send-notifications"""
             
             try:
                 # Send message to all subscribers
-                subscribers_response = supabase_client.table('subscribers').select('user_id').execute()
+                recipients = subscriber_registry.ensure_fresh().recipients()
                 
-                if subscribers_response.data:
-                    sent_count = 0
-                    failed_count = 0
-                    
-                    notification_text = f"""📢 {custom_message}
-
-📲 ส่งจาก: ระบบแจ้งเตือนกิจกรรม"""
-                    
-                    for subscriber in subscribers_response.data:
-                        try:
-                            safe_line_api_call(line_bot_api.push_message,
-                                PushMessageRequest(
-                                    to=subscriber['user_id'],
-                                    messages=[TextMessage(text=notification_text)]
-                                )
-                            )
-                            sent_count += 1
-                        except Exception as e:
-                            app.logger.error(f"Failed to send notification via command to {subscriber['user_id']}: {e}")
-                            failed_count += 1
+                if recipients:
+                    notification_message = notification_templates.announcement_message(custom_message)
                     
-                    success_message = f"""📢 ส่งข้อความสำเร็จ!
-
-💬 **ข้อความ:** {custom_message}
-✅ **ส่งสำเร็จ:** {sent_count} คน
-❌ **ส่งไม่สำเร็จ:** {failed_count} คน
-
-📊 **รวม:** {sent_count + failed_count} คน"""
-                    
-                    safe_line_api_call(line_bot_api.reply_message,
-                        ReplyMessageRequest(
-                            reply_token=event.reply_token,
-                            messages=[TextMessage(text=success_message, quick_reply=create_admin_quick_reply())]
-                        )
-                    )
+                    queue_subscriber_broadcast(event, recipients, [notification_message],
+                                               "📢 ส่งข้อความสำเร็จ!",
+                                               f"💬 **ข้อความ:** {custom_message}")
                 else:
                     safe_line_api_call(line_bot_api.reply_message,
                         ReplyMessageRequest(
@@ -2811,6 +2808,7 @@ https://notibot-1234.onrender.com/send-notifications"""
                     'event_date': str(event_date),
                     'created_by': event.source.user_id
                 }).execute()
+                event_store.record(response.data)
                 
                 if response.data and len(response.data) > 0:
                     event_id = response.data[0]['id']
@@ -2843,14 +2841,6 @@ https://notibot-1234.onrender.com/send-notifications"""
         # Start guided search flow
         user_states[event.source.user_id] = {"step": "search_menu"}
         
-        # Create search menu buttons
-        search_menu = QuickReply(items=[
-            QuickReplyItem(action=MessageAction(label="📝 ค้นหาชื่อ/รายละเอียด", text="ค้นหาข้อความ")),
-            QuickReplyItem(action=MessageAction(label="📅 ค้นหาวันที่", text="ค้นหาวันที่")),
-            QuickReplyItem(action=MessageAction(label="🔍 ค้นหาทั้งหมด", text="ค้นหาทั้งหมด")),
-            QuickReplyItem(action=MessageAction(label="❌ ยกเลิก", text="สวัสดี"))
-        ])
-        
         search_help = """🔍 เลือกประเภทการค้นหา
 
 🔸 **ค้นหาชื่อ/รายละเอียด** - ค้นหาจากคำในชื่อหรือรายละเอียดกิจกรรม
@@ -2859,28 +2849,35 @@ https://notibot-1234.onrender.com/send-notifications"""
 
 เลือกปุ่มด้านล่างเพื่อเริ่มค้นหา"""
         
-        safe_line_api_call(line_bot_api.reply_message,
-            ReplyMessageRequest(
-                reply_token=event.reply_token,
-                messages=[TextMessage(text=search_help, quick_reply=search_menu)]
-            )
-        )
+        fast_reply(event, static_text_payload(search_help, "event_search_menu"))
         return
 
     # ==================== CONTACT MANAGEMENT COMMANDS ===================="
     
     # Handle show all contacts in Thai FIRST (before conversion)
     if text.lower() in ["เบอร์ทั้งหมด", "ทั้งหมด", "ดูทั้งหมด", "รายการทั้งหมด"]:
-        contacts = get_all_contacts()
+        snapshot = snapshot_reader.current() if snapshot_reader else None
+        if snapshot and snapshot.has('contacts') and snapshot.built_at >= contacts_written_at:
+            # Newest first in the shared snapshot - decode only the 20 rows shown
+            total_contacts = snapshot.count('contacts')
+            contacts = snapshot.rows('contacts', 0, 20)
+        elif contact_store:
+            # Columnar book in memory - count and newest 20 without a query
+            total_contacts = get_contacts_stats()["total"]
+            contacts = search_contacts_by_category("recent", limit=20)
+        else:
+            # Count on the server and download only the 20 rows shown
+            total_contacts = count_rows(supabase_client, 'contacts')
+            contacts = search_contacts_by_category("recent", limit=20) if total_contacts else []
         if not contacts:
             msg = "📭 ยังไม่มีเบอร์โทรในสมุด\n\n💡 เริ่มเพิ่มเบอร์แรกกันเลย!"
             quick_reply = create_contact_quick_reply()
         else:
-            msg = f"📋 สมุดเบอร์โทร ({len(contacts)} คน)\n\n"
-            for i, contact in enumerate(contacts[:20], 1):
+            msg = f"📋 สมุดเบอร์โทร ({total_contacts} คน)\n\n"
+            for i, contact in enumerate(contacts, 1):
                 msg += f"{i}. {contact['name']} - {contact['phone_number']}\n"
-            if len(contacts) > 20:
-                msg += f"\n... และอีก {len(contacts) - 20} คน"
+            if total_contacts > 20:
+                msg += f"\n... และอีก {total_contacts - 20} คน"
             msg += "\n\n💡 ลองค้นหาคนที่ต้องการดู"
             quick_reply = create_contact_quick_reply()
         
@@ -2898,11 +2895,7 @@ https://notibot-1234.onrender.com/send-notifications"""
     # Check for incomplete commands and provide help
     incomplete = detect_incomplete_command(converted_command)
     if incomplete:
-        from linebot.v3.messaging import QuickReply, QuickReplyItem, MessageAction
-        quick_reply = QuickReply(items=[
-            QuickReplyItem(action=MessageAction(label=f"💡 {suggestion[:20]}", text=suggestion))
-            for suggestion in incomplete["suggestions"][:10]
-        ])
+        quick_reply = create_suggestion_quick_reply(tuple(incomplete["suggestions"]))
         safe_line_api_call(line_bot_api.reply_message,
             ReplyMessageRequest(
                 reply_token=event.reply_token,
@@ -3109,12 +3102,7 @@ https://notibot-1234.onrender.com/send-notifications"""
 📞 **สมุดเบอร์:** เพิ่ม, หา, สถิติ
 💡 **ใช้งานง่าย:** กดปุ่มด้านล่าง"""
         
-        safe_line_api_call(line_bot_api.reply_message,
-            ReplyMessageRequest(
-                reply_token=event.reply_token,
-                messages=[TextMessage(text=help_text, quick_reply=create_comprehensive_quick_reply())]
-            )
-        )
+        fast_reply(event, static_text_payload(help_text, "comprehensive"))
         return
     
     # Show ALL commands menu
@@ -3128,12 +3116,7 @@ https://notibot-1234.onrender.com/send-notifications"""
 
 💡 **12 คำสั่งหลัก กดเลย!**"""
         
-        safe_line_api_call(line_bot_api.reply_message,
-            ReplyMessageRequest(
-                reply_token=event.reply_token,
-                messages=[TextMessage(text=help_text, quick_reply=create_all_commands_quick_reply())]
-            )
-        )
+        fast_reply(event, static_text_payload(help_text, "all_commands"))
         return
     
     # Show search commands only
@@ -3148,12 +3131,7 @@ https://notibot-1234.onrender.com/send-notifications"""
 
 💡 **ค้นหาอะไรก็ได้!**"""
         
-        safe_line_api_call(line_bot_api.reply_message,
-            ReplyMessageRequest(
-                reply_token=event.reply_token,
-                messages=[TextMessage(text=help_text, quick_reply=create_search_commands_quick_reply())]
-            )
-        )
+        fast_reply(event, static_text_payload(help_text, "search_commands"))
         return
     
     # Show admin commands only (admin only)
@@ -3170,12 +3148,7 @@ https://notibot-1234.onrender.com/send-notifications"""
 
 💼 **สิทธิ์แอดมินเท่านั้น**"""
         
-        safe_line_api_call(line_bot_api.reply_message,
-            ReplyMessageRequest(
-                reply_token=event.reply_token,
-                messages=[TextMessage(text=help_text, quick_reply=create_admin_all_commands_quick_reply())]
-            )
-        )
+        fast_reply(event, static_text_payload(help_text, "admin_all_commands"))
         return
     
     # Show date commands only
@@ -3189,12 +3162,7 @@ https://notibot-1234.onrender.com/send-notifications"""
 
 💡 **ดูกิจกรรมได้หลายแบบ!**"""
         
-        safe_line_api_call(line_bot_api.reply_message,
-            ReplyMessageRequest(
-                reply_token=event.reply_token,
-                messages=[TextMessage(text=help_text, quick_reply=create_date_commands_quick_reply())]
-            )
-        )
+        fast_reply(event, static_text_payload(help_text, "date_commands"))
         return
 
     # Handle main help command 
@@ -3219,21 +3187,7 @@ https://notibot-1234.onrender.com/send-notifications"""
 
 🎯 **กดปุ่มด้านล่างเพื่อดูเมนูทั้งหมด!**"""
         
-        # Create help quick reply with all menu options
-        help_quick_reply = QuickReply(items=[
-            QuickReplyItem(action=MessageAction(label="📝 คำสั่งทั้งหมด", text="คำสั่งทั้งหมด")),
-            QuickReplyItem(action=MessageAction(label="🔍 คำสั่งค้นหา", text="คำสั่งค้นหา")),
-            QuickReplyItem(action=MessageAction(label="📅 คำสั่งวันที่", text="คำสั่งวันที่")),
-            QuickReplyItem(action=MessageAction(label="🚀 เมนูรวม", text="เมนูรวม")),
-            QuickReplyItem(action=MessageAction(label="🏠 เมนูหลัก", text="สวัสดี"))
-        ])
-        
-        safe_line_api_call(line_bot_api.reply_message,
-            ReplyMessageRequest(
-                reply_token=event.reply_token,
-                messages=[TextMessage(text=help_text, quick_reply=help_quick_reply)]
-            )
-        )
+        fast_reply(event, static_text_payload(help_text, "help"))
         return
 
     # Handle help command in Thai
@@ -3246,12 +3200,7 @@ https://notibot-1234.onrender.com/send-notifications"""
 
 💡 **เหมาะสำหรับข้อมูลหลายพันรายการ**"""
         
-        safe_line_api_call(line_bot_api.reply_message,
-            ReplyMessageRequest(
-                reply_token=event.reply_token,
-                messages=[TextMessage(text=help_text, quick_reply=create_contact_quick_reply())]
-            )
-        )
+        fast_reply(event, static_text_payload(help_text, "contact"))
         return
     
     # Handle admin contact commands (disabled - function not implemented)
@@ -3261,6 +3210,23 @@ https://notibot-1234.onrender.com/send-notifications"""
     # ==================== END CONTACT MANAGEMENT ====================
     
     else:
+        if expired_step is not None:
+            # Probably an answer to the menu that timed out, not an unknown command
+            minutes = int(user_states.ttl // 60)
+            if event.source.user_id in admin_ids and expired_step.startswith(("waiting_", "edit_", "notify_")):
+                expired_msg = f"⌛ หมดเวลาทำรายการแล้ว (ไม่มีการตอบกลับเกิน {minutes} นาที)\n\nข้อมูลที่กรอกไว้ยังไม่ถูกบันทึก กรุณาเริ่มใหม่อีกครั้ง"
+                quick_reply = create_admin_quick_reply()
+            else:
+                expired_msg = f"⌛ หมดเวลาค้นหาแล้ว (ไม่มีการตอบกลับเกิน {minutes} นาที)\n\nกรุณาเลือกเมนูใหม่อีกครั้ง"
+                quick_reply = create_main_quick_reply()
+            safe_line_api_call(line_bot_api.reply_message,
+                ReplyMessageRequest(
+                    reply_token=event.reply_token,
+                    messages=[TextMessage(text=expired_msg, quick_reply=quick_reply)]
+                )
+            )
+            return
+        
         safe_line_api_call(line_bot_api.reply_message,
             ReplyMessageRequest(
                 reply_token=event.reply_token,
@@ -0,0 +1,557 @@
+# -*- coding: utf-8 -*-
+"""
+Micro-benchmarks for the per-message helpers
+ไมโครเบนช์มาร์กสำหรับฟังก์ชันที่ทำงานกับทุกข้อความ
+
+Usage:
+    python benchmarks.py                  # compare with benchmark_baseline.json
+    python benchmarks.py --save           # record a new baseline
+    python benchmarks.py --threshold 25   # fail when a case is >25% slower
+    python benchmarks.py --rounds 5       # keep each case's best of 5 passes (default 3)
+    python benchmarks.py -k quick_reply   # run only matching cases
+    python benchmarks.py --sizes          # query payload bytes, select('*') vs specs
+    python benchmarks.py --memory         # cached row bytes, dicts vs slotted records
+    python benchmarks.py --columnar       # columnar contacts store at 100k and 1M contacts
+    python benchmarks.py --replica        # local SQLite replica vs PostgREST query latency
+    python benchmarks.py --change-feed    # polling change feed against a local stand-in (exit 1 on failure)
+"""
+
+import argparse
+import json
+import os
+import re
+import sys
+import tempfile
+import timeit
+import tracemalloc
+
+# app.py connects clients at import time; placeholders are enough because
+# none of the benchmarked helpers touch the network.
+os.environ.setdefault('SUPABASE_URL', 'http://localhost:54321')
+os.environ.setdefault('SUPABASE_SERVICE_KEY', 'eyJhbGciOiJIUzI1NiJ9.eyJyb2xlIjoic2VydmljZV9yb2xlIn0.benchmark')
+os.environ.setdefault('LINE_CHANNEL_ACCESS_TOKEN', 'benchmark')
+os.environ.setdefault('LINE_CHANNEL_SECRET', 'benchmark')
+
+import app  # noqa: E402
+from contact_management import validate_phone_number, create_contact_flex_message  # noqa: E402
+from fast_reply import build_reply_body, static_text_payload  # noqa: E402
+from query_specs import spec_columns, select_spec  # noqa: E402
+from notification_templates import NotificationTemplates  # noqa: E402
+from event_search import EventSearchIndex  # noqa: E402
+from event_date_index import EventDateIndex  # noqa: E402
+from records import EventRecord, ContactRecord  # noqa: E402
+from contact_columns import ContactColumnStore  # noqa: E402
+from local_replica import LocalReplica  # noqa: E402
+from fuzzy_search import FuzzyContactIndex  # noqa: E402
+from change_feed import ChangeFeed, PollingChangeFeed  # noqa: E402
+import contact_management  # noqa: E402
+from linebot.v3.messaging import ReplyMessageRequest, TextMessage  # noqa: E402
+from types import SimpleNamespace  # noqa: E402
+
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmark_baseline.json')
+DEFAULT_THRESHOLD = 20.0  # percent
+DEFAULT_ROUNDS = 3        # passes over all cases; each case keeps its best time
+MIN_CHANGE_US = 1.0       # slowdowns smaller than this are timer noise, never a regression
+
+# ==================== FIXTURES ====================
+
+THAI_COMMANDS = [
+    "เพิ่มเบอร์ สมชาย ใจดี 081-234-5678",
+    "บันทึกเบอร์ นางสาวดาว 089-999-8888",
+    "หาเบอร์ จีรวัฒน์",
+    "ค้นหา ผกก. สภ.เมือง",
+    "เบอร์ของ หัวหน้าสถานี",
+    "ชื่อ สมศรี",
+    "เบอร์ 093",
+    "หา ประชุม",
+    "/today",
+    "สวัสดี",
+]
+
+INCOMPLETE_COMMANDS = ["add_phone", "เพิ่มเบอร์", "search_phone", "หา", "search_phone สมชาย", "/next"]
+
+PHONE_NUMBERS = ["081-234-5678", "0812345678", "(02) 123 4567", "021234567", "12345", "095 555 1212"]
+
+DATE_STRINGS = ["2025-08-09", "2025-12-31", "2026-01-01", "2025-02-28", "invalid-date"]
+
+EVENT_ROWS = [
+    {
+        "id": 100 + i,
+        "event_title": f"ประชุมทีมงาน ครั้งที่ {i + 1}",
+        "event_description": "เวลา 08.30 น. มอบ มหาราช 2 มหาราช 5 ณ ห้องประชุมใหญ่ ชั้น 3",
+        "event_date": f"2025-08-{10 + i:02d}",
+    }
+    for i in range(10)
+]
+
+CONTACT_ROWS = [
+    {
+        "id": 500 + i,
+        "name": f"นางสาวทดสอบ ระบบเบอร์ {i + 1}",
+        "phone_number": f"08{i % 10}-234-56{i:02d}",
+        "created_at": "2025-08-09T14:17:00+00:00",
+    }
+    for i in range(10)
+]
+
+# Rows as PostgREST returns them for select('*') (every column in the schema)
+TABLE_ROWS = {
+    'events': [
+        dict(row, id=i, created_by="U1234567890abcdef1234567890abcdef",
+             created_at="2025-08-01T09:15:27.123456+00:00")
+        for i, row in enumerate(EVENT_ROWS * 100)
+    ],
+    'contacts': [
+        dict(row, id=i, created_by="U1234567890abcdef1234567890abcdef",
+             updated_at="2025-08-09T14:17:00.654321+00:00")
+        for i, row in enumerate(CONTACT_ROWS * 100)
+    ],
+}
+
+def project_rows(rows, spec):
+    """Keep only the columns a query spec selects"""
+    columns = [c.strip() for c in spec_columns(spec).split(',')]
+    return [{c: row[c] for c in columns if c in row} for row in rows]
+
+# Response bodies for 1000 rows: select('*') vs the projected spec
+ROW_PAYLOADS = {
+    'events_select_star': json.dumps(TABLE_ROWS['events'], ensure_ascii=False),
+    'events_display': json.dumps(project_rows(TABLE_ROWS['events'], 'events.display'), ensure_ascii=False),
+    'contacts_select_star': json.dumps(TABLE_ROWS['contacts'], ensure_ascii=False),
+    'contacts_display': json.dumps(project_rows(TABLE_ROWS['contacts'], 'contacts.display'), ensure_ascii=False),
+    'subscribers_count_rows': json.dumps([{"user_id": f"U{i:032x}"} for i in range(1000)]),
+    'subscribers_count_head': '',  # count='exact', head=True returns only Content-Range
+}
+
+# ==================== CASES ====================
+
+BENCHMARKS = {}
+
+def benchmark(name):
+    """Register a zero-argument callable as a benchmark case"""
+    def decorator(func):
+        BENCHMARKS[name] = func
+        return func
+    return decorator
+
+@benchmark("convert_thai_to_english_command")
+def bench_convert_thai_to_english_command():
+    for text in THAI_COMMANDS:
+        app.convert_thai_to_english_command(text)
+
+@benchmark("detect_incomplete_command")
+def bench_detect_incomplete_command():
+    for text in INCOMPLETE_COMMANDS:
+        app.detect_incomplete_command(text)
+
+@benchmark("validate_phone_number")
+def bench_validate_phone_number():
+    for phone in PHONE_NUMBERS:
+        validate_phone_number(phone)
+
+@benchmark("format_thai_date")
+def bench_format_thai_date():
+    for date_str in DATE_STRINGS:
+        app.format_thai_date(date_str)
+
+@benchmark("create_event_flex_message")
+def bench_create_event_flex_message():
+    app.create_event_flex_message(EVENT_ROWS[0], is_admin=True)
+
+@benchmark("create_contact_flex_message")
+def bench_create_contact_flex_message():
+    create_contact_flex_message(CONTACT_ROWS[0], is_single=True)
+
+@benchmark("create_events_carousel_message_10")
+def bench_create_events_carousel_message():
+    app.create_events_carousel_message(EVENT_ROWS, is_admin=True)
+
+@benchmark("reply_body_carousel_sdk")
+def bench_reply_body_carousel_sdk():
+    messages = [
+        app.create_events_carousel_message(EVENT_ROWS, is_admin=True),
+        TextMessage(text="เลือกดูกิจกรรมอื่นๆ ได้เลยครับ", quick_reply=app.create_main_quick_reply()),
+    ]
+    request = ReplyMessageRequest(reply_token="benchmark", messages=messages)
+    json.dumps(app.line_bot_api.api_client.sanitize_for_serialization(request))
+
+@benchmark("reply_body_carousel_fast")
+def bench_reply_body_carousel_fast():
+    build_reply_body("benchmark", [
+        app.create_events_carousel_payload(EVENT_ROWS, is_admin=True),
+        static_text_payload("เลือกดูกิจกรรมอื่นๆ ได้เลยครับ", "main"),
+    ])
+
+def _decode_payload(key):
+    payload = ROW_PAYLOADS[key]
+    return lambda: json.loads(payload) if payload else []
+
+for _key in ('events_select_star', 'events_display', 'contacts_select_star', 'contacts_display'):
+    benchmark(f"rows_decode_{_key}_1000")(_decode_payload(_key))
+
+@benchmark("notification_reminders_render_10")
+def bench_notification_reminders_render():
+    templates = NotificationTemplates(app.format_thai_date, cache_size=0)
+    for row in EVENT_ROWS:
+        templates.reminder_message(row, 'tomorrow')
+
+@benchmark("notification_reminders_cached_10")
+def bench_notification_reminders_cached():
+    for row in EVENT_ROWS:
+        app.notification_templates.reminder_message(row, 'tomorrow')
+
+EVENT_INDEX = EventSearchIndex()
+EVENT_INDEX.rebuild(TABLE_ROWS['events'])
+
+@benchmark("event_search_index_1000")
+def bench_event_search_index():
+    EVENT_INDEX.search("ประชุม ครั้งที่ 5")
+    EVENT_INDEX.search("ห้องประชุมใหญ่ 2025-08")
+
+DATE_INDEX = EventDateIndex()
+DATE_INDEX.rebuild(TABLE_ROWS['events'])
+
+@benchmark("event_date_index_1000")
+def bench_event_date_index():
+    DATE_INDEX.on_date("2025-08-15")
+    DATE_INDEX.upcoming("2025-08-12", 5)
+    DATE_INDEX.month(2025, 8)
+
+FUZZY_INDEX = FuzzyContactIndex(client=None)
+FUZZY_INDEX.rebuild(TABLE_ROWS['contacts'])
+
+@benchmark("contact_fuzzy_search_1000")
+def bench_contact_fuzzy_search():
+    FUZZY_INDEX.search("นางสาวทดสบ", 10)
+    FUZZY_INDEX.search("ระบบเบอ 7", 10)
+
+DISPLAY_ROWS = {
+    'events': json.loads(ROW_PAYLOADS['events_display']),
+    'contacts': json.loads(ROW_PAYLOADS['contacts_display']),
+}
+
+@benchmark("records_from_rows_1000")
+def bench_records_from_rows():
+    [EventRecord.from_row(row) for row in DISPLAY_ROWS['events']]
+    [ContactRecord.from_row(row) for row in DISPLAY_ROWS['contacts']]
+
+QUICK_REPLY_BUILDERS = [
+    app.create_main_quick_reply,
+    app.create_admin_quick_reply,
+    app.create_contact_quick_reply,
+    app.create_smart_search_quick_reply,
+    app.create_cancel_quick_reply,
+    app.create_comprehensive_quick_reply,
+    app.create_event_quick_reply,
+    app.create_compact_contact_quick_reply,
+    app.create_all_commands_quick_reply,
+    app.create_search_commands_quick_reply,
+    app.create_admin_all_commands_quick_reply,
+    app.create_date_commands_quick_reply,
+    app.create_date_quick_reply,
+]
+
+@benchmark("quick_reply_static_builders")
+def bench_quick_reply_static_builders():
+    for builder in QUICK_REPLY_BUILDERS:
+        builder()
+
+@benchmark("quick_reply_dynamic_builders")
+def bench_quick_reply_dynamic_builders():
+    app.create_pagination_quick_reply(3, 7, "ล่าสุด")
+    app.create_delete_confirm_quick_reply(42)
+
+# ==================== RUNNER ====================
+
+def measure(func, repeat=5):
+    """Return the best per-call time in microseconds"""
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    best = min(timer.repeat(repeat=repeat, number=number))
+    return best / number * 1_000_000
+
+def load_baseline(path=BASELINE_FILE):
+    """Load stored baseline results, or an empty dict if none exist"""
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+def save_baseline(results, path=BASELINE_FILE):
+    """Write benchmark results as the new baseline"""
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+        f.write('\n')
+
+def run(selected=None, threshold=DEFAULT_THRESHOLD, save=False, baseline_path=BASELINE_FILE, rounds=DEFAULT_ROUNDS):
+    """Run benchmarks and return the list of regressed case names
+
+    Cases are measured in `rounds` interleaved passes and keep their best
+    time, so one noisy pass (CPU frequency, a GC pause) doesn't decide the
+    result. The same applies when saving, so baseline and run are comparable.
+    """
+    baseline = load_baseline(baseline_path)
+    cases = {name: func for name, func in BENCHMARKS.items()
+             if not selected or any(key in name for key in selected)}
+    best = {}
+    for _ in range(max(1, rounds)):
+        for name, func in cases.items():
+            per_call = measure(func)
+            best[name] = min(per_call, best.get(name, per_call))
+
+    results = {}
+    regressions = []
+    print(f"{'case':<40} {'us/call':>12} {'baseline':>12} {'change':>9}")
+    for name, per_call in best.items():
+        results[name] = {"per_call_us": round(per_call, 3)}
+
+        previous = baseline.get(name, {}).get("per_call_us")
+        if previous:
+            change = (per_call - previous) / previous * 100
+            regressed = change > threshold and per_call - previous >= MIN_CHANGE_US
+            marker = "  <-- REGRESSION" if regressed else ""
+            print(f"{name:<40} {per_call:>12.2f} {previous:>12.2f} {change:>+8.1f}%{marker}")
+            if regressed:
+                regressions.append(name)
+        else:
+            print(f"{name:<40} {per_call:>12.2f} {'-':>12} {'new':>9}")
+
+    if save:
+        baseline.update(results)
+        save_baseline(baseline, baseline_path)
+        print(f"\nBaseline saved to {baseline_path}")
+
+    return regressions
+
+def print_payload_sizes():
+    """Print response body sizes for select('*') vs projected/count-only queries"""
+    print(f"{'payload (1000 rows)':<40} {'bytes':>12}")
+    for key, payload in ROW_PAYLOADS.items():
+        print(f"{key:<40} {len(payload.encode('utf-8')):>12}")
+
+def _allocated(build):
+    """Bytes still allocated by the object build() returns"""
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    kept = build()
+    size = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    del kept
+    return size
+
+def print_record_sizes():
+    """Print bytes per cached row: decoded dicts vs slotted records (values shared)"""
+    print(f"{'cached row':<40} {'dict':>10} {'record':>10} {'saved':>8}")
+    for table, record_type in (('events', EventRecord), ('contacts', ContactRecord)):
+        rows = DISPLAY_ROWS[table]
+        as_dicts = _allocated(lambda: [dict(row) for row in rows]) / len(rows)
+        as_records = _allocated(lambda: [record_type.from_row(row) for row in rows]) / len(rows)
+        saved = 100.0 * (as_dicts - as_records) / as_dicts
+        print(f"{table + ' (bytes/row)':<40} {as_dicts:>10.0f} {as_records:>10.0f} {saved:>7.0f}%")
+
+COLUMNAR_SIZES = (100_000, 1_000_000)
+FIRST_NAMES = ["สมชาย", "สมศรี", "จีรวัฒน์", "ดาว", "Somchai", "ประเสริฐ", "วันดี", "กิตติ"]
+LAST_NAMES = ["ใจดี", "ทองคำ", "ศรีสุข", "Jaidee", "มหาราช", "สภ.เมือง"]
+
+def synthetic_contacts(count):
+    """Contacts with a realistic mix of mobile/landline numbers and creation dates"""
+    prefixes = ["081", "089", "093", "062", "02", "053", "074"]
+    for i in range(count):
+        prefix = prefixes[i % len(prefixes)]
+        rest = f"{i:08d}"[-(10 - len(prefix)):]
+        yield {
+            "id": i + 1,
+            "name": f"{FIRST_NAMES[i % 8]} {LAST_NAMES[i % 6]} {i}",
+            "phone_number": f"{prefix}-{rest[:3]}-{rest[3:]}",
+            "created_at": f"2025-{i % 12 + 1:02d}-{i % 28 + 1:02d}T08:00:00+00:00",
+        }
+
+def print_columnar_timings():
+    """Print build and query times for the columnar contacts store"""
+    queries = [
+        ("stats()", lambda store: store.stats()),
+        ("category('mobile', 20)", lambda store: store.category("mobile", 20)),
+        ("category('recent', 20)", lambda store: store.category("recent", 20)),
+        ("phone_prefix('093')", lambda store: store.phone_prefix("093", 20)),
+        ("phone_lookup('0930005000', exact)", lambda store: store.phone_lookup("0930005000", exact=True)),
+        ("search(['จีรวัฒน์'])", lambda store: store.search(["จีรวัฒน์"], limit=50)),
+        ("search(['5678'])", lambda store: store.search(["5678"], limit=50)),
+        ("search(['สม', 'ทอง'], all)", lambda store: store.search(["สม", "ทอง"], match_all=True, limit=50)),
+    ]
+    for size in COLUMNAR_SIZES:
+        rows = list(synthetic_contacts(size))
+        store = ContactColumnStore(client=None)
+        started = timeit.default_timer()
+        store.build(rows)
+        del rows
+        print(f"\n{size:,} contacts - build {timeit.default_timer() - started:.2f} s")
+        print(f"{'query':<40} {'ms/call':>10}")
+        for label, query in queries:
+            per_call = min(timeit.repeat(lambda: query(store), number=3, repeat=3)) / 3
+            print(f"{label:<40} {per_call * 1000:>10.2f}")
+
+REPLICA_CONTACTS = 100_000
+
+def print_replica_timings():
+    """Print query times for the local SQLite replica, next to PostgREST when Supabase is reachable
+
+    PostgREST timings use the real SUPABASE_URL/SUPABASE_SERVICE_KEY from the
+    environment; with the benchmark placeholders that column shows '-'.
+    """
+    client = contact_management.supabase_client
+    live = not os.environ['SUPABASE_URL'].startswith('http://localhost:54321')
+    display = lambda spec: select_spec(client, spec)
+    queries = [
+        ("contacts: name 'จีรวัฒน์'",
+         lambda replica: replica.search_contacts(["จีรวัฒน์"], limit=50),
+         lambda: contact_management._bulk_search_query(["จีรวัฒน์"], 50)),
+        ("contacts: digits '5678'",
+         lambda replica: replica.search_contacts(["5678"], limit=50),
+         lambda: contact_management._bulk_search_query(["5678"], 50)),
+        ("contacts: 'สม' and 'ทอง', page 2",
+         lambda replica: replica.search_contacts(["สม", "ทอง"], match_all=True, limit=10, offset=10),
+         lambda: display('contacts.display').or_("name.ilike.%สม%,phone_number.ilike.%สม%")
+                 .or_("name.ilike.%ทอง%,phone_number.ilike.%ทอง%").order('name').range(10, 19).execute()),
+        ("contacts: phone 0930005000",
+         lambda replica: replica.phone_lookup("0930005000", exact=True),
+         lambda: contact_management._phone_search_query('exact', "0930005000", 50)),
+        ("events: on_date 2025-08-15",
+         lambda replica: replica.on_date("2025-08-15"),
+         lambda: display('events.display').eq('event_date', "2025-08-15").execute()),
+        ("events: search 'ประชุม ครั้งที่ 5'",
+         lambda replica: replica.search_events("ประชุม ครั้งที่ 5"),
+         lambda: display('events.display').or_("event_title.ilike.%ประชุม%,event_description.ilike.%ประชุม%")
+                 .or_("event_title.ilike.%ครั้งที่%,event_description.ilike.%ครั้งที่%")
+                 .or_("event_title.ilike.%5%,event_description.ilike.%5%").order('event_date').execute()),
+    ]
+    with tempfile.TemporaryDirectory() as directory:
+        replica = LocalReplica(client=None, path=os.path.join(directory, 'replica.db'))
+        started = timeit.default_timer()
+        replica.upsert('contacts', list(synthetic_contacts(REPLICA_CONTACTS)))
+        replica.upsert('events', TABLE_ROWS['events'])
+        print(f"{REPLICA_CONTACTS:,} contacts + {len(TABLE_ROWS['events']):,} events - "
+              f"load {timeit.default_timer() - started:.2f} s")
+        print(f"{'query':<40} {'replica ms':>12} {'PostgREST ms':>14}")
+        for label, local, remote in queries:
+            per_call = min(timeit.repeat(lambda: local(replica), number=5, repeat=3)) / 5
+            remote_ms = '-'
+            if live:
+                try:
+                    remote_ms = f"{min(timeit.repeat(remote, number=1, repeat=3)) * 1000:.2f}"
+                except Exception as e:
+                    remote_ms = f"error: {e}"[:14]
+            print(f"{label:<40} {per_call * 1000:>12.2f} {remote_ms:>14}")
+
+# ==================== CHANGE FEED CHECK ====================
+
+KEYSET_FILTER = re.compile(r'(\w+)\.gt\."([^"]*)",and\(\1\.eq\."\2",id\.gt\.(\d+)\)')
+
+class StandInQuery:
+    """The slice of the postgrest query builder PollingChangeFeed uses, over a list of dicts"""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.columns = None
+        self.filters = []
+        self.orders = []
+        self.count = None
+
+    def select(self, columns):
+        self.columns = [column.strip() for column in columns.split(',')]
+        return self
+
+    def or_(self, expression):
+        column, value, row_id = KEYSET_FILTER.fullmatch(expression).groups()
+        self.filters.append(lambda r: r[column] > value or (r[column] == value and r['id'] > int(row_id)))
+        return self
+
+    def order(self, column, desc=False):
+        self.orders.append((column, desc))
+        return self
+
+    def limit(self, count):
+        self.count = count
+        return self
+
+    def execute(self):
+        rows = [row for row in self.rows if all(match(row) for match in self.filters)]
+        for column, desc in reversed(self.orders):
+            rows.sort(key=lambda row: row[column], reverse=desc)
+        return SimpleNamespace(data=[{c: row[c] for c in self.columns} for row in rows[:self.count]])
+
+class StandInClient:
+    def __init__(self, tables):
+        self.tables = tables
+
+    def table(self, name):
+        return StandInQuery(self.tables[name])
+
+def check_change_feed():
+    """Poll a stand-in contacts table whose new rows share timestamps across page boundaries
+
+    Returns True when every new row is published exactly once.
+    """
+    def contact(row_id, updated_at):
+        return {'id': row_id, 'name': f'ทดสอบ {row_id}', 'phone_number': '081-234-5678',
+                'created_at': updated_at, 'updated_at': updated_at}
+
+    rows = [contact(i, '2025-08-09T10:00:00') for i in range(1, 4)]
+    feed = ChangeFeed()
+    published = []
+    feed.subscribe('contacts', lambda op, record, old_record: published.append(record['id']))
+    poller = PollingChangeFeed(feed, StandInClient({'contacts': rows}), {'contacts': 'updated_at'}, page_size=4)
+    poller.prime()
+
+    # Three rows tie with the primed cursor, then groups of three cross each page of four
+    new_ids = list(range(4, 16))
+    rows.extend(contact(i, f'2025-08-09T10:0{(i - 1) // 3}:00') for i in new_ids)
+    poller.poll_once()
+    rows.append(contact(16, '2025-08-09T10:04:00'))  # ties the last seen timestamp
+    poller.poll_once()
+
+    expected = new_ids + [16]
+    ok = sorted(published) == expected and len(published) == len(set(published))
+    print(f"{'polling change feed, ties across pages':<40} {len(published):>3} published, "
+          f"{len(expected)} expected  {'✅' if ok else '❌'}")
+    return ok
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Micro-benchmarks for LINE Bot hot helpers")
+    parser.add_argument('--save', action='store_true', help="store results as the new baseline")
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help=f"allowed slowdown in percent before failing (default {DEFAULT_THRESHOLD:g})")
+    parser.add_argument('--rounds', type=int, default=DEFAULT_ROUNDS,
+                        help=f"passes over the cases, keeping each case's best (default {DEFAULT_ROUNDS})")
+    parser.add_argument('-k', dest='selected', action='append', help="only run cases whose name contains this")
+    parser.add_argument('--baseline', default=BASELINE_FILE, help="baseline JSON file")
+    parser.add_argument('--sizes', action='store_true', help="print query payload sizes and exit")
+    parser.add_argument('--memory', action='store_true', help="print cached row sizes and exit")
+    parser.add_argument('--columnar', action='store_true', help="print columnar contacts timings and exit")
+    parser.add_argument('--replica', action='store_true', help="print local replica vs PostgREST timings and exit")
+    parser.add_argument('--change-feed', action='store_true', help="check the polling change feed against a stand-in")
+    args = parser.parse_args(argv)
+
+    if args.sizes:
+        print_payload_sizes()
+        return 0
+    if args.memory:
+        print_record_sizes()
+        return 0
+    if args.columnar:
+        print_columnar_timings()
+        return 0
+    if args.replica:
+        print_replica_timings()
+        return 0
+    if args.change_feed:
+        return 0 if check_change_feed() else 1
+
+    regressions = run(args.selected, args.threshold, args.save, args.baseline, args.rounds)
+    if regressions and not args.save:
+        print(f"\n❌ {len(regressions)} case(s) regressed more than {args.threshold:g}%: {', '.join(regressions)}")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+"""
+Background fan-out executor for LINE Bot broadcasts
+ส่งข้อความถึงผู้สมัครจำนวนมากในเบื้องหลัง โดยไม่บล็อก webhook
+
+Broadcast jobs run on a small job pool so the webhook can reply right away.
+Inside a job, multicast requests go through a separate bounded request pool,
+so at most BROADCAST_MAX_PARALLEL_REQUESTS calls hit the LINE API at once
+no matter how many jobs are running.
+
+Environment:
+    BROADCAST_MAX_JOBS=2                  broadcasts running at the same time
+    BROADCAST_MAX_PARALLEL_REQUESTS=4     concurrent LINE API requests
+"""
+
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_MAX_JOBS = 2
+DEFAULT_MAX_PARALLEL_REQUESTS = 4
+
+class BroadcastExecutor:
+    """Run broadcast jobs in the background with bounded request concurrency"""
+
+    def __init__(self, max_jobs=DEFAULT_MAX_JOBS, max_parallel_requests=DEFAULT_MAX_PARALLEL_REQUESTS, logger=None):
+        self.logger = logger or logging.getLogger(__name__)
+        self._jobs = ThreadPoolExecutor(max_workers=max_jobs, thread_name_prefix='broadcast-job')
+        self._requests = ThreadPoolExecutor(max_workers=max_parallel_requests, thread_name_prefix='broadcast-send')
+
+    def submit(self, job, on_done=None):
+        """Queue job(); on_done(result, duration_seconds) is called when it finishes"""
+        def run():
+            started = time.perf_counter()
+            try:
+                result = job()
+            except Exception as e:
+                self.logger.error(f"Broadcast job failed: {e}")
+                result = {"error": str(e)}
+            duration = time.perf_counter() - started
+            if on_done:
+                try:
+                    on_done(result, duration)
+                except Exception as e:
+                    self.logger.error(f"Broadcast completion callback failed: {e}")
+            return result
+        return self._jobs.submit(run)
+
+    def map_requests(self, func, items):
+        """Call func(item) for every item on the request pool; results keep item order"""
+        if len(items) <= 1:
+            return [func(item) for item in items]
+        return list(self._requests.map(func, items))
+
+    def shutdown(self, wait=True):
+        self._jobs.shutdown(wait=wait)
+        self._requests.shutdown(wait=wait)
+
+def create_broadcast_executor_from_env(logger=None):
+    """Build a BroadcastExecutor configured from environment variables"""
+    return BroadcastExecutor(
+        max_jobs=int(os.getenv('BROADCAST_MAX_JOBS', DEFAULT_MAX_JOBS)),
+        max_parallel_requests=int(os.getenv('BROADCAST_MAX_PARALLEL_REQUESTS', DEFAULT_MAX_PARALLEL_REQUESTS)),
+        logger=logger,
+    )
@@ -0,0 +1,227 @@
+# -*- coding: utf-8 -*-
+"""
+Change feed for LINE Bot local caches
+กระจายการเปลี่ยนแปลงของตาราง events / contacts / subscribers ไปยัง cache ในแต่ละ worker
+
+ChangeFeed is an in-process hub: caches register listeners per table and
+receive (op, record, old_record) with op in INSERT / UPDATE / DELETE.
+Two optional sources feed it:
+
+    RealtimeChangeConsumer - Supabase Realtime postgres_changes on a
+        dedicated asyncio thread. Needs the tables in the realtime
+        publication (and REPLICA IDENTITY FULL so deletes carry the row):
+
+            ALTER PUBLICATION supabase_realtime ADD TABLE events, contacts, subscribers;
+            ALTER TABLE events REPLICA IDENTITY FULL;
+            ALTER TABLE contacts REPLICA IDENTITY FULL;
+            ALTER TABLE subscribers REPLICA IDENTITY FULL;
+
+    PollingChangeFeed - polls each table for rows after the last seen
+        (cursor column, id) pair, cursor column being updated_at /
+        created_at, and publishes them as UPDATE. Keying on id as well means
+        rows sharing a timestamp across a page boundary are not skipped.
+        Works with any client exposing the postgrest query builder, so a
+        local stand-in can drive it (python benchmarks.py --change-feed).
+        Polling cannot see deletes; caches still need their periodic reload.
+
+Environment:
+    CHANGE_FEED_MODE=off|realtime|polling
+    CHANGE_FEED_POLL_SECONDS=30
+    CHANGE_FEED_POLL_COLUMNS=events:created_at,contacts:updated_at,subscribers:created_at
+"""
+
+import asyncio
+import logging
+import os
+import threading
+from collections import defaultdict
+
+from query_specs import spec_columns, after_cursor_filter
+
+TABLES = ('events', 'contacts', 'subscribers')
+
+# Columns published for each table (the caches' own query specs)
+TABLE_SPECS = {
+    'events': 'events.display',
+    'contacts': 'contacts.display',
+    'subscribers': 'subscribers.registry',
+}
+
+# events has no updated_at column; add one to see edits when polling
+DEFAULT_POLL_COLUMNS = 'events:created_at,contacts:updated_at,subscribers:created_at'
+DEFAULT_POLL_SECONDS = 30
+
+class ChangeFeed:
+    """Dispatch row changes to per-table listeners"""
+
+    def __init__(self, logger=None):
+        self.logger = logger or logging.getLogger(__name__)
+        self._listeners = defaultdict(list)
+        self.events_received = 0
+
+    def subscribe(self, table, listener):
+        """listener(op, record, old_record) is called for every change to table"""
+        self._listeners[table].append(listener)
+
+    def publish(self, table, op, record=None, old_record=None):
+        self.events_received += 1
+        for listener in self._listeners.get(table, ()):
+            try:
+                listener(op, record or {}, old_record or {})
+            except Exception as e:
+                self.logger.error(f"Change listener for {table} failed: {e}")
+
+    @property
+    def tables(self):
+        return [table for table, listeners in self._listeners.items() if listeners]
+
+class RealtimeChangeConsumer:
+    """Feed ChangeFeed from Supabase Realtime postgres_changes"""
+
+    def __init__(self, feed, supabase_url, supabase_key, tables=TABLES, logger=None):
+        self.feed = feed
+        self.url = supabase_url.rstrip('/').replace('http', 'ws', 1) + '/realtime/v1'
+        self.key = supabase_key
+        self.tables = tables
+        self.logger = logger or logging.getLogger(__name__)
+        self._loop = None
+        self._thread = None
+        self._client = None
+
+    def _on_change(self, payload):
+        data = payload.get('data', payload)
+        table = data.get('table')
+        op = (data.get('type') or data.get('eventType') or '').upper()
+        if table and op:
+            self.feed.publish(table, op, data.get('record'), data.get('old_record'))
+
+    async def _consume(self):
+        from realtime import AsyncRealtimeClient
+
+        self._client = AsyncRealtimeClient(self.url, token=self.key, auto_reconnect=True)
+        await self._client.connect()
+        channel = self._client.channel('notibot-cache')
+        for table in self.tables:
+            channel.on_postgres_changes('*', callback=self._on_change, table=table, schema='public')
+        await channel.subscribe()
+        self.logger.info(f"Realtime change feed subscribed to {', '.join(self.tables)}")
+        await self._client.listen()
+
+    def _run(self):
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        try:
+            self._loop.run_until_complete(self._consume())
+        except Exception as e:
+            self.logger.error(f"Realtime change feed stopped: {e}")
+        finally:
+            self._loop.close()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="realtime-change-feed", daemon=True)
+        self._thread.start()
+        return self._thread
+
+    def stop(self):
+        if self._loop and self._client and self._loop.is_running():
+            asyncio.run_coroutine_threadsafe(self._client.close(), self._loop)
+
+def parse_poll_columns(value):
+    """'events:created_at,contacts:updated_at' -> {'events': 'created_at', ...}"""
+    columns = {}
+    for part in value.split(','):
+        if ':' in part:
+            table, column = part.split(':', 1)
+            columns[table.strip()] = column.strip()
+    return columns
+
+class PollingChangeFeed:
+    """Feed ChangeFeed by polling a monotonically increasing cursor column per table"""
+
+    def __init__(self, feed, client, cursor_columns, interval=DEFAULT_POLL_SECONDS, page_size=500, logger=None):
+        self.feed = feed
+        self.client = client
+        self.cursor_columns = cursor_columns
+        self.interval = interval
+        self.page_size = page_size
+        self.logger = logger or logging.getLogger(__name__)
+        self.cursors = {}  # table -> (cursor value, id) of the last published row
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _columns(self, table):
+        columns = spec_columns(TABLE_SPECS[table])
+        names = [c.strip() for c in columns.split(',')]
+        for extra in (self.cursor_columns[table], 'id'):
+            if extra not in names:
+                columns += f", {extra}"
+        return columns
+
+    def prime(self):
+        """Start every cursor at the newest existing row so only later changes are published"""
+        for table, cursor in self.cursor_columns.items():
+            response = self.client.table(table).select(f"{cursor}, id") \
+                .order(cursor, desc=True).order('id', desc=True).limit(1).execute()
+            rows = response.data or []
+            self.cursors[table] = (rows[0].get(cursor), rows[0]['id']) if rows and rows[0].get(cursor) else None
+
+    def poll_table(self, table):
+        """Publish rows changed since the last poll; returns how many were published"""
+        cursor_column = self.cursor_columns[table]
+        published = 0
+        while True:
+            query = self.client.table(table).select(self._columns(table))
+            if self.cursors.get(table):
+                query = query.or_(after_cursor_filter(cursor_column, *self.cursors[table]))
+            rows = query.order(cursor_column).order('id').limit(self.page_size).execute().data or []
+            for row in rows:
+                self.feed.publish(table, 'UPDATE', row, None)
+                if row.get(cursor_column):
+                    self.cursors[table] = (row[cursor_column], row['id'])
+            published += len(rows)
+            if len(rows) < self.page_size or not rows[-1].get(cursor_column):
+                return published
+
+    def poll_once(self):
+        """Poll every configured table once"""
+        return {table: self.poll_table(table) for table in self.cursor_columns}
+
+    def _run(self):
+        try:
+            self.prime()
+        except Exception as e:
+            self.logger.error(f"Error priming change feed cursors: {e}")
+        while not self._stop.wait(self.interval):
+            try:
+                self.poll_once()
+            except Exception as e:
+                self.logger.error(f"Error polling change feed: {e}")
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="polling-change-feed", daemon=True)
+        self._thread.start()
+        return self._thread
+
+    def stop(self):
+        self._stop.set()
+
+def change_feed_mode():
+    return os.getenv('CHANGE_FEED_MODE', 'off').lower()
+
+def change_feed_enabled():
+    return change_feed_mode() in ('realtime', 'polling')
+
+def start_change_feed_from_env(feed, client, supabase_url, supabase_key, logger=None):
+    """Start the configured change-feed source; returns it, or None when disabled"""
+    mode = change_feed_mode()
+    if mode == 'realtime':
+        source = RealtimeChangeConsumer(feed, supabase_url, supabase_key, logger=logger)
+    elif mode == 'polling':
+        columns = parse_poll_columns(os.getenv('CHANGE_FEED_POLL_COLUMNS', DEFAULT_POLL_COLUMNS))
+        source = PollingChangeFeed(feed, client, {t: c for t, c in columns.items() if t in TABLE_SPECS},
+                                   interval=int(os.getenv('CHANGE_FEED_POLL_SECONDS', DEFAULT_POLL_SECONDS)),
+                                   logger=logger)
+    else:
+        return None
+    source.start()
+    return source
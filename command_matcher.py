@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+"""
+Thai natural-language command matcher
+ตัวจับคำสั่งภาษาไทย (เพิ่มเบอร์/หาเบอร์ ฯลฯ) แบบคอมไพล์ครั้งเดียว
+
+All synonyms are compiled into one anchored alternation regex at startup,
+longest prefix first, so each message is matched in a single pass no matter
+how many intents or synonyms are registered.
+"""
+
+import json
+import os
+import re
+
+# Intent -> prefixes that trigger it. Extra synonyms can be supplied at startup
+# with a JSON file of the same shape via COMMAND_SYNONYMS_FILE.
+COMMAND_SYNONYMS = {
+    "add_phone": ["เพิ่มเบอร์", "บันทึกเบอร์", "เพิ่มชื่อ", "บันทึกชื่อ", "เก็บเบอร์"],
+    "search_phone": ["หาเบอร์", "ค้นหา", "หาชื่อ", "เบอร์ของ", "ชื่อ", "เบอร์", "หา"],
+}
+
+class CommandMatcher:
+    """Match a message against intent prefixes with longest-match semantics"""
+
+    def __init__(self, synonyms=None):
+        self._intents = {}
+        self._pattern = None
+        for intent, prefixes in (synonyms or {}).items():
+            self.register(intent, prefixes, compile_now=False)
+        self._compile()
+
+    def register(self, intent, prefixes, compile_now=True):
+        """Add prefixes for an intent; a prefix may only belong to one intent"""
+        for prefix in prefixes:
+            prefix = prefix.lower().strip()
+            if not prefix:
+                continue
+            owner = self._intents.get(prefix)
+            if owner and owner != intent:
+                raise ValueError(f"Prefix '{prefix}' already registered for intent '{owner}'")
+            self._intents[prefix] = intent
+        if compile_now:
+            self._compile()
+
+    def _compile(self):
+        if not self._intents:
+            self._pattern = None
+            return
+        # re alternation is leftmost-first, so longer prefixes must come first
+        alternatives = sorted(self._intents, key=len, reverse=True)
+        self._pattern = re.compile("^(?:" + "|".join(re.escape(p) for p in alternatives) + ")")
+
+    def match(self, text):
+        """Return (intent, argument) for the longest matching prefix, or None"""
+        if self._pattern is None:
+            return None
+        m = self._pattern.match(text)
+        if not m:
+            return None
+        return self._intents[m.group(0)], text[m.end():].strip()
+
+    @property
+    def intents(self):
+        """Mapping of prefix -> intent currently compiled into the matcher"""
+        return dict(self._intents)
+
+def load_synonyms(path=None):
+    """Return the default synonym table merged with an optional JSON file"""
+    synonyms = {intent: list(prefixes) for intent, prefixes in COMMAND_SYNONYMS.items()}
+    path = path or os.getenv('COMMAND_SYNONYMS_FILE')
+    if not path:
+        return synonyms
+
+    try:
+        with open(path, encoding='utf-8') as f:
+            extra = json.load(f)
+        for intent, prefixes in extra.items():
+            synonyms.setdefault(intent, []).extend(prefixes)
+    except Exception as e:
+        print(f"Error loading command synonyms from {path}: {e}")
+    return synonyms
+
+command_matcher = CommandMatcher(load_synonyms())
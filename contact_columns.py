@@ -0,0 +1,437 @@
+# -*- coding: utf-8 -*-
+"""
+Columnar in-memory contacts store for LINE Bot
+สมุดเบอร์แบบคอลัมน์ (NumPy) สำหรับนับสถิติ/กรองประเภท/ค้นหาทั้งสมุดในครั้งเดียว
+
+The whole book is held as a handful of NumPy arrays instead of one dict per
+contact:
+    ids           int64[n]
+    digits        uint8[n, 10]   phone digits, padded with 255
+    kinds         int8[n]        0 other, 1 mobile (06/08/09), 2 landline (02-05/07)
+    created_us    int64[n]       created_at as microseconds since the epoch
+    name_cps      uint16[...]    lowercased names as code points, 0 between names
+                                 (uint32 if a name has characters outside the BMP)
+    name_offsets  int64[n + 1]   start of each name in name_cps
+    name_rank     int64[n]       position of each contact in name order
+    phone_keys    int64[n]       sorted digits-as-number * 16 + digit count, with
+                                 phone_key_order giving the row of each key
+Category counts, the 30-day count, phone prefix/substring filters and name
+substring search are each a few vectorized passes over these arrays. A
+whole or leading phone number is a binary search over phone_keys instead.
+
+Writes made after a build go to a small overlay (new and edited contacts,
+plus a mask of replaced/deleted rows), so the arrays are only rebuilt on
+the reload interval. NumPy comes with pandas; without it the store is
+disabled and contact_management keeps querying Supabase.
+
+Environment:
+    CONTACT_COLUMNS=true                   enable the store
+    CONTACT_COLUMNS_RELOAD_SECONDS=900     rebuild interval
+"""
+
+import gc
+import logging
+import os
+import re
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+try:
+    import numpy as np
+    import pandas as pd
+except ImportError:  # optional - contact_management falls back to Supabase queries
+    np = pd = None
+
+from records import ContactRecord
+from snapshot_store import fetch_table
+
+PHONE_WIDTH = 10
+NO_DIGIT = 255
+KIND_OTHER, KIND_MOBILE, KIND_LANDLINE = 0, 1, 2
+MOBILE_PREFIXES = (6, 8, 9)
+LANDLINE_PREFIXES = (2, 3, 4, 5, 7)
+RECENT_DAYS = 30
+DIGIT_COUNT_BITS = 16         # phone key = digits zero-padded to 10, as a number, * 16 + digit count
+SORTED_RANGE_LIMIT = 4096     # larger phone ranges are paged with a name-order scan
+DEFAULT_RELOAD_SECONDS = 900
+
+PHONE_TERM = re.compile(r'^[\d\s\-\(\)]+$')
+NON_DIGITS = re.compile(r'\D')
+
+def phone_digits(value):
+    """'081-234-5678' -> '0812345678'"""
+    return NON_DIGITS.sub('', value or '')
+
+def _phone_kind(digits):
+    if len(digits) < 2 or digits[0] != '0':
+        return KIND_OTHER
+    second = int(digits[1])
+    if second in MOBILE_PREFIXES:
+        return KIND_MOBILE
+    if second in LANDLINE_PREFIXES:
+        return KIND_LANDLINE
+    return KIND_OTHER
+
+def _created_us(value):
+    try:
+        return int(datetime.fromisoformat(value).timestamp() * 1_000_000)
+    except (TypeError, ValueError):
+        return 0
+
+def _created_iso(us):
+    return datetime.fromtimestamp(us / 1_000_000, timezone.utc).isoformat() if us else None
+
+def _codepoints(text):
+    """Code points of text as uint16 when they all fit (Thai and most scripts), else uint32"""
+    cps = np.frombuffer(text.encode('utf-32-le'), dtype=np.uint32)
+    return cps.astype(np.uint16) if cps.max(initial=0) <= 0xFFFF else cps
+
+def _digit_matrix(phones):
+    """uint8[n, 10] of the digits in each phone string, left aligned and padded with NO_DIGIT"""
+    width = max(phones.dtype.itemsize // 4, PHONE_WIDTH)
+    chars = np.frombuffer(phones.astype(f'U{width}').tobytes(), dtype=np.uint32).reshape(len(phones), width)
+    is_digit = (chars >= ord('0')) & (chars <= ord('9'))
+    # Stable sort puts each row's digits first, in their original order
+    order = np.argsort(~is_digit, axis=1, kind='stable')[:, :PHONE_WIDTH]
+    digits = np.take_along_axis(chars, order, axis=1)
+    keep = np.take_along_axis(is_digit, order, axis=1)
+    return np.where(keep, digits - ord('0'), NO_DIGIT).astype(np.uint8)
+
+def _phone_key_bounds(digits, exact):
+    """[low, high] phone keys for a whole number (exact) or every number starting with digits"""
+    digits = digits[:PHONE_WIDTH]
+    low = int(digits.ljust(PHONE_WIDTH, '0')) * DIGIT_COUNT_BITS
+    if exact:
+        return low + len(digits), low + len(digits)
+    return low, int(digits.ljust(PHONE_WIDTH, '9')) * DIGIT_COUNT_BITS + DIGIT_COUNT_BITS - 1
+
+def _first_in_order(mask, order, wanted):
+    """The first `wanted` positions of order where mask is set
+
+    Scans order in growing chunks, so a dense mask (e.g. every mobile number)
+    stops after a few thousand rows instead of gathering the whole book.
+    """
+    found = []
+    count = 0
+    start = 0
+    chunk = max(wanted * 4, 1024)
+    while count < wanted and start < len(order):
+        part = order[start:start + chunk]
+        hits = part[mask[part]]
+        found.append(hits)
+        count += len(hits)
+        start += chunk
+        chunk *= 2
+    return np.concatenate(found)[:wanted] if found else order[:0]
+
+class ContactColumns:
+    """Immutable column arrays for one build of the contacts book"""
+
+    def __init__(self, rows):
+        n = len(rows)
+        self.size = n
+        self.ids = np.fromiter((row['id'] for row in rows), dtype=np.int64, count=n)
+
+        self.phones = np.array([row.get('phone_number') or '' for row in rows], dtype=str)
+        self.digits = _digit_matrix(self.phones)
+        second = self.digits[:, 1]
+        self.kinds = np.where(
+            (self.digits[:, 0] == 0) & np.isin(second, MOBILE_PREFIXES), KIND_MOBILE,
+            np.where((self.digits[:, 0] == 0) & np.isin(second, LANDLINE_PREFIXES), KIND_LANDLINE, KIND_OTHER)
+        ).astype(np.int8)
+
+        created = pd.to_datetime(pd.Series([row.get('created_at') for row in rows], dtype=object),
+                                 utc=True, format='ISO8601', errors='coerce')
+        self.created_us = (created.astype('int64') // 1000).where(created.notna(), 0).to_numpy(dtype=np.int64)
+
+        names = [row.get('name') or '' for row in rows]
+        self.names = ''.join(names)
+        self.display_offsets = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum([len(name) for name in names], out=self.display_offsets[1:])
+        # One lower() over the whole book; the 0 separators give each name's start
+        self.name_cps = _codepoints('\0'.join(name.replace('\0', '') for name in names).lower() + '\0')
+        self.name_offsets = np.zeros(n + 1, dtype=np.int64)
+        self.name_offsets[1:] = np.flatnonzero(self.name_cps == 0) + 1
+
+        by_name = sorted(range(n), key=names.__getitem__)
+        self.name_order = np.array(by_name, dtype=np.int64)
+        self.name_rank = np.empty(n, dtype=np.int64)
+        self.name_rank[self.name_order] = np.arange(n)
+        self.recent_order = np.argsort(-self.created_us, kind='stable')
+        self.id_order = np.argsort(self.ids)
+
+        present = self.digits != NO_DIGIT
+        place_values = 10 ** np.arange(PHONE_WIDTH - 1, -1, -1, dtype=np.int64)
+        keys = np.where(present, self.digits, 0).astype(np.int64) @ place_values * DIGIT_COUNT_BITS + present.sum(axis=1)
+        self.phone_key_order = np.argsort(keys, kind='stable')
+        self.phone_keys = keys[self.phone_key_order]
+
+    # ---------- vectorized predicates (boolean masks over all rows) ----------
+
+    def name_contains(self, term):
+        pattern = _codepoints(term.lower())
+        if pattern.dtype != self.name_cps.dtype and pattern.max(initial=0) > np.iinfo(self.name_cps.dtype).max:
+            return np.zeros(self.size, dtype=bool)  # a character that no name contains
+        pattern = pattern.astype(self.name_cps.dtype)
+        mask = np.zeros(self.size, dtype=bool)
+        m, total = len(pattern), len(self.name_cps)
+        if not m or m > total:
+            return mask
+        positions = np.flatnonzero(self.name_cps[:total - m + 1] == pattern[0])
+        for i in range(1, m):
+            if not positions.size:
+                break
+            positions = positions[self.name_cps[positions + i] == pattern[i]]
+        if positions.size:
+            mask[np.searchsorted(self.name_offsets, positions, side='right') - 1] = True
+        return mask
+
+    def phone_contains(self, digits, prefix_only=False):
+        pattern = np.frombuffer(digits.encode('ascii'), dtype=np.uint8) - ord('0')
+        mask = np.zeros(self.size, dtype=bool)
+        m = len(pattern)
+        if not m or m > PHONE_WIDTH:
+            return mask
+        for start in range(1 if prefix_only else PHONE_WIDTH - m + 1):
+            hit = self.digits[:, start] == pattern[0]
+            for i in range(1, m):
+                hit &= self.digits[:, start + i] == pattern[i]
+            mask |= hit
+        return mask
+
+    def phone_positions(self, digits, exact=False):
+        """Rows whose phone digits equal (exact) or start with digits - a binary search, no scan"""
+        if not digits:
+            return self.phone_key_order[:0]
+        low, high = _phone_key_bounds(digits, exact)
+        start = np.searchsorted(self.phone_keys, low, side='left')
+        stop = np.searchsorted(self.phone_keys, high, side='right')
+        return self.phone_key_order[start:stop]
+
+    def term_mask(self, term):
+        """Rows where term is in the name, or - for digit terms - in the phone number (like ilike)"""
+        mask = self.name_contains(term)
+        if PHONE_TERM.match(term):
+            digits = phone_digits(term)
+            if digits:
+                mask |= self.phone_contains(digits)
+        return mask
+
+    def kind_mask(self, kind):
+        return self.kinds == kind
+
+    def recent_mask(self, since_us):
+        return self.created_us >= since_us
+
+    # ---------- rows ----------
+
+    def record(self, i):
+        start, end = self.display_offsets[i], self.display_offsets[i + 1]
+        return ContactRecord(int(self.ids[i]), self.names[start:end], str(self.phones[i]), _created_iso(int(self.created_us[i])))
+
+    def position_of(self, contact_id):
+        index = np.searchsorted(self.ids, contact_id, sorter=self.id_order)
+        if index < self.size and self.ids[self.id_order[index]] == contact_id:
+            return int(self.id_order[index])
+        return None
+
+class ContactColumnStore:
+    """Columnar contacts book with an overlay for writes between rebuilds"""
+
+    def __init__(self, client, reload_seconds=DEFAULT_RELOAD_SECONDS, snapshot=None, logger=None):
+        self.client = client
+        self.reload_seconds = reload_seconds
+        self.snapshot = snapshot
+        self.logger = logger or logging.getLogger(__name__)
+        self._lock = threading.RLock()
+        self.columns = None
+        self._dead = None          # rows replaced or deleted since the build
+        self._overlay = {}         # id -> ContactRecord written since the build
+        self.loaded_at = 0.0
+        self.changed_at = 0.0
+
+    # ---------- loading ----------
+
+    def build(self, rows):
+        # The build only allocates; skip cyclic GC passes over the row dicts
+        gc_was_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            columns = ContactColumns(rows)
+        finally:
+            if gc_was_enabled:
+                gc.enable()
+        with self._lock:
+            self.columns = columns
+            self._dead = np.zeros(columns.size, dtype=bool)
+            self._overlay = {}
+            self.loaded_at = time.time()
+        return columns.size
+
+    def load(self):
+        snapshot = self.snapshot.current() if self.snapshot else None
+        if snapshot and snapshot.has('contacts') and snapshot.built_at >= self.changed_at:
+            rows = snapshot.rows('contacts')
+        else:
+            rows = fetch_table(self.client, 'contacts.display')
+        return self.build(rows)
+
+    def ensure_fresh(self):
+        """Build on first use, then rebuild when the interval has passed"""
+        if not self.loaded_at:
+            self.load()
+        elif time.time() - self.loaded_at >= self.reload_seconds:
+            try:
+                self.load()
+            except Exception as e:
+                self.loaded_at = time.time()  # keep serving the current build, retry next interval
+                self.logger.error(f"Error rebuilding contact columns: {e}")
+        return self
+
+    # ---------- hooks ----------
+
+    def _retire(self, contact_id):
+        position = self.columns.position_of(contact_id) if self.columns else None
+        if position is not None:
+            self._dead[position] = True
+        self._overlay.pop(contact_id, None)
+
+    def record(self, row):
+        """Add or replace a contact returned by an insert/update response"""
+        if not row or row.get('id') is None:
+            return
+        with self._lock:
+            self.changed_at = time.time()
+            self._retire(row['id'])
+            self._overlay[row['id']] = ContactRecord.from_row(row)
+
+    def remove(self, contact_id):
+        with self._lock:
+            self.changed_at = time.time()
+            self._retire(contact_id)
+
+    def apply_change(self, op, record, old_record):
+        """Change-feed listener for the contacts table"""
+        if not self.loaded_at:
+            return
+        if op == 'DELETE':
+            if old_record.get('id') is not None:
+                self.remove(old_record['id'])
+            else:
+                self.loaded_at = 0.0
+        else:
+            self.record(record)
+
+    # ---------- queries ----------
+
+    def _view(self):
+        """(columns, live-row mask, overlay records) read together, so a rebuild can't mix two builds"""
+        with self._lock:
+            return self.columns, ~self._dead, list(self._overlay.values())
+
+    def _collect(self, view, mask, order, overlay_match, sort_key, reverse, limit, offset, with_total=False):
+        """Rows matching mask (in `order`) merged with matching overlay records, then paged
+
+        with_total=True returns (rows, number of matches across all pages).
+        """
+        columns, live, overlay = view
+        mask = mask & live
+        overlay = [record for record in overlay if overlay_match(record)]
+        wanted = offset + limit
+        matched = _first_in_order(mask, order, wanted)
+        rows = [columns.record(int(i)) for i in matched] + overlay
+        if overlay:
+            rows.sort(key=sort_key, reverse=reverse)
+        if with_total:
+            return rows[offset:wanted], int(np.count_nonzero(mask)) + len(overlay)
+        return rows[offset:wanted]
+
+    def _overlay_term_match(self, term):
+        lowered = term.lower()
+        digits = phone_digits(term) if PHONE_TERM.match(term) else ''
+        return lambda record: lowered in (record.name or '').lower() or (digits and digits in phone_digits(record.phone_number))
+
+    def search(self, terms, match_all=False, limit=50, offset=0, with_total=False):
+        """Contacts whose name or phone contains any (or every) term, in name order"""
+        terms = [term for term in terms if term]
+        if not terms:
+            return ([], 0) if with_total else []
+        view = self._view()
+        columns = view[0]
+        masks = [columns.term_mask(term) for term in terms]
+        mask = np.logical_and.reduce(masks) if match_all else np.logical_or.reduce(masks)
+        checks = [self._overlay_term_match(term) for term in terms]
+        combine = all if match_all else any
+        return self._collect(view, mask, columns.name_order, lambda r: combine(check(r) for check in checks),
+                             lambda r: r.name or '', False, limit, offset, with_total)
+
+    def phone_lookup(self, digits, exact=False, limit=50, offset=0, with_total=False):
+        """Contacts whose phone number is (exact) or starts with the given digits, in name order"""
+        digits = phone_digits(digits)
+        if exact:
+            overlay_match = lambda r: phone_digits(r.phone_number) == digits
+        else:
+            overlay_match = lambda r: phone_digits(r.phone_number).startswith(digits)
+        view = self._view()
+        columns, live, overlay = view
+        positions = columns.phone_positions(digits, exact)
+        if len(positions) > SORTED_RANGE_LIMIT:
+            mask = np.zeros(columns.size, dtype=bool)
+            mask[positions] = True
+            return self._collect(view, mask, columns.name_order, overlay_match, lambda r: r.name or '', False,
+                                 limit, offset, with_total)
+        positions = positions[live[positions]]
+        overlay = [record for record in overlay if overlay_match(record)]
+        wanted = offset + limit
+        matched = positions[np.argsort(columns.name_rank[positions], kind='stable')][:wanted]
+        rows = [columns.record(int(i)) for i in matched] + overlay
+        if overlay:
+            rows.sort(key=lambda r: r.name or '')
+        if with_total:
+            return rows[offset:wanted], len(positions) + len(overlay)
+        return rows[offset:wanted]
+
+    def phone_prefix(self, digits, limit=50, offset=0):
+        """Contacts whose phone number starts with the given digits, in name order"""
+        return self.phone_lookup(digits, exact=False, limit=limit, offset=offset)
+
+    def category(self, category="all", limit=20, offset=0):
+        """Same categories as search_contacts_by_category: recent, mobile, landline, all"""
+        view = self._view()
+        columns = view[0]
+        if category == "recent":
+            return self._collect(view, np.ones(columns.size, dtype=bool), columns.recent_order, lambda r: True,
+                                 lambda r: r.created_at or '', True, limit, offset)
+        kind = {"mobile": KIND_MOBILE, "landline": KIND_LANDLINE}.get(category)
+        mask = columns.kind_mask(kind) if kind else np.ones(columns.size, dtype=bool)
+        match = (lambda r: _phone_kind(phone_digits(r.phone_number)) == kind) if kind else (lambda r: True)
+        return self._collect(view, mask, columns.name_order, match, lambda r: r.name or '', False, limit, offset)
+
+    def stats(self, now=None):
+        """{'total', 'mobile', 'landline', 'recent'} in one pass over the arrays"""
+        since = (now or datetime.now(timezone.utc)) - timedelta(days=RECENT_DAYS)
+        since_us = int(since.timestamp() * 1_000_000)
+        columns, live, overlay = self._view()
+        mobile = int(np.count_nonzero(live & columns.kind_mask(KIND_MOBILE)))
+        recent = int(np.count_nonzero(live & columns.recent_mask(since_us)))
+        total = int(np.count_nonzero(live))
+        for record in overlay:
+            total += 1
+            mobile += _phone_kind(phone_digits(record.phone_number)) == KIND_MOBILE
+            recent += _created_us(record.created_at) >= since_us
+        return {"total": total, "mobile": mobile, "landline": total - mobile, "recent": recent}
+
+def contact_columns_enabled():
+    return np is not None and os.getenv('CONTACT_COLUMNS', 'false').lower() in ('1', 'true', 'yes')
+
+def create_contact_store_from_env(client, snapshot=None, logger=None):
+    """ContactColumnStore when CONTACT_COLUMNS is enabled and NumPy is installed, else None"""
+    if not contact_columns_enabled():
+        return None
+    return ContactColumnStore(
+        client,
+        reload_seconds=int(os.getenv('CONTACT_COLUMNS_RELOAD_SECONDS', DEFAULT_RELOAD_SECONDS)),
+        snapshot=snapshot,
+        logger=logger,
+    )
@@ -12,6 +12,12 @@ from datetime import datetime
 from dotenv import load_dotenv
 from supabase import create_client, Client
 
+from query_specs import select_spec, count_query, execute_count, like_prefix_filter
+from contact_columns import create_contact_store_from_env
+from search_cache import create_search_cache_from_env
+from local_replica import create_local_replica_from_env
+from fuzzy_search import create_fuzzy_index_from_env
+
 # Load environment variables
 load_dotenv()
 
@@ -28,6 +34,56 @@ except Exception as e:
     print(f"Error initializing Supabase client: {e}")
     supabase_client = None
 
+# Optional columnar copy of the book (CONTACT_COLUMNS=true); None means query Supabase
+contact_store = create_contact_store_from_env(supabase_client)
+
+# Repeated หาเบอร์ / ค้นหา lookups; every contact write invalidates it
+search_cache = create_search_cache_from_env()
+
+# Optional SQLite copy of contacts and events (LOCAL_REPLICA_PATH); read once fully pulled
+local_replica = create_local_replica_from_env(supabase_client)
+
+# Typo-tolerant name matches when a search finds nothing (CONTACT_FUZZY_SEARCH)
+fuzzy_index = create_fuzzy_index_from_env(supabase_client)
+
+def contacts_changed(contact_id=None, row=None):
+    """Keep local caches in step after this worker writes a contact"""
+    search_cache.invalidate()
+    if fuzzy_index:
+        if row:
+            fuzzy_index.record(row)
+        elif contact_id is not None:
+            fuzzy_index.remove(contact_id)
+    if local_replica:
+        try:
+            if row:
+                local_replica.upsert('contacts', [row])
+            elif contact_id is not None:
+                local_replica.remove('contacts', contact_id)
+        except Exception as e:
+            print(f"Error writing contact to local replica: {e}")
+    if contact_store:
+        if row:
+            contact_store.record(row)
+        elif contact_id is not None:
+            contact_store.remove(contact_id)
+
+def columnar_contacts():
+    """The fresh columnar store, or None when it is disabled or cannot load"""
+    if not contact_store:
+        return None
+    try:
+        return contact_store.ensure_fresh()
+    except Exception as e:
+        print(f"Error loading contact columns: {e}")
+        return None
+
+def replica_table(table):
+    """The local replica once it holds a full copy of table, else None"""
+    if local_replica and local_replica.ready(table):
+        return local_replica
+    return None
+
 def validate_supabase_response(response, operation="database operation"):
     """Validate Supabase response and provide detailed error info"""
     if not response:
@@ -84,6 +140,35 @@ def validate_phone_number(phone_number):
     
     return None
 
+PHONE_QUERY = re.compile(r'^[0-9\s\-\(\)]+$')
+MOBILE_SECOND_DIGITS = '689'
+
+def classify_phone_query(text):
+    """('exact', digits) for a whole Thai number, ('prefix', digits) for the start of one, None for names"""
+    text = (text or '').strip()
+    if not PHONE_QUERY.match(text):
+        return None
+    digits = re.sub(r'[\s\-\(\)]', '', text)
+    if validate_phone_number(digits):
+        return 'exact', digits
+    if digits.startswith('0') and 2 <= len(digits) < 10:
+        return 'prefix', digits
+    return None
+
+def _formatted_prefix(digits, cuts):
+    for cut in reversed(cuts):
+        if len(digits) > cut:
+            digits = f"{digits[:cut]}-{digits[cut:]}"
+    return digits
+
+def formatted_phone_prefixes(digits):
+    """How stored numbers (0XX-XXX-XXXX / 0X-XXX-XXXX) that start with digits begin"""
+    prefixes = [_formatted_prefix(digits, (3, 6))]
+    if digits[1:2] not in MOBILE_SECOND_DIGITS:
+        # Landlines can be 9 digits long, so '0212' may be '021-2...' or '02-12...'
+        prefixes.append(_formatted_prefix(digits, (2, 5)))
+    return list(dict.fromkeys(prefixes))
+
 def search_contacts_multi_keyword(keywords, user_id=None):
     """Search contacts with multiple keywords (partial match)"""
     try:
@@ -92,10 +177,18 @@ def search_contacts_multi_keyword(keywords, user_id=None):
         
         if not keyword_list:
             return []
+        
+        store = columnar_contacts()
+        if store:
+            return store.search(keyword_list, match_all=True, limit=50)
+        
+        replica = replica_table('contacts')
+        if replica:
+            return replica.search_contacts(keyword_list, match_all=True, limit=50)[0]
             
         # Build query for multiple keywords
         # Each keyword should match either name or phone_number
-        query = supabase_client.table('contacts').select('*')
+        query = select_spec(supabase_client, 'contacts.display')
         
         for keyword in keyword_list:
             query = query.or_(f"name.ilike.%{keyword}%,phone_number.ilike.%{keyword}%")
@@ -110,7 +203,11 @@ def search_contacts_multi_keyword(keywords, user_id=None):
 def search_contacts_by_category(category="all", limit=20, offset=0):
     """Search contacts by category for large datasets with pagination"""
     try:
-        query = supabase_client.table('contacts').select('*')
+        store = columnar_contacts()
+        if store:
+            return store.category(category, limit, offset)
+        
+        query = select_spec(supabase_client, 'contacts.display')
         
         if category == "recent":
             # Get recently added contacts
@@ -138,20 +235,21 @@ def get_contacts_stats():
         if not supabase_client:
             print("Supabase client not initialized")
             return {"total": 0, "mobile": 0, "landline": 0, "recent": 0}
+        
+        store = columnar_contacts()
+        if store:
+            return store.stats()
             
         # Get total count
-        total_result = supabase_client.table('contacts').select('*', count='exact').execute()
-        total_count = total_result.count
+        total_count = execute_count(count_query(supabase_client, 'contacts'))
         
         # Get mobile count
-        mobile_result = supabase_client.table('contacts').select('*', count='exact').or_("phone_number.ilike.08%,phone_number.ilike.09%,phone_number.ilike.06%").execute()
-        mobile_count = mobile_result.count
+        mobile_count = execute_count(count_query(supabase_client, 'contacts').or_("phone_number.ilike.08%,phone_number.ilike.09%,phone_number.ilike.06%"))
         
         # Get recent count (last 30 days)
         from datetime import datetime, timedelta
         thirty_days_ago = (datetime.now() - timedelta(days=30)).isoformat()
-        recent_result = supabase_client.table('contacts').select('*', count='exact').gte('created_at', thirty_days_ago).execute()
-        recent_count = recent_result.count
+        recent_count = execute_count(count_query(supabase_client, 'contacts').gte('created_at', thirty_days_ago))
         
         return {
             "total": total_count,
@@ -163,34 +261,107 @@ def get_contacts_stats():
         print(f"Error getting contacts stats: {e}")
         return {"total": 0, "mobile": 0, "landline": 0, "recent": 0}
 
-def bulk_search_contacts(search_terms, limit=50):
-    """Bulk search contacts for multiple keywords with performance optimization"""
+def _bulk_search_query(terms, limit, offset=0):
+    """(contacts matching any term in name or phone ordered by name, total matches) - raises on failure"""
+    store = columnar_contacts()
+    if store:
+        return store.search(terms, limit=limit, offset=offset, with_total=True)
+    
+    replica = replica_table('contacts')
+    if replica:
+        return replica.search_contacts(terms, limit=limit, offset=offset)
+    
+    # Use Full Text Search for better performance on large datasets
+    query = select_spec(supabase_client, 'contacts.display', count='exact')
+    
+    # Build OR conditions for each term against name and phone
+    or_conditions = []
+    for term in terms:
+        or_conditions.append(f"name.ilike.%{term}%")
+        or_conditions.append(f"phone_number.ilike.%{term}%")
+    
+    # Only the requested page travels; id keeps pages stable when names repeat
+    query = query.or_(",".join(or_conditions)).order('name').order('id').range(offset, offset + limit - 1)
+    result = query.execute()
+    
+    return (result.data if result.data else []), result.count or 0
+
+def _phone_search_query(kind, digits, limit, offset=0):
+    """(contacts with this phone number (exact) or starting with these digits by name, total) - raises on failure"""
+    store = columnar_contacts()
+    if store:
+        return store.phone_lookup(digits, exact=kind == 'exact', limit=limit, offset=offset, with_total=True)
+    
+    replica = replica_table('contacts')
+    if replica:
+        return replica.phone_lookup(digits, exact=kind == 'exact', limit=limit, offset=offset)
+    
+    # Stored numbers are always formatted by validate_phone_number, so compare
+    # against the formatted value: equality / prefix LIKE can use the index
+    query = select_spec(supabase_client, 'contacts.display', count='exact')
+    if kind == 'exact':
+        query = query.eq('phone_number', validate_phone_number(digits))
+    else:
+        query = query.or_(like_prefix_filter('phone_number', formatted_phone_prefixes(digits)))
+    result = query.order('name').order('id').range(offset, offset + limit - 1).execute()
+    
+    return (result.data if result.data else []), result.count or 0
+
+def _search_page(search_terms, limit, offset):
+    """(page of contacts, total) for a search query through the cache - raises on failure"""
+    # Phone-shaped queries skip the name/phone ILIKE scan
+    phone = classify_phone_query(search_terms)
+    if phone:
+        kind, digits = phone
+        return search_cache.get_or_load_page(f'phone-{kind}', digits, limit, offset,
+                                             lambda: _phone_search_query(kind, digits, limit, offset))
+    
+    # Split search terms and clean them
+    terms = [term.strip() for term in search_terms.split() if term.strip()]
+    if not terms:
+        return [], 0
+    
+    # Same normalized query within the TTL is served from the cache
+    return search_cache.get_or_load_page('bulk', search_terms, limit, offset,
+                                         lambda: _bulk_search_query(terms, limit, offset))
+
+def fuzzy_contacts(search_terms, limit=10):
+    """(score, contact) pairs whose names are close to search_terms; [] when disabled or unavailable"""
+    if not fuzzy_index or classify_phone_query(search_terms):
+        return []
+    try:
+        return fuzzy_index.search(search_terms, limit)
+    except Exception as e:
+        print(f"Error in fuzzy contact search: {e}")
+        return []
+
+def search_contacts_page(search_terms, page=1, per_page=10):
+    """One page of search results: {"contacts", "total", "page", "total_pages"}, plus "fuzzy"/"scores" for near matches"""
+    empty = {"contacts": [], "total": 0, "page": 1, "total_pages": 0}
     try:
         if not search_terms or not search_terms.strip():
-            return []
+            return empty
         
-        # Split search terms and clean them
-        terms = [term.strip() for term in search_terms.split() if term.strip()]
-        if not terms:
-            return []
+        page = max(page, 1)
+        contacts, total = _search_page(search_terms, per_page, (page - 1) * per_page)
+        total_pages = (total + per_page - 1) // per_page
+        if not contacts and page > total_pages > 0:
+            # Page button from an older reply after contacts were deleted - show the last page
+            page = total_pages
+            contacts, total = _search_page(search_terms, per_page, (page - 1) * per_page)
+            total_pages = (total + per_page - 1) // per_page
         
-        # Use Full Text Search for better performance on large datasets
-        query = supabase_client.table('contacts').select('*')
+        if not total:
+            # Nothing contains the query - offer the closest names instead
+            matches = fuzzy_contacts(search_terms, per_page)
+            if matches:
+                return {"contacts": [contact for _, contact in matches], "total": len(matches), "page": 1,
+                        "total_pages": 1, "fuzzy": True, "scores": [score for score, _ in matches]}
         
-        # Build OR conditions for each term against name and phone
-        or_conditions = []
-        for term in terms:
-            or_conditions.append(f"name.ilike.%{term}%")
-            or_conditions.append(f"phone_number.ilike.%{term}%")
-        
-        # Execute optimized query with ordering
-        query = query.or_(",".join(or_conditions)).order('name').limit(limit)
-        result = query.execute()
-        
-        return result.data if result.data else []
+        return {"contacts": contacts, "total": total, "page": page, "total_pages": total_pages}
     except Exception as e:
-        print(f"Error in bulk search: {e}")
-        return []
+        print(f"Error in paged search: {e}")
+        return empty
 
 def add_contact(name, phone_number, user_id):
     """Add new contact to database"""
@@ -201,7 +372,7 @@ def add_contact(name, phone_number, user_id):
             return {"success": False, "error": "เบอร์โทรไม่ถูกต้อง กรุณาใส่เบอร์โทรที่ถูกต้อง (10 หลัก)"}
         
         # Check if contact already exists (same name and phone)
-        existing = supabase_client.table('contacts').select('*').eq('name', name).eq('phone_number', formatted_phone).execute()
+        existing = select_spec(supabase_client, 'contacts.ids').eq('name', name).eq('phone_number', formatted_phone).execute()
         if existing.data:
             return {"success": False, "error": "ข้อมูลนี้มีอยู่แล้วในระบบ"}
         
@@ -214,6 +385,7 @@ def add_contact(name, phone_number, user_id):
         }).execute()
         
         if result.data:
+            contacts_changed(row=result.data[0])
             return {"success": True, "data": result.data[0]}
         else:
             return {"success": False, "error": "ไม่สามารถเพิ่มข้อมูลได้"}
@@ -247,6 +419,7 @@ def edit_contact(contact_id, name, phone_number, user_id):
         }).eq('id', contact_id).execute()
         
         if result.data:
+            contacts_changed(row=result.data[0])
             return {"success": True, "data": result.data[0]}
         else:
             return {"success": False, "error": "ไม่พบข้อมูลที่ต้องการแก้ไข"}
@@ -259,6 +432,7 @@ def delete_contact(contact_id, user_id):
     try:
         result = supabase_client.table('contacts').delete().eq('id', contact_id).execute()
         if result.data:
+            contacts_changed(contact_id=contact_id)
             return {"success": True, "data": result.data[0]}
         else:
             return {"success": False, "error": "ไม่พบข้อมูลที่ต้องการลบ"}
@@ -269,7 +443,7 @@ def delete_contact(contact_id, user_id):
 def get_all_contacts():
     """Get all contacts (admin only)"""
     try:
-        result = supabase_client.table('contacts').select('*').order('created_at', desc=True).execute()
+        result = select_spec(supabase_client, 'contacts.export').order('created_at', desc=True).execute()
         return result.data if result.data else []
     except Exception as e:
         print(f"Error getting contacts: {e}")
@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+"""
+Event date index for LINE Bot
+ดัชนีวันที่กิจกรรมแบบเรียงลำดับ ใช้ตอบ /today, /next, /month และค้นหาตามวันที่จากหน่วยความจำ
+
+Events are kept in a list sorted by (event_date, id) next to a parallel list
+of rows. Every date question is a bisect on that list followed by a slice:
+    on_date('2025-08-15')               one day
+    between('2025-08-01', '2025-08-31') inclusive range
+    upcoming('2025-08-09', 5)           next N from a day
+    month(2025, 8) / week_of('2025-08-15')
+    count_by_day('2025-08-01', '2025-08-31')
+
+Dates are 'YYYY-MM-DD' strings, which sort the same way as the dates.
+The index attaches to EventStore and is updated in place on every change.
+"""
+
+import threading
+from bisect import bisect_left, bisect_right
+from collections import Counter
+from datetime import date, timedelta
+
+from event_store import display_row
+
+# Sorts after any event id, so (day, AFTER_ALL_IDS) bounds the end of a day
+AFTER_ALL_IDS = float('inf')
+
+def _key(row):
+    return (row.get('event_date') or '', row['id'])
+
+class EventDateIndex:
+    """Events sorted by date with bisect range lookups"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._keys = []
+        self._rows = []
+        self._key_by_id = {}
+
+    # ---------- EventStore index interface ----------
+
+    def rebuild(self, rows):
+        ordered = sorted((display_row(row) for row in rows), key=_key)
+        with self._lock:
+            self._keys = [_key(row) for row in ordered]
+            self._rows = ordered
+            self._key_by_id = {row['id']: key for key, row in zip(self._keys, ordered)}
+
+    def _discard(self, event_id):
+        key = self._key_by_id.pop(event_id, None)
+        if key is not None:
+            position = bisect_left(self._keys, key)
+            del self._keys[position]
+            del self._rows[position]
+
+    def upsert(self, row):
+        key = _key(row)
+        with self._lock:
+            self._discard(row['id'])
+            position = bisect_left(self._keys, key)
+            self._keys.insert(position, key)
+            self._rows.insert(position, row)
+            self._key_by_id[row['id']] = key
+
+    def remove(self, event_id):
+        with self._lock:
+            self._discard(event_id)
+
+    # ---------- lookups ----------
+
+    def _span(self, date_from, date_to):
+        lo = bisect_left(self._keys, (date_from,)) if date_from else 0
+        hi = bisect_right(self._keys, (date_to, AFTER_ALL_IDS)) if date_to else len(self._keys)
+        return lo, hi
+
+    def between(self, date_from=None, date_to=None):
+        """Events with date_from <= event_date <= date_to, oldest first (either bound may be None)"""
+        with self._lock:
+            lo, hi = self._span(date_from, date_to)
+            return self._rows[lo:hi]
+
+    def on_date(self, day):
+        return self.between(day, day)
+
+    def upcoming(self, day, limit=5):
+        """The next `limit` events on or after day"""
+        with self._lock:
+            lo = bisect_left(self._keys, (day,))
+            return self._rows[lo:lo + limit]
+
+    def month(self, year, month):
+        start = date(year, month, 1)
+        end = (start.replace(day=28) + timedelta(days=4)).replace(day=1) - timedelta(days=1)
+        return self.between(str(start), str(end))
+
+    def week_of(self, day):
+        """Events in the Monday-Sunday week containing day"""
+        monday = date.fromisoformat(day) - timedelta(days=date.fromisoformat(day).weekday())
+        return self.between(str(monday), str(monday + timedelta(days=6)))
+
+    def count_by_day(self, date_from=None, date_to=None):
+        """{'YYYY-MM-DD': number of events} for the range"""
+        with self._lock:
+            lo, hi = self._span(date_from, date_to)
+            return dict(Counter(key[0] for key in self._keys[lo:hi]))
+
+    def count(self, date_from=None, date_to=None):
+        with self._lock:
+            lo, hi = self._span(date_from, date_to)
+            return hi - lo
+
+    def __len__(self):
+        return len(self._keys)
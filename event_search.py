@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+"""
+Event search index for LINE Bot
+ดัชนีค้นหากิจกรรมในหน่วยความจำ (ชื่อ/รายละเอียด) รองรับภาษาไทยที่ไม่มีการเว้นวรรค
+
+Thai has no spaces between words, so the index is a character n-gram
+inverted index: every 1- and 2-character gram of the normalized title and
+description maps to the ids of the events that contain it. A query term is
+looked up by intersecting the posting sets of its bigrams and the
+candidates are then checked with a substring test, which gives the same
+matches as ilike '%term%' without scanning every event.
+
+Queries:
+    'ประชุม ชั้น 3'         every term must match (AND); commas also separate terms
+    'ประชุม 2025-08'        terms plus a month filter
+    '2025-08-15'            every event on that date
+"""
+
+import re
+import threading
+from collections import defaultdict
+from datetime import date, timedelta
+
+from event_store import display_row
+
+DATE_TERM = re.compile(r'^(\d{4})-(\d{2})(?:-(\d{2}))?$')
+WHITESPACE = re.compile(r'\s+')
+TERM_SEPARATORS = re.compile(r'[\s,]+')
+
+# Ranking weights per matched term
+TITLE_WEIGHT = 3
+TITLE_PREFIX_BONUS = 2
+DESCRIPTION_WEIGHT = 1
+
+def normalize(text):
+    """Lowercase and collapse whitespace so matching ignores case and spacing"""
+    return WHITESPACE.sub(' ', (text or '').lower()).strip()
+
+def grams(text):
+    """Every 1- and 2-character gram of a normalized string"""
+    result = set(text)
+    result.update(text[i:i + 2] for i in range(len(text) - 1))
+    return result
+
+def _date_range(match):
+    year, month, day = (int(part) if part else None for part in match.groups())
+    if day:
+        single = date(year, month, day)
+        return single, single
+    start = date(year, month, 1)
+    end = (start.replace(day=28) + timedelta(days=4)).replace(day=1) - timedelta(days=1)
+    return start, end
+
+def parse_search_query(text):
+    """Split a query into (terms, date_from, date_to); YYYY-MM-DD and YYYY-MM become date filters"""
+    terms = []
+    date_from = date_to = None
+    for part in TERM_SEPARATORS.split(normalize(text)):
+        match = DATE_TERM.match(part)
+        if match:
+            try:
+                date_from, date_to = (str(d) for d in _date_range(match))
+                continue
+            except ValueError:
+                pass  # not a real date, search it as text
+        if part:
+            terms.append(part)
+    return terms, date_from, date_to
+
+class EventSearchIndex:
+    """N-gram inverted index over event titles and descriptions"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._postings = defaultdict(set)
+        self._docs = {}   # id -> (row, normalized title, normalized description)
+
+    # ---------- EventStore index interface ----------
+
+    def _add(self, row):
+        title = normalize(row.get('event_title'))
+        description = normalize(row.get('event_description'))
+        self._docs[row['id']] = (row, title, description)
+        for gram in grams(title) | grams(description):
+            self._postings[gram].add(row['id'])
+
+    def _discard(self, event_id):
+        doc = self._docs.pop(event_id, None)
+        if doc is None:
+            return
+        for gram in grams(doc[1]) | grams(doc[2]):
+            posting = self._postings.get(gram)
+            if posting is not None:
+                posting.discard(event_id)
+                if not posting:
+                    del self._postings[gram]
+
+    def rebuild(self, rows):
+        with self._lock:
+            self._postings = defaultdict(set)
+            self._docs = {}
+            for row in rows:
+                self._add(display_row(row))
+
+    def upsert(self, row):
+        with self._lock:
+            self._discard(row['id'])
+            self._add(row)
+
+    def remove(self, event_id):
+        with self._lock:
+            self._discard(event_id)
+
+    # ---------- search ----------
+
+    def _candidates(self, term):
+        keys = [term] if len(term) == 1 else [term[i:i + 2] for i in range(len(term) - 1)]
+        postings = sorted((self._postings.get(key, ()) for key in keys), key=len)
+        if not postings[0]:
+            return set()
+        return set(postings[0]).intersection(*postings[1:])
+
+    def search(self, query, date_from=None, date_to=None, limit=None):
+        """Events matching every term, best match first, then by date
+
+        Dates in the query text are used as filters unless date_from/date_to are given.
+        """
+        terms, query_from, query_to = parse_search_query(query)
+        date_from = date_from or query_from
+        date_to = date_to or query_to
+        if not terms and not (date_from or date_to):
+            return []
+
+        with self._lock:
+            if terms:
+                ids = None
+                for term in sorted(terms, key=len, reverse=True):  # longest term narrows fastest
+                    candidates = self._candidates(term)
+                    ids = candidates if ids is None else ids & candidates
+                    if not ids:
+                        return []
+                docs = [self._docs[event_id] for event_id in ids]
+            else:
+                docs = list(self._docs.values())
+
+            results = []
+            for row, title, description in docs:
+                event_date = row.get('event_date') or ''
+                if (date_from and event_date < date_from) or (date_to and event_date > date_to):
+                    continue
+                score = 0
+                for term in terms:
+                    if term in title:
+                        score += TITLE_WEIGHT + (TITLE_PREFIX_BONUS if title.startswith(term) else 0)
+                    elif term in description:
+                        score += DESCRIPTION_WEIGHT
+                    else:
+                        break  # bigram hit without the whole term - not a match
+                else:
+                    results.append((-score, event_date, row['id'], row))
+
+        results.sort(key=lambda result: result[:3])
+        rows = [result[3] for result in results]
+        return rows[:limit] if limit else rows
+
+    def stats(self):
+        return {"events": len(self._docs), "grams": len(self._postings)}
@@ -0,0 +1,198 @@
+# -*- coding: utf-8 -*-
+"""
+In-memory event store for LINE Bot
+เก็บกิจกรรมทั้งหมดไว้ในหน่วยความจำ ให้ดัชนีค้นหาใช้งานได้โดยไม่ต้อง query
+
+The store loads every event once (as EventRecord) and keeps itself
+current from three directions:
+    - record()/remove() after this worker inserts, edits or deletes an event
+    - apply_change() from change_feed for writes made by other workers
+    - a full reload every EVENT_STORE_RELOAD_SECONDS as a safety net
+
+With a shared snapshot (snapshot_store.py) loads read the mapped file
+instead of Supabase, as long as the snapshot is newer than the last change
+this worker has seen.
+
+Indexes attach to the store and are told about every change. An index
+implements rebuild(rows), upsert(row) and remove(event_id).
+
+Serving reads from memory is only on by default when something keeps other
+workers' and dashboard edits flowing in: a change feed (CHANGE_FEED_MODE)
+or the shared snapshot. Without either, a worker could show edited or
+deleted events for up to EVENT_STORE_RELOAD_SECONDS, so callers read the
+local replica or Supabase instead (the same rule as the contact search
+cache). A disabled store still passes this worker's writes to its indexes
+(the local replica attaches one).
+
+Environment:
+    EVENT_STORE=true|false             override the default above
+    EVENT_STORE_RELOAD_SECONDS=300     full reload interval
+"""
+
+import logging
+import os
+import threading
+import time
+
+from change_feed import change_feed_enabled
+from query_specs import select_spec
+from records import EventRecord
+
+PAGE_SIZE = 1000  # Supabase returns at most 1000 rows per request
+DEFAULT_RELOAD_SECONDS = 300
+
+def display_row(row):
+    """EventRecord with the display columns of a row (query result, realtime payload, insert response)
+
+    Records pass through unchanged, so the store and its indexes share one object per event.
+    """
+    return row if isinstance(row, EventRecord) else EventRecord.from_row(row)
+
+class EventStore:
+    """Snapshot of the events table with attachable indexes"""
+
+    def __init__(self, client, reload_seconds=DEFAULT_RELOAD_SECONDS, snapshot=None, on_write=None, enabled=True,
+                 logger=None):
+        self.client = client
+        self.enabled = enabled        # serve reads from memory; see the module docstring
+        self.reload_seconds = reload_seconds
+        self.snapshot = snapshot      # SnapshotReader or None
+        self.on_write = on_write      # called after this worker writes an event
+        self.logger = logger or logging.getLogger(__name__)
+        self._lock = threading.RLock()
+        self._rows = {}
+        self._indexes = []
+        self.loaded_at = 0.0
+        self.changed_at = 0.0         # last change applied outside a full load
+        self.snapshot_version = None
+
+    def attach(self, index):
+        """Register an index; it is built from the current rows right away"""
+        with self._lock:
+            self._indexes.append(index)
+            if self.loaded_at:
+                index.rebuild(list(self._rows.values()))
+        return index
+
+    # ---------- loading ----------
+
+    def _fetch(self):
+        rows = []
+        offset = 0
+        while True:
+            response = select_spec(self.client, 'events.display').order('id').range(offset, offset + PAGE_SIZE - 1).execute()
+            page = response.data or []
+            rows.extend(page)
+            if len(page) < PAGE_SIZE:
+                return rows
+            offset += PAGE_SIZE
+
+    def _usable_snapshot(self):
+        snapshot = self.snapshot.current() if self.snapshot else None
+        if snapshot and snapshot.has('events') and snapshot.built_at >= self.changed_at:
+            return snapshot
+        return None
+
+    def load(self):
+        """Replace the store with the shared snapshot, or a full scan of the events table"""
+        snapshot = self._usable_snapshot()
+        rows = [display_row(row) for row in (snapshot.rows('events') if snapshot else self._fetch())]
+        with self._lock:
+            self.snapshot_version = snapshot.version if snapshot else None
+            self._rows = {row['id']: row for row in rows}
+            for index in self._indexes:
+                index.rebuild(rows)
+            self.loaded_at = time.time()
+        return len(rows)
+
+    def ensure_fresh(self):
+        """Load on first use, then reload when the interval has passed"""
+        if not self.loaded_at:
+            self.load()
+        elif time.time() - self.loaded_at >= self.reload_seconds or self._newer_snapshot():
+            try:
+                self.load()
+            except Exception as e:
+                self.loaded_at = time.time()  # keep serving the cached rows, retry next interval
+                self.logger.error(f"Error reloading events: {e}")
+        return self
+
+    def _newer_snapshot(self):
+        snapshot = self._usable_snapshot()
+        return snapshot is not None and snapshot.version != self.snapshot_version
+
+    # ---------- hooks ----------
+
+    def _apply(self, rows):
+        with self._lock:
+            self.changed_at = time.time()
+            for row in rows or []:
+                if row.get('id') is None:
+                    continue
+                row = display_row(row)
+                self._rows[row['id']] = row
+                for index in self._indexes:
+                    index.upsert(row)
+
+    def _delete(self, event_id):
+        with self._lock:
+            self.changed_at = time.time()
+            if self._rows.pop(event_id, None) is not None:
+                for index in self._indexes:
+                    index.remove(event_id)
+
+    def _written(self):
+        if self.on_write:
+            try:
+                self.on_write()
+            except Exception as e:
+                self.logger.error(f"Event write hook failed: {e}")
+
+    def record(self, rows):
+        """Add or replace events returned by an insert/update response"""
+        self._apply(rows)
+        self._written()
+
+    def remove(self, event_id):
+        """Drop an event this worker deleted"""
+        self._delete(event_id)
+        self._written()
+
+    def apply_change(self, op, record, old_record):
+        """Change-feed listener for the events table"""
+        if not self.loaded_at:
+            return  # nothing cached yet; the first load reads the current table
+        if op == 'DELETE':
+            event_id = old_record.get('id')
+            if event_id is not None:
+                self._delete(event_id)
+            else:
+                self.loaded_at = 0.0  # delete without the row - reload on next use
+        else:
+            self._apply([record])
+
+    # ---------- reads ----------
+
+    def get(self, event_id):
+        return self._rows.get(event_id)
+
+    def __len__(self):
+        return len(self._rows)
+
+def event_store_enabled(snapshot=None):
+    """EVENT_STORE if set, else on only when a change feed or the shared snapshot keeps the store current"""
+    value = os.getenv('EVENT_STORE')
+    if value:
+        return value.lower() in ('1', 'true', 'yes')
+    return snapshot is not None or change_feed_enabled()
+
+def create_event_store_from_env(client, snapshot=None, on_write=None, logger=None):
+    """Build an EventStore configured from environment variables"""
+    return EventStore(
+        client,
+        reload_seconds=int(os.getenv('EVENT_STORE_RELOAD_SECONDS', DEFAULT_RELOAD_SECONDS)),
+        snapshot=snapshot,
+        on_write=on_write,
+        enabled=event_store_enabled(snapshot),
+        logger=logger,
+    )
@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+"""
+Pre-serialized reply path for LINE Bot
+ส่งข้อความตอบกลับจาก JSON ที่เตรียมไว้แล้ว โดยไม่ต้องสร้าง pydantic model ทุกครั้ง
+
+Messages are kept as JSON fragments (strings) and the reply body is assembled
+by string concatenation, then posted through the SDK's own pooled HTTP
+transport. This skips TextMessage/FlexMessage/ReplyMessageRequest construction
+and FlexContainer.from_dict validation on every reply.
+
+FAST_REPLY_VALIDATE controls safety checks:
+    first (default) - validate the first payload each builder produces with the SDK models
+    always          - validate every payload (debugging)
+    off             - never validate
+"""
+
+import json
+import os
+from functools import lru_cache
+
+from linebot.v3.messaging import Message
+
+from quick_replies import QUICK_REPLY_JSON
+
+FAST_REPLY_VALIDATE = os.getenv('FAST_REPLY_VALIDATE', 'first').lower()
+
+REPLY_PATH = '/v2/bot/message/reply'
+
+_validated_builders = set()
+
+class FastReplyError(Exception):
+    """Raised when the LINE API rejects a pre-serialized reply"""
+
+    def __init__(self, status, body):
+        self.status = status
+        self.body = body
+        super().__init__(f"({status}) LINE API error: {body}")
+
+def _dumps(obj):
+    return json.dumps(obj, ensure_ascii=False, separators=(',', ':'))
+
+def validate_payload(builder, fragment):
+    """Validate a message fragment through the SDK models according to FAST_REPLY_VALIDATE"""
+    if FAST_REPLY_VALIDATE == 'off':
+        return
+    if FAST_REPLY_VALIDATE == 'first' and builder in _validated_builders:
+        return
+    # Raises pydantic ValidationError / ValueError on malformed payloads
+    Message.from_dict(json.loads(fragment))
+    _validated_builders.add(builder)
+
+def text_payload(text, quick_reply=None):
+    """Serialize a text message; quick_reply is a registry name from quick_replies or a built QuickReply"""
+    fragment = '{"type":"text","text":' + _dumps(text)
+    if isinstance(quick_reply, str):
+        fragment += ',"quickReply":' + QUICK_REPLY_JSON[quick_reply]
+    elif quick_reply:
+        fragment += ',"quickReply":' + _dumps(quick_reply.to_dict())
+    fragment += '}'
+    validate_payload(('text', quick_reply if isinstance(quick_reply, str) else 'dynamic'), fragment)
+    return fragment
+
+@lru_cache(maxsize=256)
+def static_text_payload(text, quick_reply=None):
+    """Serialize a constant text message once and reuse it for every reply"""
+    return text_payload(text, quick_reply)
+
+def flex_payload(alt_text, contents, builder='flex'):
+    """Serialize a flex message from an already-built bubble/carousel dict"""
+    fragment = '{"type":"flex","altText":' + _dumps(alt_text) + ',"contents":' + _dumps(contents) + '}'
+    validate_payload(builder, fragment)
+    return fragment
+
+def build_reply_body(reply_token, fragments):
+    """Assemble the reply request body from pre-serialized message fragments"""
+    return '{"replyToken":' + _dumps(reply_token) + ',"messages":[' + ','.join(fragments) + ']}'
+
+def send_reply_payloads(messaging_api, reply_token, fragments):
+    """POST pre-serialized messages through the MessagingApi client's connection pool"""
+    api_client = messaging_api.api_client
+    host = api_client.configuration.host or messaging_api.line_base_path
+    body = build_reply_body(reply_token, fragments).encode('utf-8')
+    headers = dict(api_client.default_headers)
+    headers['Content-Type'] = 'application/json'
+    headers['Accept'] = 'application/json'
+
+    response = api_client.rest_client.pool_manager.request(
+        'POST',
+        host + REPLY_PATH,
+        body=body,
+        headers=headers,
+    )
+    if response.status >= 400:
+        raise FastReplyError(response.status, response.data.decode('utf-8', errors='replace'))
+    return response
@@ -0,0 +1,282 @@
+# -*- coding: utf-8 -*-
+"""
+Typo-tolerant contact name search for LINE Bot
+ค้นหาชื่อแบบใกล้เคียง (พิมพ์ผิด/วรรณยุกต์ต่างกัน) ใช้เมื่อค้นหาปกติไม่พบ
+
+Names and queries are normalized first: lowercased, and Thai tone marks and
+other above/below signs (่ ้ ๊ ๋ ็ ์ ํ) dropped, so 'สมชาย' finds 'สมช่าย'.
+Each name word is indexed by its character bigrams (with word boundaries);
+a query word is compared with every indexed word that shares a bigram,
+scored by the Dice coefficient of their bigram sets. A contact scores the
+average over query words of its best-matching name word.
+
+The index holds its own copy of the book (loaded from the shared snapshot
+or Supabase, kept current by contact writes and the change feed). Loading
+and periodic reloads run on a background thread started with the app, never
+inside a webhook request; until the first load finishes a search returns no
+near matches. A search stops at the latency budget and returns the best
+candidates found so far.
+
+Writes made while a load is reading are kept: record() and remove() log the
+change with its time, and a rebuild replays every change made after the load
+started (the local replica does the same with written_at).
+
+Without a change feed, edits made on other workers or the dashboard only
+show up at the next reload, so the fallback is off by default unless
+CHANGE_FEED_MODE is set (the same rule as the contact search cache).
+
+Environment:
+    CONTACT_FUZZY_SEARCH=true             fall back to fuzzy matches when search finds nothing
+                                          (default: on only with a change feed)
+    CONTACT_FUZZY_MIN_SCORE=0.5           Dice similarity a name word needs (0-1)
+    CONTACT_FUZZY_BUDGET_MS=50            per-search time limit
+    CONTACT_FUZZY_RELOAD_SECONDS=900      full reload interval
+"""
+
+import heapq
+import logging
+import os
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+
+from change_feed import change_feed_enabled
+from records import ContactRecord
+from snapshot_store import fetch_table
+
+DEFAULT_MIN_SCORE = 0.5
+DEFAULT_BUDGET_MS = 50
+DEFAULT_RELOAD_SECONDS = 900
+LOAD_RETRY_SECONDS = 60
+MIN_WORD_LENGTH = 2
+
+# Thai marks typed inconsistently: ็ ่ ้ ๊ ๋ ์ ํ
+THAI_MARKS = re.compile('[\u0e47-\u0e4d]')
+WORD_SEPARATORS = re.compile(r'[\s.,/()\-]+')
+
+def normalize_name(text):
+    """'นาย สมช่าย ใจดี' -> 'นาย สมชาย ใจดี' (lowercase, Thai marks removed)"""
+    return THAI_MARKS.sub('', (text or '').lower())
+
+def name_words(text):
+    """Normalized words of a name or query, ignoring one-character fragments"""
+    return [word for word in WORD_SEPARATORS.split(normalize_name(text)) if len(word) >= MIN_WORD_LENGTH]
+
+def word_grams(word):
+    """Character bigrams of a word, with boundary markers so short words still have a few"""
+    padded = f" {word} "
+    return {padded[i:i + 2] for i in range(len(padded) - 1)}
+
+class FuzzyContactIndex:
+    """Bigram index over contact name words with Dice-scored lookups"""
+
+    def __init__(self, client, min_score=DEFAULT_MIN_SCORE, budget_ms=DEFAULT_BUDGET_MS,
+                 reload_seconds=DEFAULT_RELOAD_SECONDS, snapshot=None, logger=None):
+        self.client = client
+        self.min_score = min_score
+        self.budget_ms = budget_ms
+        self.reload_seconds = reload_seconds
+        self.snapshot = snapshot
+        self.logger = logger or logging.getLogger(__name__)
+        self._lock = threading.RLock()
+        self._rows = {}                      # id -> ContactRecord
+        self._words = defaultdict(set)       # word -> contact ids
+        self._grams = defaultdict(set)       # bigram -> words
+        self._gram_counts = {}               # word -> number of bigrams
+        self.loaded_at = 0.0
+        self.changed_at = 0.0
+        self._changes = {}                   # id -> (changed_at, ContactRecord or None), replayed after a load
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self.searches = 0
+        self.over_budget = 0
+
+    # ---------- index maintenance ----------
+
+    def _add(self, row):
+        self._rows[row.id] = row
+        for word in name_words(row.name):
+            if word not in self._gram_counts:
+                grams = word_grams(word)
+                self._gram_counts[word] = len(grams)
+                for gram in grams:
+                    self._grams[gram].add(word)
+            self._words[word].add(row.id)
+
+    def _discard(self, contact_id):
+        row = self._rows.pop(contact_id, None)
+        if row is None:
+            return
+        for word in name_words(row.name):
+            ids = self._words.get(word)
+            if ids is None:
+                continue
+            ids.discard(contact_id)
+            if not ids:
+                del self._words[word]
+                del self._gram_counts[word]
+                for gram in word_grams(word):
+                    self._grams[gram].discard(word)
+                    if not self._grams[gram]:
+                        del self._grams[gram]
+
+    def rebuild(self, rows, started=None):
+        """Replace the index with rows read from `started` on, then replay later writes"""
+        with self._lock:
+            self._rows = {}
+            self._words = defaultdict(set)
+            self._grams = defaultdict(set)
+            self._gram_counts = {}
+            for row in rows:
+                if row.get('id') is not None:
+                    self._add(ContactRecord.from_row(row))
+            if started is not None:
+                self._changes = {contact_id: change for contact_id, change in self._changes.items()
+                                 if change[0] >= started}
+                for contact_id, (_, record) in self._changes.items():
+                    self._discard(contact_id)
+                    if record is not None:
+                        self._add(record)
+            self.loaded_at = time.time()
+
+    # ---------- loading ----------
+
+    def load(self):
+        started = time.time()
+        snapshot = self.snapshot.current() if self.snapshot else None
+        if snapshot and snapshot.has('contacts') and snapshot.built_at >= self.changed_at:
+            rows = snapshot.rows('contacts')
+        else:
+            rows = fetch_table(self.client, 'contacts.display')
+        self.rebuild(rows, started)
+        return len(rows)
+
+    def request_reload(self):
+        """Reload on the background thread soon instead of at the next interval"""
+        self._wake.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.load()
+            except Exception as e:
+                self.logger.error(f"Error loading fuzzy contact index: {e}")
+            self._wake.wait(self.reload_seconds if self.loaded_at else LOAD_RETRY_SECONDS)
+            self._wake.clear()
+
+    def start(self):
+        """Load now and reload every reload_seconds, on a daemon thread"""
+        self._thread = threading.Thread(target=self._run, name="fuzzy-contact-index", daemon=True)
+        self._thread.start()
+        return self._thread
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    # ---------- hooks ----------
+
+    def record(self, row):
+        """Add or replace a contact returned by an insert/update response"""
+        if not row or row.get('id') is None:
+            return
+        record = ContactRecord.from_row(row)
+        with self._lock:
+            self.changed_at = time.time()
+            self._changes[record.id] = (self.changed_at, record)
+            self._discard(record.id)
+            self._add(record)
+
+    def remove(self, contact_id):
+        with self._lock:
+            self.changed_at = time.time()
+            self._changes[contact_id] = (self.changed_at, None)
+            self._discard(contact_id)
+
+    def apply_change(self, op, record, old_record):
+        """Change-feed listener for the contacts table"""
+        if not self.loaded_at:
+            return
+        if op == 'DELETE':
+            if old_record.get('id') is not None:
+                self.remove(old_record['id'])
+            else:
+                self.request_reload()
+        else:
+            self.record(record)
+
+    # ---------- search ----------
+
+    def _word_matches(self, word, deadline):
+        """{indexed word: Dice score} for words similar to word; False as second value if the budget ran out"""
+        grams = word_grams(word)
+        shared = Counter()
+        for gram in grams:
+            if time.monotonic() > deadline:
+                return {}, False
+            shared.update(self._grams.get(gram, ()))
+        matches = {}
+        for candidate, common in shared.items():
+            score = 2.0 * common / (len(grams) + self._gram_counts[candidate])
+            if score >= self.min_score:
+                matches[candidate] = score
+        return matches, True
+
+    def search(self, query, limit=10):
+        """Top `limit` (score, contact) pairs, best first; score is 0-1, 1 for an exact word match
+
+        Returns [] until the index has been loaded.
+        """
+        words = name_words(query)
+        if not words or not self.loaded_at:
+            return []
+        deadline = time.monotonic() + self.budget_ms / 1000.0
+        totals = defaultdict(float)
+        with self._lock:
+            self.searches += 1
+            for word in words:
+                matches, finished = self._word_matches(word, deadline)
+                best = {}
+                for candidate, score in matches.items():
+                    for contact_id in self._words[candidate]:
+                        if score > best.get(contact_id, 0.0):
+                            best[contact_id] = score
+                for contact_id, score in best.items():
+                    totals[contact_id] += score
+                if not finished:
+                    self.over_budget += 1
+                    break
+            top = heapq.nlargest(limit, totals.items(), key=lambda item: (item[1], -item[0]))
+            return [(round(total / len(words), 3), self._rows[contact_id]) for contact_id, total in top]
+
+    def stats(self):
+        return {
+            "contacts": len(self._rows),
+            "words": len(self._words),
+            "grams": len(self._grams),
+            "searches": self.searches,
+            "over_budget": self.over_budget,
+            "loaded": bool(self.loaded_at),
+        }
+
+def fuzzy_search_enabled():
+    """CONTACT_FUZZY_SEARCH if set, else on only when a change feed keeps the index current"""
+    value = os.getenv('CONTACT_FUZZY_SEARCH')
+    if value:
+        return value.lower() in ('1', 'true', 'yes')
+    return change_feed_enabled()
+
+def create_fuzzy_index_from_env(client, snapshot=None, logger=None):
+    """FuzzyContactIndex when fuzzy search is enabled (see fuzzy_search_enabled), else None; call start() to load it"""
+    if not fuzzy_search_enabled():
+        return None
+    return FuzzyContactIndex(
+        client,
+        min_score=float(os.getenv('CONTACT_FUZZY_MIN_SCORE', DEFAULT_MIN_SCORE)),
+        budget_ms=float(os.getenv('CONTACT_FUZZY_BUDGET_MS', DEFAULT_BUDGET_MS)),
+        reload_seconds=int(os.getenv('CONTACT_FUZZY_RELOAD_SECONDS', DEFAULT_RELOAD_SECONDS)),
+        snapshot=snapshot,
+        logger=logger,
+    )
@@ -0,0 +1,495 @@
+# -*- coding: utf-8 -*-
+"""
+Local SQLite read replica for LINE Bot
+สำเนากิจกรรมและสมุดเบอร์ใน SQLite (FTS5) อ่านได้เร็ว และยังค้นหาได้เมื่อ Supabase ใช้งานไม่ได้
+
+One worker (the one holding an flock on LOCAL_REPLICA_PATH + '.lock') keeps
+the file in sync with Supabase:
+    - a delta pull every LOCAL_REPLICA_SYNC_SECONDS for rows whose cursor
+      column (contacts.updated_at, events.created_at) moved past the last
+      value seen
+    - a full pull every LOCAL_REPLICA_RESYNC_SECONDS, which also drops
+      deleted rows and picks up event edits (events have no updated_at)
+Every worker also writes its own adds/edits/deletes and change-feed rows
+straight into the file, so the next read already sees them. A pull never
+overwrites a row written locally after the pull started, and never brings
+back a row deleted locally after it started (deletes leave a tombstone in
+removed_rows until the next full pull).
+
+Text search goes through FTS5 trigram tables, which match substrings like
+ILIKE does (Thai included); terms shorter than three characters fall back
+to LIKE. Event dates and phone digits are plain indexed columns.
+
+Reads use a table only after its first full pull has finished; until then
+callers keep querying Supabase. stats() reports the sync lag per table.
+
+`python benchmarks.py --replica` compares query latency with PostgREST.
+
+Environment:
+    LOCAL_REPLICA_PATH=/var/data/notibot-replica.db   enables the replica
+    LOCAL_REPLICA_SYNC_SECONDS=30                     delta pull interval
+    LOCAL_REPLICA_RESYNC_SECONDS=900                  full pull interval
+"""
+
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from contact_columns import phone_digits
+from event_search import parse_search_query
+from query_specs import select_spec, after_cursor_filter
+from records import ContactRecord, EventRecord
+from snapshot_store import fetch_table, try_lock_file
+
+PAGE_SIZE = 1000  # Supabase returns at most 1000 rows per request
+DEFAULT_SYNC_SECONDS = 30
+DEFAULT_RESYNC_SECONDS = 900
+BUSY_TIMEOUT = 5.0  # seconds to wait for another worker's write
+MIN_FTS_TERM = 3    # the trigram tokenizer cannot match shorter terms
+
+# table -> (query spec, cursor column for delta pulls)
+REPLICA_TABLES = {
+    'contacts': ('contacts.replica', 'updated_at'),
+    'events': ('events.replica', 'created_at'),
+}
+
+# Stored columns; written_at is local and keeps a full pull from deleting rows written after it started
+TABLE_COLUMNS = {
+    'contacts': ('id', 'name', 'phone_number', 'digits', 'created_at', 'updated_at', 'written_at'),
+    'events': ('id', 'event_title', 'event_description', 'event_date', 'created_at', 'written_at'),
+}
+# Partial rows (insert responses, realtime payloads) may lack these; keep the stored value
+KEEP_IF_MISSING = {'created_at', 'updated_at'}
+
+# Searchable text columns per table
+TEXT_COLUMNS = {
+    'contacts': ('name', 'phone_number'),
+    'events': ('event_title', 'event_description'),
+}
+
+CONTACT_SELECT = 'SELECT id, name, phone_number, created_at FROM contacts'
+EVENT_SELECT = 'SELECT id, event_title, event_description, event_date FROM events'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS contacts (
+    id INTEGER PRIMARY KEY,
+    name TEXT,
+    phone_number TEXT,
+    digits TEXT,
+    created_at TEXT,
+    updated_at TEXT,
+    written_at REAL
+);
+CREATE INDEX IF NOT EXISTS contacts_name_idx ON contacts (name, id);
+CREATE INDEX IF NOT EXISTS contacts_digits_idx ON contacts (digits);
+CREATE VIRTUAL TABLE IF NOT EXISTS contacts_fts USING fts5(
+    name, phone_number, content='contacts', content_rowid='id', tokenize='trigram'
+);
+CREATE TRIGGER IF NOT EXISTS contacts_fts_insert AFTER INSERT ON contacts BEGIN
+    INSERT INTO contacts_fts (rowid, name, phone_number) VALUES (new.id, new.name, new.phone_number);
+END;
+CREATE TRIGGER IF NOT EXISTS contacts_fts_delete AFTER DELETE ON contacts BEGIN
+    INSERT INTO contacts_fts (contacts_fts, rowid, name, phone_number)
+    VALUES ('delete', old.id, old.name, old.phone_number);
+END;
+CREATE TRIGGER IF NOT EXISTS contacts_fts_update AFTER UPDATE OF name, phone_number ON contacts BEGIN
+    INSERT INTO contacts_fts (contacts_fts, rowid, name, phone_number)
+    VALUES ('delete', old.id, old.name, old.phone_number);
+    INSERT INTO contacts_fts (rowid, name, phone_number) VALUES (new.id, new.name, new.phone_number);
+END;
+
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY,
+    event_title TEXT,
+    event_description TEXT,
+    event_date TEXT,
+    created_at TEXT,
+    written_at REAL
+);
+CREATE INDEX IF NOT EXISTS events_date_idx ON events (event_date, id);
+CREATE VIRTUAL TABLE IF NOT EXISTS events_fts USING fts5(
+    event_title, event_description, content='events', content_rowid='id', tokenize='trigram'
+);
+CREATE TRIGGER IF NOT EXISTS events_fts_insert AFTER INSERT ON events BEGIN
+    INSERT INTO events_fts (rowid, event_title, event_description)
+    VALUES (new.id, new.event_title, new.event_description);
+END;
+CREATE TRIGGER IF NOT EXISTS events_fts_delete AFTER DELETE ON events BEGIN
+    INSERT INTO events_fts (events_fts, rowid, event_title, event_description)
+    VALUES ('delete', old.id, old.event_title, old.event_description);
+END;
+CREATE TRIGGER IF NOT EXISTS events_fts_update AFTER UPDATE OF event_title, event_description ON events BEGIN
+    INSERT INTO events_fts (events_fts, rowid, event_title, event_description)
+    VALUES ('delete', old.id, old.event_title, old.event_description);
+    INSERT INTO events_fts (rowid, event_title, event_description)
+    VALUES (new.id, new.event_title, new.event_description);
+END;
+
+CREATE TABLE IF NOT EXISTS removed_rows (
+    table_name TEXT,
+    id INTEGER,
+    removed_at REAL,
+    PRIMARY KEY (table_name, id)
+);
+
+CREATE TABLE IF NOT EXISTS sync_state (
+    table_name TEXT PRIMARY KEY,
+    cursor TEXT,
+    synced_at REAL,
+    full_synced_at REAL
+);
+"""
+
+def _upsert_sql(table):
+    columns = TABLE_COLUMNS[table]
+    changed = [c for c in columns if c not in ('id', 'written_at')]
+    assignments = [
+        f"{c} = COALESCE(excluded.{c}, {table}.{c})" if c in KEEP_IF_MISSING else f"{c} = excluded.{c}"
+        for c in changed
+    ]
+    differs = ' OR '.join(f"excluded.{c} IS NOT {table}.{c}" for c in changed if c not in KEEP_IF_MISSING)
+    return (
+        f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))}) "
+        f"ON CONFLICT(id) DO UPDATE SET {', '.join(assignments)}, written_at = excluded.written_at "
+        f"WHERE ({differs}) AND ({table}.written_at IS NULL OR {table}.written_at <= excluded.written_at)"
+    )
+
+UPSERT_SQL = {table: _upsert_sql(table) for table in TABLE_COLUMNS}
+
+def _row_values(table, row, written_at):
+    values = []
+    for column in TABLE_COLUMNS[table]:
+        if column == 'digits':
+            values.append(phone_digits(row.get('phone_number')))
+        elif column == 'written_at':
+            values.append(written_at)
+        else:
+            values.append(row.get(column))
+    return values
+
+def _fts_phrase(term):
+    """Quote a term as one FTS5 phrase so operators and punctuation are matched literally"""
+    return '"' + term.replace('"', '""') + '"'
+
+def _like_pattern(term):
+    escaped = term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return f"%{escaped}%"
+
+def _term_clause(table, term):
+    """(SQL condition, params) for rows where any text column contains term"""
+    if len(term) >= MIN_FTS_TERM:
+        return f"id IN (SELECT rowid FROM {table}_fts WHERE {table}_fts MATCH ?)", [_fts_phrase(term)]
+    columns = TEXT_COLUMNS[table]
+    clause = ' OR '.join(f"{column} LIKE ? ESCAPE '\\'" for column in columns)
+    return f"({clause})", [_like_pattern(term)] * len(columns)
+
+class LocalReplica:
+    """SQLite copy of contacts and events with FTS5 search"""
+
+    def __init__(self, client, path, sync_seconds=DEFAULT_SYNC_SECONDS, resync_seconds=DEFAULT_RESYNC_SECONDS,
+                 logger=None):
+        self.client = client
+        self.path = path
+        self.sync_seconds = sync_seconds
+        self.resync_seconds = resync_seconds
+        self.logger = logger or logging.getLogger(__name__)
+        self._local = threading.local()
+        self._ready = set()
+        self._lock_file = None
+        self._stop = threading.Event()
+        self._thread = None
+        self.pull_errors = 0
+        with self._connection() as conn:
+            conn.executescript(SCHEMA)
+
+    def _connection(self):
+        """This thread's connection (sqlite3 connections are not shared across threads)"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    # ---------- writes ----------
+
+    def upsert(self, table, rows, written_at=None):
+        """Insert or update rows (query results, insert/update responses, change-feed records)
+
+        written_at is when the data was read (a pull's start time); a stored
+        row written later is left alone. Defaults to now.
+        """
+        rows = [row for row in rows or [] if row and row.get('id') is not None]
+        if not rows:
+            return 0
+        written_at = written_at or time.time()
+        with self._connection() as conn:
+            conn.executemany(UPSERT_SQL[table], [_row_values(table, row, written_at) for row in rows])
+        return len(rows)
+
+    def remove(self, table, row_id):
+        """Delete a row and leave a tombstone so a pull already in flight doesn't bring it back"""
+        with self._connection() as conn:
+            conn.execute(f"DELETE FROM {table} WHERE id = ?", (row_id,))
+            conn.execute("INSERT OR REPLACE INTO removed_rows (table_name, id, removed_at) VALUES (?, ?, ?)",
+                         (table, row_id, time.time()))
+
+    def _not_removed_since(self, table, rows, started):
+        """Drop rows deleted locally after a pull started reading them"""
+        removed = {row_id for (row_id,) in self._connection().execute(
+            "SELECT id FROM removed_rows WHERE table_name = ? AND removed_at > ?", (table, started))}
+        return [row for row in rows if row['id'] not in removed] if removed else rows
+
+    def apply_change(self, table, op, record, old_record):
+        """Change-feed listener; bind the table with functools.partial"""
+        if op == 'DELETE':
+            if old_record.get('id') is not None:
+                self.remove(table, old_record['id'])
+        else:
+            self.upsert(table, [record])
+
+    def event_writes(self):
+        """EventStore index that copies single-event writes into the replica"""
+        return _EventWrites(self)
+
+    # ---------- sync ----------
+
+    def _state(self, table):
+        row = self._connection().execute(
+            "SELECT cursor, synced_at, full_synced_at FROM sync_state WHERE table_name = ?", (table,)
+        ).fetchone()
+        return row or (None, None, None)
+
+    def _save_state(self, conn, table, cursor, full=False):
+        now = time.time()
+        conn.execute(
+            "INSERT INTO sync_state (table_name, cursor, synced_at, full_synced_at) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT(table_name) DO UPDATE SET cursor = excluded.cursor, synced_at = excluded.synced_at, "
+            "full_synced_at = COALESCE(excluded.full_synced_at, sync_state.full_synced_at)",
+            (table, cursor, now, now if full else None),
+        )
+
+    def pull_all(self, table):
+        """Replace the table with a full read of Supabase
+
+        Rows written or deleted locally after the read started keep their
+        local state: the upsert skips newer rows, the delete spares them and
+        tombstones keep deleted ones out.
+        """
+        spec, cursor_column = REPLICA_TABLES[table]
+        started = time.time()
+        rows = fetch_table(self.client, spec)
+        cursors = [row[cursor_column] for row in rows if row.get(cursor_column)]
+        conn = self._connection()
+        with conn:
+            conn.execute("CREATE TEMP TABLE IF NOT EXISTS seen_ids (id INTEGER PRIMARY KEY)")
+            conn.execute("DELETE FROM seen_ids")
+            conn.executemany("INSERT OR IGNORE INTO seen_ids (id) VALUES (?)", ((row['id'],) for row in rows))
+            kept = self._not_removed_since(table, rows, started)
+            conn.executemany(UPSERT_SQL[table], [_row_values(table, row, started) for row in kept])
+            conn.execute(
+                f"DELETE FROM {table} WHERE id NOT IN (SELECT id FROM seen_ids) "
+                f"AND (written_at IS NULL OR written_at <= ?)", (started,)
+            )
+            # Older tombstones are covered by this read, which started after them
+            conn.execute("DELETE FROM removed_rows WHERE table_name = ? AND removed_at <= ?", (table, started))
+            self._save_state(conn, table, max(cursors) if cursors else None, full=True)
+        self._ready.add(table)
+        return len(rows)
+
+    def pull_changes(self, table):
+        """Upsert rows whose cursor column is at or past the stored cursor; returns how many
+
+        Pages are keyed on (cursor column, id), so rows sharing a timestamp
+        across a page boundary are not skipped. The first page re-reads rows
+        at the stored cursor; unchanged ones are no-ops.
+        """
+        spec, cursor_column = REPLICA_TABLES[table]
+        cursor = self._state(table)[0]
+        last_id = None
+        started = time.time()
+        pulled = 0
+        while True:
+            query = select_spec(self.client, spec)
+            if cursor and last_id is not None:
+                query = query.or_(after_cursor_filter(cursor_column, cursor, last_id))
+            elif cursor:
+                query = query.gte(cursor_column, cursor)
+            rows = query.order(cursor_column).order('id').limit(PAGE_SIZE).execute().data or []
+            self.upsert(table, self._not_removed_since(table, rows, started), written_at=started)
+            pulled += len(rows)
+            with_cursor = [row for row in rows if row.get(cursor_column)]  # nulls sort last
+            if with_cursor:
+                cursor, last_id = with_cursor[-1][cursor_column], with_cursor[-1]['id']
+            if len(rows) < PAGE_SIZE or len(with_cursor) < len(rows):
+                break
+        with self._connection() as conn:
+            self._save_state(conn, table, cursor)
+        return pulled
+
+    def sync(self):
+        """Full pull for tables due one, delta pull for the rest"""
+        pulled = {}
+        for table in REPLICA_TABLES:
+            full_synced_at = self._state(table)[2]
+            if not full_synced_at or time.time() - full_synced_at >= self.resync_seconds:
+                pulled[table] = self.pull_all(table)
+            else:
+                pulled[table] = self.pull_changes(table)
+        return pulled
+
+    def try_acquire_leadership(self):
+        """Take the sync lock without blocking; only the holder pulls from Supabase"""
+        if not self._lock_file:
+            self._lock_file = try_lock_file(self.path + '.lock')
+        return bool(self._lock_file)
+
+    def _run(self):
+        while not self._stop.is_set():
+            if self.try_acquire_leadership():
+                try:
+                    self.sync()
+                except Exception as e:
+                    self.pull_errors += 1
+                    self.logger.error(f"Error syncing local replica: {e}")
+            self._stop.wait(self.sync_seconds)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="local-replica-sync", daemon=True)
+        self._thread.start()
+        return self._thread
+
+    def stop(self):
+        self._stop.set()
+
+    def ready(self, table):
+        """True once the table has had a full pull (by this worker or the sync leader)"""
+        if table not in self._ready and self._state(table)[2]:
+            self._ready.add(table)
+        return table in self._ready
+
+    # ---------- contacts ----------
+
+    def _contacts_page(self, where, params, limit, offset):
+        conn = self._connection()
+        total = conn.execute(f"SELECT COUNT(*) FROM contacts WHERE {where}", params).fetchone()[0]
+        rows = conn.execute(f"{CONTACT_SELECT} WHERE {where} ORDER BY name, id LIMIT ? OFFSET ?",
+                            params + [limit, offset]).fetchall()
+        return [ContactRecord(*row) for row in rows], total
+
+    def search_contacts(self, terms, match_all=False, limit=50, offset=0):
+        """(contacts whose name or phone contains any - or every - term in name order, total matches)"""
+        terms = [term for term in terms if term]
+        if not terms:
+            return [], 0
+        clauses, params = [], []
+        for term in terms:
+            clause, term_params = _term_clause('contacts', term)
+            clauses.append(clause)
+            params.extend(term_params)
+        where = (' AND ' if match_all else ' OR ').join(clauses)
+        return self._contacts_page(where, params, limit, offset)
+
+    def phone_lookup(self, digits, exact=False, limit=50, offset=0):
+        """(contacts whose phone digits equal - or start with - digits in name order, total matches)"""
+        digits = phone_digits(digits)
+        if exact:
+            where, params = "digits = ?", [digits]
+        else:
+            where, params = "digits >= ? AND digits < ?", [digits, digits + ':']  # ':' sorts right after '9'
+        return self._contacts_page(where, params, limit, offset)
+
+    # ---------- events (same reads as EventDateIndex / EventSearchIndex) ----------
+
+    def _events(self, where, params, limit=None):
+        sql = f"{EVENT_SELECT} WHERE {where} ORDER BY event_date, id"
+        if limit:
+            sql += f" LIMIT {int(limit)}"
+        return [EventRecord(*row) for row in self._connection().execute(sql, params)]
+
+    def between(self, date_from=None, date_to=None):
+        """Events with date_from <= event_date <= date_to, oldest first (either bound may be None)"""
+        clauses, params = ["1"], []
+        if date_from:
+            clauses.append("event_date >= ?")
+            params.append(date_from)
+        if date_to:
+            clauses.append("event_date <= ?")
+            params.append(date_to)
+        return self._events(' AND '.join(clauses), params)
+
+    def on_date(self, day):
+        return self.between(day, day)
+
+    def upcoming(self, day, limit=5):
+        """The next `limit` events on or after day"""
+        return self._events("event_date >= ?", [day], limit)
+
+    def search_events(self, query, limit=None):
+        """Events matching every term (title or description), by date; YYYY-MM(-DD) terms filter dates"""
+        terms, date_from, date_to = parse_search_query(query)
+        if not terms and not date_from:
+            return []
+        clauses, params = [], []
+        for term in terms:
+            clause, term_params = _term_clause('events', term)
+            clauses.append(clause)
+            params.extend(term_params)
+        if date_from:
+            clauses.append("event_date >= ? AND event_date <= ?")
+            params.extend([date_from, date_to])
+        return self._events(' AND '.join(clauses), params, limit)
+
+    # ---------- metrics ----------
+
+    def stats(self):
+        """Rows, cursor and sync lag (seconds since the last successful pull) per table"""
+        conn = self._connection()
+        now = time.time()
+        tables = {}
+        for table in REPLICA_TABLES:
+            cursor, synced_at, full_synced_at = self._state(table)
+            tables[table] = {
+                "rows": conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0],
+                "cursor": cursor,
+                "lag_seconds": round(now - synced_at, 1) if synced_at else None,
+                "full_sync_age_seconds": round(now - full_synced_at, 1) if full_synced_at else None,
+            }
+        return {"path": self.path, "leader": bool(self._lock_file), "pull_errors": self.pull_errors, "tables": tables}
+
+class _EventWrites:
+    """Forwards EventStore changes to the replica; full loads are skipped, the replica pulls its own"""
+
+    def __init__(self, replica):
+        self.replica = replica
+
+    def rebuild(self, rows):
+        pass
+
+    def upsert(self, row):
+        self.replica.upsert('events', [row])
+
+    def remove(self, event_id):
+        self.replica.remove('events', event_id)
+
+def create_local_replica_from_env(client, logger=None):
+    """Started LocalReplica when LOCAL_REPLICA_PATH is set, else None"""
+    path = os.getenv('LOCAL_REPLICA_PATH')
+    if not path:
+        return None
+    try:
+        replica = LocalReplica(
+            client,
+            path,
+            sync_seconds=int(os.getenv('LOCAL_REPLICA_SYNC_SECONDS', DEFAULT_SYNC_SECONDS)),
+            resync_seconds=int(os.getenv('LOCAL_REPLICA_RESYNC_SECONDS', DEFAULT_RESYNC_SECONDS)),
+            logger=logger,
+        )
+    except sqlite3.Error as e:  # e.g. SQLite built without FTS5 / trigram (needs 3.34+)
+        (logger or logging.getLogger(__name__)).error(f"Local replica disabled: {e}")
+        return None
+    replica.start()
+    return replica
@@ -0,0 +1,226 @@
+# -*- coding: utf-8 -*-
+"""
+LINE message quota tracking and delivery planning
+ติดตามโควต้าข้อความ LINE และเลือกวิธีส่งที่ใช้โควต้าน้อยที่สุด
+
+LINE counts one message per recipient per request, and a request may carry
+up to 5 message objects, so N recipients x M messages costs
+N * ceil(M / 5). Multicast reaches up to 500 listed users per request;
+broadcast reaches every follower in one request and costs one message per
+follower. Follower counts can't tell who is a subscriber, so broadcast is
+only planned when BROADCAST_ALL_FOLLOWERS_SUBSCRIBED=true says every
+follower is one (and the follower count is no larger than the recipient
+list); otherwise multicast.
+
+Narrowcast is not planned: it needs LINE audience groups, which this bot
+does not maintain.
+
+Consumption is tracked locally after every send and re-synced from the
+quota/consumption endpoints every QUOTA_SYNC_SECONDS. Exhaustion is stored
+in QUOTA_STATE_FILE so a restart does not retry sends until the quota
+resets at the start of the next month (Japan time). Only LINE's monthly
+limit error counts as exhaustion; other 429s are per-second rate limits and
+are retried after RATE_LIMIT_BACKOFF_SECONDS.
+"""
+
+import json
+import logging
+import math
+import os
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+MULTICAST_MAX_RECIPIENTS = 500
+MAX_MESSAGES_PER_REQUEST = 5
+
+# LINE resets the monthly quota at 00:00 on the 1st, Japan time
+LINE_QUOTA_TZ = timezone(timedelta(hours=9))
+
+DEFAULT_SYNC_SECONDS = 900
+RATE_LIMIT_BACKOFF_SECONDS = (1, 2, 4)  # waits between retries of a rate-limited request
+
+def message_batches(message_count):
+    """Number of requests needed to deliver message_count messages to one recipient"""
+    return math.ceil(message_count / MAX_MESSAGES_PER_REQUEST) if message_count else 0
+
+def chunked(items, size):
+    """Split a list into consecutive chunks of at most size items"""
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+def is_quota_error(error):
+    """True when an API exception means the monthly limit was hit ("You have reached your monthly limit.")"""
+    return "monthly limit" in str(error).lower()
+
+def is_rate_limit_error(error):
+    """True for a 429 that is a short-term rate limit, not the monthly limit"""
+    status = getattr(error, 'status', None)
+    return (status == 429 or (status is None and "429" in str(error))) and not is_quota_error(error)
+
+def quota_month(now=None):
+    now = now or datetime.now(LINE_QUOTA_TZ)
+    return now.astimezone(LINE_QUOTA_TZ).strftime('%Y-%m')
+
+class QuotaTracker:
+    """Local view of the monthly LINE message quota"""
+
+    def __init__(self, messaging_api=None, insight_api=None, state_path=None,
+                 sync_interval=DEFAULT_SYNC_SECONDS, broadcast_allowed=False, logger=None):
+        self.messaging_api = messaging_api
+        self.insight_api = insight_api
+        self.state_path = state_path
+        self.sync_interval = sync_interval
+        self.broadcast_allowed = broadcast_allowed  # every follower is a subscriber
+        self.logger = logger or logging.getLogger(__name__)
+        self._lock = threading.Lock()
+        self.limit = None            # None = unlimited plan or not synced yet
+        self.consumed = 0
+        self.followers = None
+        self.synced_at = 0.0
+        self.exhausted_month = None
+        self._load_state()
+
+    # ---------- persistence ----------
+
+    def _load_state(self):
+        if not self.state_path:
+            return
+        try:
+            with open(self.state_path, encoding='utf-8') as f:
+                state = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return
+        if state.get('month') == quota_month():
+            self.limit = state.get('limit')
+            self.consumed = state.get('consumed', 0)
+            self.exhausted_month = state.get('exhausted_month')
+
+    def _save_state(self):
+        if not self.state_path:
+            return
+        tmp_path = f"{self.state_path}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({
+                    "month": quota_month(),
+                    "limit": self.limit,
+                    "consumed": self.consumed,
+                    "exhausted_month": self.exhausted_month,
+                }, f)
+            os.replace(tmp_path, self.state_path)
+        except OSError as e:
+            self.logger.error(f"Error saving quota state: {e}")
+
+    # ---------- syncing ----------
+
+    def sync(self):
+        """Refresh limit, consumption and follower count from the LINE API"""
+        if not self.messaging_api:
+            return
+        quota = self.messaging_api.get_message_quota()
+        consumption = self.messaging_api.get_message_quota_consumption()
+        followers = None
+        if self.insight_api:
+            try:
+                yesterday = (datetime.now(LINE_QUOTA_TZ) - timedelta(days=1)).strftime('%Y%m%d')
+                response = self.insight_api.get_number_of_followers(var_date=yesterday)
+                if response.status == 'ready':
+                    followers = response.followers
+            except Exception as e:
+                self.logger.warning(f"Could not fetch follower count: {e}")
+
+        with self._lock:
+            self.limit = quota.value if quota.type == 'limited' else None
+            self.consumed = consumption.total_usage or 0
+            if followers is not None:
+                self.followers = followers
+            self.synced_at = time.time()
+            if self.remaining is None or self.remaining > 0:
+                self.exhausted_month = None
+            self._save_state()
+
+    def maybe_sync(self):
+        """Sync when the local view is older than sync_interval; failures keep the local view"""
+        if time.time() - self.synced_at < self.sync_interval:
+            return
+        try:
+            self.sync()
+        except Exception as e:
+            self.synced_at = time.time()  # don't hammer the API while it fails
+            self.logger.error(f"Error syncing LINE message quota: {e}")
+
+    # ---------- bookkeeping ----------
+
+    @property
+    def remaining(self):
+        if self.limit is None:
+            return None
+        return max(self.limit - self.consumed, 0)
+
+    def record(self, count):
+        """Add messages that were just sent to the local consumption"""
+        with self._lock:
+            self.consumed += count
+            self._save_state()
+
+    def mark_exhausted(self):
+        """Remember that LINE rejected a send for the monthly limit"""
+        with self._lock:
+            self.exhausted_month = quota_month()
+            if self.limit is not None:
+                self.consumed = max(self.consumed, self.limit)
+            self._save_state()
+
+    def is_exhausted(self):
+        return self.exhausted_month == quota_month() or self.remaining == 0
+
+    # ---------- planning ----------
+
+    def plan(self, recipient_count, message_count=1, all_subscribers=True):
+        """Estimate the cost of sending message_count messages to recipient_count users
+
+        all_subscribers means the recipients are the whole subscriber list.
+        Broadcast also needs broadcast_allowed, since it reaches every follower
+        and is charged per follower.
+        """
+        batches = message_batches(message_count)
+        method = 'multicast'
+        cost = recipient_count * batches
+        requests = math.ceil(recipient_count / MULTICAST_MAX_RECIPIENTS) * batches
+
+        followers = self.followers
+        if self.broadcast_allowed and all_subscribers and followers is not None and 0 < followers <= recipient_count:
+            method = 'broadcast'
+            cost = followers * batches
+            requests = batches
+
+        remaining = self.remaining
+        return {
+            "method": method,
+            "recipients": recipient_count,
+            "messages": message_count,
+            "cost": cost,
+            "requests": requests,
+            "remaining": remaining,
+            "allowed": not self.is_exhausted() and (remaining is None or cost <= remaining),
+        }
+
+def format_plan_preview(plan):
+    """Thai one-paragraph cost preview for admins"""
+    remaining = "ไม่จำกัด" if plan['remaining'] is None else f"{plan['remaining']:,}"
+    status = "✅ โควต้าพอ" if plan['allowed'] else "⛔ โควต้าไม่พอ - จะไม่ส่ง"
+    return (f"💰 **ค่าใช้จ่ายโควต้า:** {plan['cost']:,} ข้อความ ({plan['method']}, {plan['requests']} request)\n"
+            f"📦 **โควต้าคงเหลือเดือนนี้:** {remaining}\n"
+            f"{status}")
+
+def create_quota_tracker_from_env(messaging_api=None, insight_api=None, logger=None):
+    """Build a QuotaTracker configured from environment variables"""
+    return QuotaTracker(
+        messaging_api,
+        insight_api,
+        state_path=os.getenv('QUOTA_STATE_FILE', os.path.join(tempfile.gettempdir(), 'notibot-quota.json')),
+        sync_interval=int(os.getenv('QUOTA_SYNC_SECONDS', DEFAULT_SYNC_SECONDS)),
+        broadcast_allowed=os.getenv('BROADCAST_ALL_FOLLOWERS_SUBSCRIBED', 'false').lower() in ('1', 'true', 'yes'),
+        logger=logger,
+    )
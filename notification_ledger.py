@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+"""
+Notification delivery ledger for LINE Bot
+บันทึกการส่งแจ้งเตือน เพื่อไม่ให้ส่งซ้ำและเปลือง quota
+
+Every reminder push is recorded as (event_id, reminder_kind, recipient).
+reminder_kind includes the event date ("today:2025-08-09"), so a reminder
+is sent again only when the event is moved to another date. recipient is a
+LINE user id, or a batch key for multicast/broadcast sends.
+
+Required table (run once in the Supabase SQL editor):
+
+    CREATE TABLE notification_deliveries (
+      event_id INTEGER NOT NULL,
+      reminder_kind VARCHAR NOT NULL,
+      recipient VARCHAR NOT NULL,
+      delivered_at TIMESTAMP DEFAULT NOW(),
+      PRIMARY KEY (event_id, reminder_kind, recipient)
+    );
+"""
+
+from query_specs import select_spec
+
+LEDGER_TABLE = 'notification_deliveries'
+PAGE_SIZE = 1000  # Supabase returns at most 1000 rows per request
+FLUSH_SIZE = 200
+
+def reminder_kind(day_label, event_date):
+    """Ledger kind for a reminder, e.g. 'tomorrow:2025-08-10'"""
+    return f"{day_label}:{event_date}"
+
+def fetch_delivered(client, event_ids, kinds):
+    """Return the set of (event_id, reminder_kind, recipient) already delivered"""
+    delivered = set()
+    if not event_ids:
+        return delivered
+
+    offset = 0
+    while True:
+        response = select_spec(client, 'notification_deliveries.keys') \
+            .in_('event_id', list(event_ids)).in_('reminder_kind', list(kinds)) \
+            .order('event_id').order('reminder_kind').order('recipient') \
+            .range(offset, offset + PAGE_SIZE - 1).execute()
+        rows = response.data or []
+        delivered.update((row['event_id'], row['reminder_kind'], row['recipient']) for row in rows)
+        if len(rows) < PAGE_SIZE:
+            return delivered
+        offset += PAGE_SIZE
+
+def plan_deliveries(reminders, recipients, delivered):
+    """Split each reminder's recipients into pending ones
+
+    reminders: list of dicts with event_id and kind
+    Returns (plan, skipped) where plan is a list of (reminder, pending_recipients).
+    """
+    plan = []
+    skipped = 0
+    for reminder in reminders:
+        pending = [r for r in recipients if (reminder['event_id'], reminder['kind'], r) not in delivered]
+        skipped += len(recipients) - len(pending)
+        if pending:
+            plan.append((reminder, pending))
+    return plan, skipped
+
+class DeliveryRecorder:
+    """Buffer delivered keys and upsert them into the ledger in chunks
+
+    add() only buffers, so a ledger error can never drop keys still being
+    added. Keys leave the buffer only once their chunk is written; call
+    flush_if_full() between sends to keep the buffer small, and flush() at
+    the end. A failed write is retried by the next flush.
+    """
+
+    def __init__(self, client, flush_size=FLUSH_SIZE):
+        self.client = client
+        self.flush_size = flush_size
+        self.pending = []
+        self.recorded = 0
+
+    def add(self, event_id, kind, recipient):
+        self.pending.append({'event_id': event_id, 'reminder_kind': kind, 'recipient': recipient})
+
+    def flush_if_full(self):
+        if len(self.pending) >= self.flush_size:
+            self.flush()
+
+    def flush(self):
+        """Write buffered keys a chunk at a time; duplicates from concurrent runs are ignored"""
+        while self.pending:
+            rows = self.pending[:self.flush_size]
+            self.client.table(LEDGER_TABLE).upsert(
+                rows, on_conflict='event_id,reminder_kind,recipient', ignore_duplicates=True
+            ).execute()
+            del self.pending[:len(rows)]
+            self.recorded += len(rows)
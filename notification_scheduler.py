@@ -0,0 +1,211 @@
+# -*- coding: utf-8 -*-
+"""
+In-process notification scheduler for LINE Bot
+ตัวตั้งเวลาส่งแจ้งเตือนภายในแอป (แทน cron ภายนอก)
+
+Runs the notification job at fixed Thai-time slots on a daemon thread.
+Every gunicorn worker starts the thread, but only the worker holding an
+exclusive flock on SCHEDULER_LOCK_FILE fires jobs; the others keep retrying
+the lock so a replacement worker takes over if the leader dies. The last
+completed slot is stored in SCHEDULER_STATE_FILE, so a slot missed while the
+service was down is run once after restart (within the catch-up window).
+
+Environment:
+    ENABLE_INTERNAL_SCHEDULER=true      start the scheduler thread
+    NOTIFICATION_SLOTS=06:00,18:00      Thai-time slots (HH:MM, comma separated)
+    NOTIFICATION_CATCHUP_HOURS=6        how late a missed slot may still run
+    SCHEDULER_LOCK_FILE / SCHEDULER_STATE_FILE  override file locations
+"""
+
+import json
+import logging
+import os
+import tempfile
+import threading
+from datetime import datetime, timedelta, timezone
+
+try:
+    import fcntl
+except ImportError:  # Windows - no flock, single process assumed
+    fcntl = None
+
+THAI_TZ = timezone(timedelta(hours=7))
+
+DEFAULT_SLOTS = "06:00,18:00"
+DEFAULT_CATCHUP_HOURS = 6
+LEADER_RETRY_SECONDS = 60
+ERROR_BACKOFF_SECONDS = 60
+
+def parse_slots(value):
+    """Parse 'HH:MM,HH:MM' into a sorted list of (hour, minute) tuples"""
+    slots = []
+    for part in value.split(','):
+        part = part.strip()
+        if not part:
+            continue
+        hour, minute = part.split(':')
+        hour, minute = int(hour), int(minute)
+        if not (0 <= hour < 24 and 0 <= minute < 60):
+            raise ValueError(f"Invalid notification slot: {part}")
+        slots.append((hour, minute))
+    if not slots:
+        raise ValueError("No notification slots configured")
+    return sorted(set(slots))
+
+def slot_times(slots, day):
+    """Return the slot datetimes (Thai time) for one calendar day"""
+    return [datetime(day.year, day.month, day.day, hour, minute, tzinfo=THAI_TZ) for hour, minute in slots]
+
+def previous_slot(slots, now):
+    """Most recent slot at or before now"""
+    for day in (now.date(), now.date() - timedelta(days=1)):
+        candidates = [t for t in slot_times(slots, day) if t <= now]
+        if candidates:
+            return candidates[-1]
+    return None
+
+def next_slot(slots, now):
+    """First slot strictly after now"""
+    for day in (now.date(), now.date() + timedelta(days=1)):
+        candidates = [t for t in slot_times(slots, day) if t > now]
+        if candidates:
+            return candidates[0]
+    return None
+
+class NotificationScheduler:
+    """Fire a job at Thai-time slots from one leader process"""
+
+    def __init__(self, job, slots, lock_path, state_path, catchup=timedelta(hours=DEFAULT_CATCHUP_HOURS), logger=None):
+        self.job = job
+        self.slots = slots
+        self.lock_path = lock_path
+        self.state_path = state_path
+        self.catchup = catchup
+        self.logger = logger or logging.getLogger(__name__)
+        self._lock_file = None
+        self._last_run = None  # last completed slot, in case the state file can't be written
+        self._stop = threading.Event()
+        self._thread = None
+
+    # ---------- leader lock ----------
+
+    def try_acquire_leadership(self):
+        """Take the exclusive scheduler lock without blocking"""
+        if self._lock_file:
+            return True
+        if fcntl is None:
+            self._lock_file = True
+            return True
+        lock_file = open(self.lock_path, 'a')
+        try:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        self._lock_file = lock_file
+        return True
+
+    @property
+    def is_leader(self):
+        return bool(self._lock_file)
+
+    # ---------- state ----------
+
+    def load_last_run(self):
+        """Return the last completed slot, or None"""
+        try:
+            with open(self.state_path, encoding='utf-8') as f:
+                return datetime.fromisoformat(json.load(f)['last_slot'])
+        except (FileNotFoundError, KeyError, ValueError):
+            return None
+
+    def save_last_run(self, slot, result):
+        """Persist the completed slot atomically"""
+        tmp_path = f"{self.state_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({
+                "last_slot": slot.isoformat(),
+                "finished_at": datetime.now(THAI_TZ).isoformat(),
+                "result": result if isinstance(result, dict) else str(result),
+            }, f, ensure_ascii=False)
+        os.replace(tmp_path, self.state_path)
+
+    # ---------- running ----------
+
+    def due_slot(self, now):
+        """Slot that should run now: the latest one not yet run and still within the catch-up window"""
+        slot = previous_slot(self.slots, now)
+        if slot is None or now - slot > self.catchup:
+            return None
+        last_run = max(filter(None, (self.load_last_run(), self._last_run)), default=None)
+        if last_run and last_run >= slot:
+            return None
+        return slot
+
+    def run_slot(self, slot):
+        """Run the job for one slot and record it"""
+        self.logger.info(f"Scheduler running notifications for slot {slot.isoformat()}")
+        try:
+            result = self.job(today=slot.date())
+        except Exception as e:
+            self.logger.error(f"Scheduled notification job failed: {e}")
+            result = {"status": "error", "message": str(e)}
+        self._last_run = slot
+        try:
+            self.save_last_run(slot, result)
+        except Exception as e:
+            self.logger.error(f"Error saving scheduler state to {self.state_path}: {e}")
+        self.logger.info(f"Scheduler slot {slot.isoformat()} finished: {result}")
+        return result
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                if not self.try_acquire_leadership():
+                    self._stop.wait(LEADER_RETRY_SECONDS)
+                    continue
+
+                now = datetime.now(THAI_TZ)
+                slot = self.due_slot(now)
+                if slot:
+                    self.run_slot(slot)
+                    continue
+
+                wait_seconds = (next_slot(self.slots, now) - now).total_seconds()
+                self._stop.wait(max(wait_seconds, 1))
+            except Exception as e:
+                self.logger.error(f"Scheduler loop error, retrying in {ERROR_BACKOFF_SECONDS}s: {e}")
+                self._stop.wait(ERROR_BACKOFF_SECONDS)
+
+    def start(self):
+        """Start the background thread (idempotent)"""
+        if self._thread and self._thread.is_alive():
+            return self._thread
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="notification-scheduler", daemon=True)
+        self._thread.start()
+        return self._thread
+
+    def stop(self, timeout=None):
+        """Stop the thread and release the leader lock"""
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+        if self._lock_file and self._lock_file is not True:
+            self._lock_file.close()
+        self._lock_file = None
+
+def scheduler_enabled():
+    return os.getenv('ENABLE_INTERNAL_SCHEDULER', 'false').lower() in ('1', 'true', 'yes')
+
+def create_scheduler_from_env(job, logger=None):
+    """Build a NotificationScheduler configured from environment variables"""
+    tmp_dir = tempfile.gettempdir()
+    return NotificationScheduler(
+        job,
+        parse_slots(os.getenv('NOTIFICATION_SLOTS', DEFAULT_SLOTS)),
+        os.getenv('SCHEDULER_LOCK_FILE', os.path.join(tmp_dir, 'notibot-scheduler.lock')),
+        os.getenv('SCHEDULER_STATE_FILE', os.path.join(tmp_dir, 'notibot-scheduler.json')),
+        catchup=timedelta(hours=float(os.getenv('NOTIFICATION_CATCHUP_HOURS', DEFAULT_CATCHUP_HOURS))),
+        logger=logger,
+    )
@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+"""
+Notification text templates for LINE Bot
+แม่แบบข้อความแจ้งเตือน (ไทย/อังกฤษ) พร้อมแคชข้อความที่ render แล้ว
+
+Each reminder is rendered once per (template, language, event version) and
+the resulting TextMessage is reused for every recipient and every later run
+until the event changes. Events have no updated_at column, so the version
+is the content itself: id, title, description and date.
+
+The cached TextMessage objects are shared - never mutate them.
+"""
+
+import os
+from collections import OrderedDict
+from datetime import datetime
+from threading import Lock
+
+from linebot.v3.messaging import TextMessage
+
+DEFAULT_LANGUAGE = os.getenv('NOTIFICATION_LANGUAGE', 'th')
+CACHE_SIZE = 512
+
+TEMPLATES = {
+    'th': {
+        'reminder_today': """🔔 เตือนกิจกรรมวันนี้!
+
+📝 **{title}**
+📋 {description}
+📅 **วันที่:** {date} (วันนี้)
+
+⏰ อย่าลืมเข้าร่วมนะครับ!
+
+📲 แจ้งเตือนอัตโนมัติ""",
+        'reminder_tomorrow': """🔔 เตือนกิจกรรมพรุ่งนี้!
+
+📝 **{title}**
+📋 {description}
+📅 **วันที่:** {date} (พรุ่งนี้)
+
+⏰ เตรียมตัวไว้นะครับ!
+
+📲 แจ้งเตือนอัตโนมัติ""",
+        'next_event': """🔔 แจ้งเตือนกิจกรรม
+
+📝 **{title}**
+📋 {description}
+📅 **วันที่:** {date}
+
+📲 ส่งจาก: ระบบแจ้งเตือนกิจกรรม""",
+        'announcement': """📢 {text}
+
+📲 ส่งจาก: ระบบแจ้งเตือนกิจกรรม""",
+    },
+    'en': {
+        'reminder_today': """🔔 Event today!
+
+📝 **{title}**
+📋 {description}
+📅 **Date:** {date} (today)
+
+⏰ Don't forget to join!
+
+📲 Automatic reminder""",
+        'reminder_tomorrow': """🔔 Event tomorrow!
+
+📝 **{title}**
+📋 {description}
+📅 **Date:** {date} (tomorrow)
+
+⏰ Get ready!
+
+📲 Automatic reminder""",
+        'next_event': """🔔 Upcoming event
+
+📝 **{title}**
+📋 {description}
+📅 **Date:** {date}
+
+📲 Sent by: Event notification system""",
+        'announcement': """📢 {text}
+
+📲 Sent by: Event notification system""",
+    },
+}
+
+def format_english_date(date_str):
+    """Format YYYY-MM-DD as '9 August 2025'"""
+    try:
+        date_obj = datetime.strptime(date_str, '%Y-%m-%d').date()
+        return f"{date_obj.day} {date_obj.strftime('%B')} {date_obj.year}"
+    except (TypeError, ValueError):
+        return date_str
+
+def event_version(event):
+    """Content key for an event row; changes whenever the rendered text would"""
+    return (event.get('id'), event.get('event_title', ''), event.get('event_description', ''), event.get('event_date', ''))
+
+class NotificationTemplates:
+    """Render notification messages once and reuse them across recipients"""
+
+    def __init__(self, thai_date_formatter, cache_size=CACHE_SIZE):
+        self.date_formatters = {'th': thai_date_formatter, 'en': format_english_date}
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._lock = Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _cached(self, key, render):
+        with self._lock:
+            message = self._cache.get(key)
+            if message is not None:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return message
+        message = TextMessage(text=render())
+        with self._lock:
+            self.misses += 1
+            self._cache[key] = message
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return message
+
+    def _language(self, lang):
+        return lang if lang in TEMPLATES else 'th'
+
+    def event_message(self, template, event, lang=None):
+        """TextMessage for an event template ('reminder_today', 'reminder_tomorrow', 'next_event')"""
+        lang = self._language(lang or DEFAULT_LANGUAGE)
+        version = event_version(event)
+
+        def render():
+            return TEMPLATES[lang][template].format(
+                title=version[1],
+                description=version[2],
+                date=self.date_formatters[lang](version[3]),
+            )
+        return self._cached((template, lang, version), render)
+
+    def reminder_message(self, event, day_label, lang=None):
+        """Reminder for 'today' or 'tomorrow'"""
+        return self.event_message(f"reminder_{day_label}", event, lang)
+
+    def announcement_message(self, text, lang=None):
+        """Admin /notify text wrapped with the sender footer (not cached - one-off text)"""
+        lang = self._language(lang or DEFAULT_LANGUAGE)
+        return TextMessage(text=TEMPLATES[lang]['announcement'].format(text=text))
+
+    def stats(self):
+        return {"entries": len(self._cache), "hits": self.hits, "misses": self.misses}
@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+"""
+Query specs for Supabase tables
+กำหนดคอลัมน์ที่ต้องใช้ในแต่ละงาน แทนการ select('*')
+
+Each spec names the smallest column set a use case actually reads, so
+responses carry fewer bytes and deserialize faster. Count-only requests use
+count='exact', head=True and never download rows.
+"""
+
+# use case -> (table, columns)
+QUERY_SPECS = {
+    # Event cards, carousels, search results and edit/delete confirmations
+    'events.display': ('events', 'id, event_title, event_description, event_date'),
+    # Reminder texts sent by the notification job
+    'events.notification': ('events', 'id, event_title, event_description, event_date'),
+    # Existence checks / limited lists where only the number of rows matters
+    'events.ids': ('events', 'id'),
+    # Contact cards and search results
+    'contacts.display': ('contacts', 'id, name, phone_number, created_at'),
+    # Excel export
+    'contacts.export': ('contacts', 'id, name, phone_number, created_at, created_by'),
+    # Duplicate checks
+    'contacts.ids': ('contacts', 'id'),
+    # Local SQLite replica (updated_at / created_at drive delta pulls)
+    'contacts.replica': ('contacts', 'id, name, phone_number, created_at, updated_at'),
+    'events.replica': ('events', 'id, event_title, event_description, event_date, created_at'),
+    # Push recipients
+    'subscribers.recipients': ('subscribers', 'user_id'),
+    # In-memory subscriber registry (created_at drives delta syncs)
+    'subscribers.registry': ('subscribers', 'user_id, created_at'),
+    # Notification ledger keys
+    'notification_deliveries.keys': ('notification_deliveries', 'event_id, reminder_kind, recipient'),
+}
+
+def spec_columns(spec):
+    """Return the column list declared for a spec"""
+    return QUERY_SPECS[spec][1]
+
+def select_spec(client, spec, count=None):
+    """Start a select query with the columns declared for a spec; count='exact' also returns the total"""
+    table, columns = QUERY_SPECS[spec]
+    return client.table(table).select(columns, count=count)
+
+def count_query(client, table):
+    """Start a count-only query; chain filters, then pass it to execute_count"""
+    return client.table(table).select('id', count='exact', head=True)
+
+def execute_count(query):
+    """Execute a count-only query and return the exact row count"""
+    response = query.execute()
+    return response.count or 0
+
+def count_rows(client, table):
+    """Count every row in a table without fetching any"""
+    return execute_count(count_query(client, table))
+
+def quote_filter_value(value):
+    """Quote a value for a PostgREST or=(...) filter so commas, dots and parentheses stay literal"""
+    escaped = str(value).replace('\\', '\\\\').replace('"', '\\"')
+    return f'"{escaped}"'
+
+def ilike_any_filter(columns, term):
+    """or_() filter matching rows where any of the columns contains term"""
+    pattern = quote_filter_value(f"%{term}%")
+    return ','.join(f"{column}.ilike.{pattern}" for column in columns)
+
+def like_prefix_filter(column, prefixes):
+    """or_() filter matching rows where column starts with any of the prefixes (case sensitive, index friendly)"""
+    return ','.join(f"{column}.like.{quote_filter_value(f'{prefix}%')}" for prefix in prefixes)
+
+def after_cursor_filter(column, value, row_id):
+    """or_() filter for rows after (value, row_id) in (column, id) order - keyset paging without ties skipped"""
+    quoted = quote_filter_value(value)
+    return f"{column}.gt.{quoted},and({column}.eq.{quoted},id.gt.{int(row_id)})"
@@ -0,0 +1,280 @@
+# -*- coding: utf-8 -*-
+"""
+Quick Reply registry for LINE Bot
+เมนู Quick Reply ที่สร้างและตรวจสอบครั้งเดียวตอน import
+
+Static menus are validated once at import time and handed out as shared
+QuickReply objects (plus their pre-serialized dict/JSON form), so replies no
+longer rebuild pydantic models on every message. Shared menus must never be
+mutated; build a new QuickReply when a variant is needed.
+Only menus that depend on request data are built per call, behind small LRUs.
+"""
+
+import json
+from datetime import date, timedelta
+from functools import lru_cache
+
+from linebot.v3.messaging import QuickReply, QuickReplyItem, MessageAction
+
+# Menu name -> [(label, text), ...]
+QUICK_REPLY_SPECS = {
+    "main": [
+        ("🎯 กิจกรรมวันนี้", "/today"),
+        ("🔍 ค้นหากิจกรรม", "/search"),
+        ("📞 สมุดเบอร์", "ค้นหาเบอร์อัจฉริยะ"),
+        ("📅 กิจกรรมทั้งหมด", "ล่าสุด"),
+        ("📝 คำสั่งทั้งหมด", "คำสั่งทั้งหมด"),
+        ("💡 วิธีใช้", "help"),
+    ],
+    "admin": [
+        ("➕ เพิ่มกิจกรรม", "เพิ่มกิจกรรม"),
+        ("⚙️ จัดการกิจกรรม", "จัดการกิจกรรม"),
+        ("📋 จัดการเบอร์", "/contacts"),
+        ("📢 ส่งแจ้งเตือน", "ส่งแจ้งเตือน"),
+        ("📊 รายงาน", "admin_reports"),
+        ("🏠 เมนูหลัก", "สวัสดี"),
+    ],
+    "contact": [
+        ("📞 เพิ่มเบอร์", "เพิ่มเบอร์ "),
+        ("🔍 ค้นหาอัจฉริยะ", "ค้นหาเบอร์อัจฉริยะ"),
+        ("📊 สถิติเบอร์", "สถิติเบอร์"),
+        ("📄 ส่งออกข้อมูล", "ส่งออกเบอร์"),
+        ("🏠 เมนูหลัก", "สวัสดี"),
+    ],
+    "smart_search": [
+        ("📱 มือถือ", "หาเบอร์ mobile"),
+        ("☎️ บ้าน", "หาเบอร์ landline"),
+        ("🕐 ล่าสุด", "หาเบอร์ recent"),
+        ("📋 ทั้งหมด", "เบอร์ทั้งหมด"),
+        ("🔍 ค้นหาชื่อ", "หาเบอร์ "),
+    ],
+    "add_contact_examples": [
+        ("💡 เพิ่มเบอร์ สมชาย 081-234-5678", "เพิ่มเบอร์ สมชาย 081-234-5678"),
+        ("💡 เพิ่มเบอร์ ดาว 089-999-8888", "เพิ่มเบอร์ ดาว 089-999-8888"),
+    ],
+    "cancel": [
+        ("❌ ยกเลิก", "สวัสดี"),
+        ("🏠 เมนูหลัก", "สวัสดี"),
+    ],
+    "comprehensive": [
+        ("📅 วันนี้", "/today"),
+        ("🔍 ค้นหา", "/search"),
+        ("📞 เบอร์", "ค้นหาเบอร์อัจฉริยะ"),
+        ("📊 สถิติ", "สถิติเบอร์"),
+        ("➕ เพิ่ม", "เพิ่มเบอร์ "),
+        ("📋 ทั้งหมด", "ล่าสุด"),
+        ("💡 Help", "help"),
+        ("🏠 หลัก", "สวัสดี"),
+    ],
+    "event": [
+        ("📅 วันนี้", "/today"),
+        ("🔜 ถัดไป", "/next"),
+        ("📆 เดือนนี้", "/month"),
+        ("🔍 ค้นหา", "/search"),
+        ("📋 ทั้งหมด", "ล่าสุด"),
+        ("🏠 หลัก", "สวัสดี"),
+    ],
+    "compact_contact": [
+        ("➕ เพิ่ม", "เพิ่มเบอร์ "),
+        ("🔍 หา", "ค้นหาเบอร์อัจฉริยะ"),
+        ("📊 สถิติ", "สถิติเบอร์"),
+        ("📱 มือถือ", "หาเบอร์ mobile"),
+        ("☎️ บ้าน", "หาเบอร์ landline"),
+        ("🏠 หลัก", "สวัสดี"),
+    ],
+    "all_commands": [
+        ("📅 วันนี้", "/today"),
+        ("🔜 ถัดไป", "/next"),
+        ("📆 เดือน", "/month"),
+        ("🔍 ค้นหา", "/search"),
+        ("📋 ล่าสุด", "ล่าสุด"),
+        ("📞 เบอร์", "ค้นหาเบอร์อัจฉริยะ"),
+        ("➕ เพิ่ม", "เพิ่มเบอร์ "),
+        ("📊 สถิติ", "สถิติเบอร์"),
+        ("💡 Help", "help"),
+        ("🏠 หลัก", "สวัสดี"),
+        ("🔔 ติดตาม", "/subscribe"),
+        ("⚙️ Admin", "/admin"),
+    ],
+    "search_commands": [
+        ("🔍 กิจกรรม", "/search"),
+        ("📞 เบอร์อัจฉริยะ", "ค้นหาเบอร์อัจฉริยะ"),
+        ("📱 มือถือ", "หาเบอร์ mobile"),
+        ("☎️ บ้าน", "หาเบอร์ landline"),
+        ("🕐 ล่าสุด", "หาเบอร์ recent"),
+        ("📋 ทั้งหมด", "เบอร์ทั้งหมด"),
+        ("🏠 หลัก", "สวัสดี"),
+    ],
+    "admin_all_commands": [
+        ("➕ เพิ่มกิจกรรม", "เพิ่มกิจกรรม"),
+        ("⚙️ จัดการ", "จัดการกิจกรรม"),
+        ("📢 แจ้งเตือน", "ส่งแจ้งเตือน"),
+        ("📋 รายการ", "/list"),
+        ("📞 จัดการเบอร์", "/contacts"),
+        ("📄 ส่งออก", "ส่งออกเบอร์"),
+        ("📊 รายงาน", "admin_reports"),
+        ("🏠 หลัก", "สวัสดี"),
+    ],
+    "date_commands": [
+        ("📅 วันนี้", "/today"),
+        ("🔜 ถัดไป", "/next"),
+        ("📆 เดือนนี้", "/month"),
+        ("📋 ล่าสุด 5", "ล่าสุด"),
+        ("📋 ล่าสุด 10", "ล่าสุด 10"),
+        ("📋 ล่าสุด 20", "ล่าสุด 20"),
+        ("🏠 หลัก", "สวัสดี"),
+    ],
+    "help": [
+        ("📝 คำสั่งทั้งหมด", "คำสั่งทั้งหมด"),
+        ("🔍 คำสั่งค้นหา", "คำสั่งค้นหา"),
+        ("📅 คำสั่งวันที่", "คำสั่งวันที่"),
+        ("🚀 เมนูรวม", "เมนูรวม"),
+        ("🏠 เมนูหลัก", "สวัสดี"),
+    ],
+    "event_search_menu": [
+        ("📝 ค้นหาชื่อ/รายละเอียด", "ค้นหาข้อความ"),
+        ("📅 ค้นหาวันที่", "ค้นหาวันที่"),
+        ("🔍 ค้นหาทั้งหมด", "ค้นหาทั้งหมด"),
+        ("❌ ยกเลิก", "สวัสดี"),
+    ],
+    "notify_menu": [
+        ("📝 ข้อความกำหนดเอง", "ข้อความกำหนดเอง"),
+        ("📅 แจ้งกิจกรรมถัดไป", "แจ้งกิจกรรมถัดไป"),
+        ("🤖 ทดสอบแจ้งเตือนอัตโนมัติ", "ทดสอบแจ้งเตือนอัตโนมัติ"),
+        ("📊 ดูสถิติผู้สมัคร", "ดูสถิติผู้สมัคร"),
+        ("❌ ยกเลิก", "สวัสดี"),
+    ],
+    "edit_menu": [
+        ("📝 แก้ชื่อ", "แก้ชื่อ"),
+        ("📋 แก้รายละเอียด", "แก้รายละเอียด"),
+        ("📅 แก้วันที่", "แก้วันที่"),
+        ("🔄 แก้ทั้งหมด", "แก้ทั้งหมด"),
+        ("❌ ยกเลิก", "สวัสดี"),
+    ],
+}
+
+def build_quick_reply(buttons):
+    """Build and validate a QuickReply from [(label, text), ...]"""
+    return QuickReply(items=[
+        QuickReplyItem(action=MessageAction(label=label, text=text))
+        for label, text in buttons
+    ])
+
+# Built, validated and serialized once at import
+QUICK_REPLIES = {name: build_quick_reply(buttons) for name, buttons in QUICK_REPLY_SPECS.items()}
+QUICK_REPLY_PAYLOADS = {name: quick_reply.to_dict() for name, quick_reply in QUICK_REPLIES.items()}
+QUICK_REPLY_JSON = {
+    name: json.dumps(payload, ensure_ascii=False, separators=(',', ':'))
+    for name, payload in QUICK_REPLY_PAYLOADS.items()
+}
+
+def get_quick_reply(name):
+    """Return the shared, prebuilt QuickReply registered under name"""
+    return QUICK_REPLIES[name]
+
+# ==================== STATIC MENUS ====================
+
+def create_main_quick_reply():
+    """Create main menu quick reply buttons - Modern, intuitive design"""
+    return QUICK_REPLIES["main"]
+
+def create_admin_quick_reply():
+    """Create admin menu quick reply buttons - Organized and streamlined"""
+    return QUICK_REPLIES["admin"]
+
+def create_contact_quick_reply():
+    """Create quick reply for contact management"""
+    return QUICK_REPLIES["contact"]
+
+def create_smart_search_quick_reply():
+    """Create smart search quick reply for large datasets"""
+    return QUICK_REPLIES["smart_search"]
+
+def create_cancel_quick_reply():
+    """Create cancel operation quick reply"""
+    return QUICK_REPLIES["cancel"]
+
+def create_comprehensive_quick_reply():
+    """Create comprehensive quick reply with all main features"""
+    return QUICK_REPLIES["comprehensive"]
+
+def create_event_quick_reply():
+    """Create event-focused quick reply menu"""
+    return QUICK_REPLIES["event"]
+
+def create_compact_contact_quick_reply():
+    """Create compact contact management menu"""
+    return QUICK_REPLIES["compact_contact"]
+
+def create_all_commands_quick_reply():
+    """Create comprehensive quick reply for ALL system commands"""
+    return QUICK_REPLIES["all_commands"]
+
+def create_search_commands_quick_reply():
+    """Quick reply for all search-related commands"""
+    return QUICK_REPLIES["search_commands"]
+
+def create_admin_all_commands_quick_reply():
+    """Quick reply for ALL admin commands"""
+    return QUICK_REPLIES["admin_all_commands"]
+
+def create_date_commands_quick_reply():
+    """Quick reply for date-related commands"""
+    return QUICK_REPLIES["date_commands"]
+
+# ==================== DYNAMIC MENUS ====================
+
+@lru_cache(maxsize=128)
+def create_pagination_quick_reply(page, total_pages, command_prefix="ล่าสุด"):
+    """Create pagination quick reply buttons"""
+    buttons = []
+
+    if page > 1:
+        buttons.append(("◀️ ก่อนหน้า", f"{command_prefix} {page-1}"))
+
+    buttons.append((f"📄 {page}/{total_pages}", f"{command_prefix} 1"))
+
+    if page < total_pages:
+        buttons.append(("▶️ ถัดไป", f"{command_prefix} {page+1}"))
+
+    buttons.append(("🏠 เมนูหลัก", "สวัสดี"))
+
+    return build_quick_reply(buttons)
+
+@lru_cache(maxsize=64)
+def create_delete_confirm_quick_reply(event_id):
+    """Create delete confirmation quick reply buttons"""
+    return build_quick_reply([
+        ("✅ ยืนยันลบ", f"ยืนยันลบ {event_id}"),
+        ("❌ ยกเลิก", "สวัสดี"),
+        ("🏠 เมนูหลัก", "สวัสดี"),
+    ])
+
+@lru_cache(maxsize=32)
+def create_suggestion_quick_reply(suggestions):
+    """Create quick reply from a tuple of suggested commands"""
+    return build_quick_reply([(f"💡 {suggestion[:20]}", suggestion) for suggestion in suggestions[:10]])
+
+def _date_buttons(today):
+    buttons = []
+    for i in range(10):  # Next 10 days (safe limit with buffer for LINE Bot API)
+        future_date = today + timedelta(days=i)
+        label = "วันนี้" if i == 0 else f"{future_date.day}/{future_date.month}"
+        buttons.append((label, str(future_date)))
+    return buttons
+
+@lru_cache(maxsize=2)
+def _date_quick_reply_for(today):
+    return build_quick_reply(_date_buttons(today) + [("📅 วันอื่น", "วันอื่น"), ("❌ ยกเลิก", "สวัสดี")])
+
+@lru_cache(maxsize=2)
+def _edit_date_quick_reply_for(today):
+    return build_quick_reply([("📅 วันเดิม", "เหมือนเดิม")] + _date_buttons(today) + [("📅 วันอื่น", "วันอื่น"), ("❌ ยกเลิก", "สวัสดี")])
+
+def create_date_quick_reply():
+    """Create quick date selection buttons (built once per day)"""
+    return _date_quick_reply_for(date.today())
+
+def create_edit_date_quick_reply():
+    """Create date selection buttons with a leading "keep current date" option"""
+    return _edit_date_quick_reply_for(date.today())
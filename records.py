@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+"""
+Slotted record types for cached rows
+คลาสเก็บแถวข้อมูลแบบ __slots__ ใช้หน่วยความจำน้อยกว่า dict
+
+PostgREST rows arrive as dicts, and a dict costs a hash table per row on
+top of the values. The in-memory caches keep rows for a long time, so they
+store these records instead: fixed attributes, no per-row __dict__, and
+only the columns of the matching query spec.
+
+Records answer row['column'] and row.get('column') like the dicts they
+replace, so the flex builders and templates take either. They are treated
+as immutable once built - caches share them between indexes.
+
+`python benchmarks.py --memory` prints bytes per row for dicts vs records.
+"""
+
+from query_specs import spec_columns
+
+class Record:
+    """Base for slotted rows; subclasses list their columns in __slots__"""
+
+    __slots__ = ()
+
+    def get(self, column, default=None):
+        return getattr(self, column, default)
+
+    def __getitem__(self, column):
+        try:
+            return getattr(self, column)
+        except AttributeError:
+            raise KeyError(column) from None
+
+    def __contains__(self, column):
+        return column in self.__slots__
+
+    def keys(self):
+        return self.__slots__
+
+    def to_dict(self):
+        return {column: getattr(self, column) for column in self.__slots__}
+
+    def __eq__(self, other):
+        return type(other) is type(self) and all(getattr(self, c) == getattr(other, c) for c in self.__slots__)
+
+    def __repr__(self):
+        return f"{type(self).__name__}({', '.join(f'{c}={getattr(self, c)!r}' for c in self.__slots__)})"
+
+class EventRecord(Record):
+    """events.display columns"""
+
+    __slots__ = ('id', 'event_title', 'event_description', 'event_date')
+
+    def __init__(self, id, event_title, event_description, event_date):
+        self.id = id
+        self.event_title = event_title
+        self.event_description = event_description
+        self.event_date = event_date
+
+    @classmethod
+    def from_row(cls, row):
+        get = row.get
+        return cls(get('id'), get('event_title'), get('event_description'), get('event_date'))
+
+class ContactRecord(Record):
+    """contacts.display columns"""
+
+    __slots__ = ('id', 'name', 'phone_number', 'created_at')
+
+    def __init__(self, id, name, phone_number, created_at):
+        self.id = id
+        self.name = name
+        self.phone_number = phone_number
+        self.created_at = created_at
+
+    @classmethod
+    def from_row(cls, row):
+        get = row.get
+        return cls(get('id'), get('name'), get('phone_number'), get('created_at'))
+
+# Keep the record layouts in step with the query specs they are built from
+for _record, _spec in ((EventRecord, 'events.display'), (ContactRecord, 'contacts.display')):
+    assert _record.__slots__ == tuple(c.strip() for c in spec_columns(_spec).split(',')), _spec
@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+"""
+Contact search result cache for LINE Bot
+แคชผลค้นหาเบอร์โทร (LRU + TTL) ล้างทั้งหมดเมื่อมีการเพิ่ม/แก้ไข/ลบเบอร์
+
+Results are keyed by the normalized query - lowercased, whitespace
+collapsed, terms de-duplicated and sorted - so 'หาเบอร์ สมชาย  ใจดี' and
+'หาเบอร์ ใจดี สมชาย' share one entry. Entries expire after a TTL and the
+least recently used entry is evicted once the cache is full.
+
+Contact writes bump a generation counter instead of walking the cache:
+entries from an older generation count as misses and are replaced lazily.
+
+The cache is per worker and only sees writes made through that worker,
+unless a change feed (CHANGE_FEED_MODE=realtime|polling) delivers the
+others. So it is off by default without a change feed; enabling it anyway
+means searches may show deleted or outdated contacts for up to the TTL
+after a write on another worker or in the Supabase dashboard.
+
+Environment:
+    CONTACT_SEARCH_CACHE_SIZE=512   entries (0 disables; default 512 with a change feed, else 0)
+    CONTACT_SEARCH_CACHE_TTL=300    seconds
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from change_feed import change_feed_enabled
+
+DEFAULT_SIZE = 512
+DEFAULT_TTL = 300
+
+def normalize_query(text):
+    """'  ใจดี  สมชาย ใจดี' -> 'สมชาย ใจดี' (lowercase, unique sorted terms)"""
+    return ' '.join(sorted(set((text or '').lower().split())))
+
+class SearchCache:
+    """Size-bounded LRU of search results with TTL and generation invalidation"""
+
+    def __init__(self, max_entries=DEFAULT_SIZE, ttl=DEFAULT_TTL, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.clock = clock
+        self.generation = 0
+        self._entries = OrderedDict()  # key -> (generation, expires_at, (rows, total))
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def _lookup(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                generation, expires_at, results = entry
+                if generation == self.generation and expires_at > self.clock():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return results
+                del self._entries[key]
+                self.expired += generation == self.generation
+            self.misses += 1
+            return None
+
+    def _store(self, key, generation, results):
+        with self._lock:
+            if generation != self.generation:
+                return  # a write happened while loading; don't cache pre-write results
+            self._entries[key] = (generation, self.clock() + self.ttl, results)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def _cached(self, key, loader):
+        results = self._lookup(key)
+        if results is None:
+            generation = self.generation
+            results = loader()
+            self._store(key, generation, results)
+        return results
+
+    def get_or_load_page(self, kind, query, limit, offset, loader):
+        """Cached (rows, total) for one page of a query; loader() returns (rows, total) and raises on failure"""
+        if self.max_entries <= 0:
+            return loader()
+
+        def load():
+            rows, total = loader()
+            return tuple(rows), total
+
+        rows, total = self._cached((kind, normalize_query(query), limit, offset), load)
+        return list(rows), total
+
+    def invalidate(self, *_):
+        """Drop every entry (contact added, edited or deleted); accepts change-feed arguments"""
+        with self._lock:
+            self.generation += 1
+            self.invalidations += 1
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl,
+            "generation": self.generation,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "expired": self.expired,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+def create_search_cache_from_env():
+    """Build a SearchCache configured from environment variables (disabled without a change feed by default)"""
+    return SearchCache(
+        max_entries=int(os.getenv('CONTACT_SEARCH_CACHE_SIZE', DEFAULT_SIZE if change_feed_enabled() else 0)),
+        ttl=float(os.getenv('CONTACT_SEARCH_CACHE_TTL', DEFAULT_TTL)),
+    )
@@ -0,0 +1,293 @@
+# -*- coding: utf-8 -*-
+"""
+Shared warm-start cache of events and contacts for LINE Bot
+ไฟล์ cache กิจกรรมและสมุดเบอร์ ให้ worker โหลดข้อมูลตอนเริ่ม/รีโหลดโดยไม่ต้อง query Supabase
+
+One refresher (the worker holding an flock on SNAPSHOT_LOCK_FILE) queries
+Supabase and writes a compact binary file; every worker maps the same file
+read-only. The file is a load source, not a query engine: the event store,
+the contact column store and the fuzzy index decode all of its rows into
+their own in-memory structures on each (re)load, so every worker still
+keeps its own copy. What the file saves is the Supabase full scan per
+worker and per reload. The dashboard preview also reads its first rows.
+
+File layout (little endian):
+    header    magic 'NBSNAP1\\0', version u64, built_at f64, section count u32
+    sections  name (16 bytes), offset u64, length u64 - one entry per section
+    <table>.rows     rows as compact UTF-8 JSON, back to back
+    <table>.offsets  u64[n + 1] byte offsets of each row in .rows
+
+Events are stored oldest first by (event_date, id); contacts newest first.
+
+A new version is written to a temporary file and moved over the old one
+with os.replace, so readers always see a complete file. Readers notice the
+new inode on their next check and remap; the old mapping is released when
+its last reader is done with it.
+
+A write on any worker touches <SNAPSHOT_PATH>.dirty; the refresher checks
+that file every few seconds and rebuilds early when it is newer than the
+last build, so writes from non-leader workers refresh the snapshot too.
+
+Environment:
+    SNAPSHOT_PATH=/tmp/notibot-snapshot.bin    enables the snapshot
+    SNAPSHOT_REFRESH_SECONDS=60                how often the refresher rebuilds
+    SNAPSHOT_LOCK_FILE                         override the refresher lock location
+"""
+
+import json
+import logging
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+
+from query_specs import select_spec
+
+try:
+    import fcntl
+except ImportError:  # Windows - no flock, single process assumed
+    fcntl = None
+
+MAGIC = b'NBSNAP1\0'
+HEADER = struct.Struct('<8sQdI')
+SECTION = struct.Struct('<16sQQ')
+
+PAGE_SIZE = 1000  # Supabase returns at most 1000 rows per request
+DEFAULT_REFRESH_SECONDS = 60
+CHECK_INTERVAL = 1.0  # seconds between stat() calls on the snapshot file
+DIRTY_CHECK_SECONDS = 2.0  # how often the refresher looks at the dirty file
+
+# table -> (spec, sort key); events oldest first, contacts newest first
+SNAPSHOT_TABLES = {
+    'events': ('events.display', lambda row: (row.get('event_date') or '', row['id'])),
+    'contacts': ('contacts.display', lambda row: (row.get('created_at') or '', row['id'])),
+}
+NEWEST_FIRST = {'contacts'}
+
+# ---------- writing ----------
+
+def _table_sections(table, rows):
+    encoded = [json.dumps(row, ensure_ascii=False, separators=(',', ':')).encode('utf-8') for row in rows]
+    offsets = [0]
+    for data in encoded:
+        offsets.append(offsets[-1] + len(data))
+    return {
+        f'{table}.rows': b''.join(encoded),
+        f'{table}.offsets': struct.pack(f'<{len(offsets)}Q', *offsets),
+    }
+
+def write_snapshot(path, tables, version):
+    """Write {table: rows} as a snapshot file, replacing the old one atomically"""
+    sections = {}
+    for table, rows in tables.items():
+        spec_key = SNAPSHOT_TABLES[table][1]
+        ordered = sorted(rows, key=spec_key, reverse=table in NEWEST_FIRST)
+        sections.update(_table_sections(table, ordered))
+
+    offset = HEADER.size + SECTION.size * len(sections)
+    entries = []
+    for name, data in sections.items():
+        entries.append(SECTION.pack(name.encode('ascii'), offset, len(data)))
+        offset += len(data)
+
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix='.snapshot-', dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(HEADER.pack(MAGIC, version, time.time(), len(sections)))
+            f.writelines(entries)
+            f.writelines(sections.values())
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+    return offset
+
+# ---------- reading ----------
+
+class Snapshot:
+    """One mapped version of the snapshot file"""
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            stat = os.fstat(f.fileno())
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.identity = (stat.st_ino, stat.st_mtime_ns)
+        magic, self.version, self.built_at, count = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a snapshot file")
+        view = memoryview(self._map)
+        self._sections = {}
+        for i in range(count):
+            name, offset, length = SECTION.unpack_from(self._map, HEADER.size + i * SECTION.size)
+            self._sections[name.rstrip(b'\0').decode('ascii')] = view[offset:offset + length]
+        self._tables = {}
+        for table in SNAPSHOT_TABLES:
+            if f'{table}.rows' in self._sections:
+                self._tables[table] = (
+                    self._sections[f'{table}.rows'],
+                    self._sections[f'{table}.offsets'].cast('Q'),
+                )
+
+    def has(self, table):
+        return table in self._tables
+
+    def count(self, table):
+        return len(self._tables[table][1]) - 1
+
+    def row(self, table, position):
+        rows, offsets = self._tables[table]
+        return json.loads(bytes(rows[offsets[position]:offsets[position + 1]]))
+
+    def rows(self, table, start=0, stop=None):
+        """Decode rows[start:stop] in stored order"""
+        stop = self.count(table) if stop is None else min(stop, self.count(table))
+        return [self.row(table, position) for position in range(start, stop)]
+
+class SnapshotReader:
+    """Keep the newest snapshot mapped; remap when the refresher replaces the file"""
+
+    def __init__(self, path, logger=None):
+        self.path = path
+        self.logger = logger or logging.getLogger(__name__)
+        self._snapshot = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def current(self):
+        """The mapped snapshot, or None while no file exists yet"""
+        now = time.monotonic()
+        if now - self._checked_at < CHECK_INTERVAL:
+            return self._snapshot
+        with self._lock:
+            self._checked_at = now
+            try:
+                stat = os.stat(self.path)
+            except FileNotFoundError:
+                return self._snapshot
+            if self._snapshot is None or self._snapshot.identity != (stat.st_ino, stat.st_mtime_ns):
+                try:
+                    self._snapshot = Snapshot(self.path)
+                except Exception as e:
+                    self.logger.error(f"Error mapping snapshot {self.path}: {e}")
+        return self._snapshot
+
+# ---------- refresher ----------
+
+def try_lock_file(path):
+    """Take an exclusive flock on path without blocking; returns the open file to keep, or None"""
+    if fcntl is None:
+        return True
+    lock_file = open(path, 'a')
+    try:
+        fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        lock_file.close()
+        return None
+    return lock_file
+
+def fetch_table(client, spec):
+    rows = []
+    offset = 0
+    while True:
+        response = select_spec(client, spec).order('id').range(offset, offset + PAGE_SIZE - 1).execute()
+        page = response.data or []
+        rows.extend(page)
+        if len(page) < PAGE_SIZE:
+            return rows
+        offset += PAGE_SIZE
+
+class SnapshotRefresher:
+    """Rebuild the snapshot file periodically from the worker holding the lock"""
+
+    def __init__(self, client, path, lock_path, interval=DEFAULT_REFRESH_SECONDS, logger=None):
+        self.client = client
+        self.path = path
+        self.lock_path = lock_path
+        self.dirty_path = f"{path}.dirty"
+        self.interval = interval
+        self.logger = logger or logging.getLogger(__name__)
+        self.version = 0
+        self.built_at_ns = 0  # wall clock at the start of the last successful build
+        self._lock_file = None
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def try_acquire_leadership(self):
+        """Take the exclusive refresher lock without blocking"""
+        if not self._lock_file:
+            self._lock_file = try_lock_file(self.lock_path)
+        return bool(self._lock_file)
+
+    def refresh(self):
+        """Query every snapshot table and write a new version"""
+        if not self.version:
+            try:
+                self.version = Snapshot(self.path).version
+            except Exception:
+                self.version = 0
+        tables = {table: fetch_table(self.client, spec) for table, (spec, _) in SNAPSHOT_TABLES.items()}
+        self.version += 1
+        size = write_snapshot(self.path, tables, self.version)
+        self.logger.info(f"Snapshot v{self.version} written ({size} bytes)")
+        return self.version
+
+    def request_refresh(self):
+        """Rebuild soon instead of waiting for the interval (after a write on any worker)"""
+        try:
+            with open(self.dirty_path, 'a'):
+                os.utime(self.dirty_path)
+        except OSError as e:
+            self.logger.error(f"Error marking snapshot dirty: {e}")
+        self._wake.set()
+
+    def is_dirty(self):
+        """True when some worker wrote since the last build started"""
+        try:
+            return os.stat(self.dirty_path).st_mtime_ns > self.built_at_ns
+        except FileNotFoundError:
+            return False
+
+    def _run(self):
+        while not self._stop.is_set():
+            leader = self.try_acquire_leadership()
+            if leader and (time.time_ns() - self.built_at_ns >= self.interval * 1e9 or self.is_dirty()):
+                started_ns = time.time_ns()
+                try:
+                    self.refresh()
+                    self.built_at_ns = started_ns  # writes during the build leave the file newer
+                except Exception as e:
+                    self.built_at_ns = started_ns  # retry at the next interval or write
+                    self.logger.error(f"Error refreshing snapshot: {e}")
+            self._wake.wait(DIRTY_CHECK_SECONDS if leader else self.interval)
+            self._wake.clear()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="snapshot-refresher", daemon=True)
+        self._thread.start()
+        return self._thread
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+def create_snapshot_from_env(client, logger=None):
+    """(SnapshotReader, started SnapshotRefresher), or (None, None) when SNAPSHOT_PATH is unset"""
+    path = os.getenv('SNAPSHOT_PATH')
+    if not path:
+        return None, None
+    refresher = SnapshotRefresher(
+        client,
+        path,
+        os.getenv('SNAPSHOT_LOCK_FILE', os.path.join(tempfile.gettempdir(), 'notibot-snapshot.lock')),
+        interval=int(os.getenv('SNAPSHOT_REFRESH_SECONDS', DEFAULT_REFRESH_SECONDS)),
+        logger=logger,
+    )
+    refresher.start()
+    return SnapshotReader(path, logger), refresher
@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+"""
+In-memory subscriber registry for LINE Bot
+เก็บรายชื่อผู้สมัครรับแจ้งเตือนไว้ในหน่วยความจำ ไม่ต้อง query ทุกครั้ง
+
+The registry loads every subscriber user_id once, then keeps itself fresh:
+    - add()/discard() hooks update it immediately on this worker
+    - a delta sync every SUBSCRIBER_DELTA_SECONDS picks up rows other workers
+      inserted (created_at >= last seen created_at)
+    - a full reload every SUBSCRIBER_RELOAD_SECONDS picks up deletions
+    - apply_change() takes inserts/deletes from change_feed as they happen
+
+Broadcast recipient lists, counts and membership checks then cost no query.
+"""
+
+import logging
+import os
+import threading
+import time
+
+from query_specs import select_spec
+
+PAGE_SIZE = 1000  # Supabase returns at most 1000 rows per request
+DEFAULT_DELTA_SECONDS = 300
+DEFAULT_RELOAD_SECONDS = 3600
+
+class SubscriberRegistry:
+    """Set of subscriber user ids mirrored from the subscribers table"""
+
+    def __init__(self, client, delta_seconds=DEFAULT_DELTA_SECONDS, reload_seconds=DEFAULT_RELOAD_SECONDS, logger=None):
+        self.client = client
+        self.delta_seconds = delta_seconds
+        self.reload_seconds = reload_seconds
+        self.logger = logger or logging.getLogger(__name__)
+        self._lock = threading.RLock()
+        self._ids = set()
+        self._snapshot = ()
+        self._cursor = None        # newest created_at seen
+        self.loaded_at = 0.0
+        self.synced_at = 0.0
+
+    # ---------- loading ----------
+
+    def _fetch(self, since=None):
+        rows = []
+        offset = 0
+        while True:
+            query = select_spec(self.client, 'subscribers.registry')
+            if since:
+                query = query.gte('created_at', since)
+            response = query.order('created_at').range(offset, offset + PAGE_SIZE - 1).execute()
+            page = response.data or []
+            rows.extend(page)
+            if len(page) < PAGE_SIZE:
+                return rows
+            offset += PAGE_SIZE
+
+    def _advance_cursor(self, rows):
+        newest = max((row['created_at'] for row in rows if row.get('created_at')), default=None)
+        if newest and (self._cursor is None or newest > self._cursor):
+            self._cursor = newest
+
+    def load(self):
+        """Replace the registry with a full scan of the subscribers table"""
+        rows = self._fetch()
+        with self._lock:
+            self._ids = {row['user_id'] for row in rows}
+            self._snapshot = None
+            self._cursor = None
+            self._advance_cursor(rows)
+            self.loaded_at = self.synced_at = time.time()
+        return len(rows)
+
+    def sync_delta(self):
+        """Add subscribers created since the newest one already seen"""
+        rows = self._fetch(since=self._cursor)
+        with self._lock:
+            before = len(self._ids)
+            self._ids.update(row['user_id'] for row in rows)
+            if len(self._ids) != before:
+                self._snapshot = None
+            self._advance_cursor(rows)
+            self.synced_at = time.time()
+        return len(self._ids) - before
+
+    def ensure_fresh(self):
+        """Load on first use, then delta-sync or fully reload when due"""
+        now = time.time()
+        if not self.loaded_at or now - self.loaded_at >= self.reload_seconds:
+            self.load()
+        elif now - self.synced_at >= self.delta_seconds:
+            try:
+                self.sync_delta()
+            except Exception as e:
+                self.synced_at = now  # keep serving the cached set, retry next interval
+                self.logger.error(f"Error syncing subscribers: {e}")
+        return self
+
+    # ---------- hooks ----------
+
+    def add(self, user_id):
+        with self._lock:
+            if user_id not in self._ids:
+                self._ids.add(user_id)
+                self._snapshot = None
+
+    def discard(self, user_id):
+        with self._lock:
+            if user_id in self._ids:
+                self._ids.discard(user_id)
+                self._snapshot = None
+
+    def apply_change(self, op, record, old_record):
+        """Change-feed listener for the subscribers table"""
+        if op == 'DELETE':
+            user_id = old_record.get('user_id')
+            if user_id:
+                self.discard(user_id)
+            else:
+                self.loaded_at = 0.0  # delete without the row (no REPLICA IDENTITY FULL) - reload on next use
+        elif record.get('user_id'):
+            self.add(record['user_id'])
+
+    # ---------- reads ----------
+
+    def recipients(self):
+        """Immutable snapshot of all subscriber ids"""
+        with self._lock:
+            if self._snapshot is None:
+                self._snapshot = tuple(self._ids)
+            return self._snapshot
+
+    def __contains__(self, user_id):
+        return user_id in self._ids
+
+    def __len__(self):
+        return len(self._ids)
+
+def create_subscriber_registry_from_env(client, logger=None):
+    """Build a SubscriberRegistry configured from environment variables"""
+    return SubscriberRegistry(
+        client,
+        delta_seconds=int(os.getenv('SUBSCRIBER_DELTA_SECONDS', DEFAULT_DELTA_SECONDS)),
+        reload_seconds=int(os.getenv('SUBSCRIBER_RELOAD_SECONDS', DEFAULT_RELOAD_SECONDS)),
+        logger=logger,
+    )
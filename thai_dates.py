@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+"""
+Thai date formatting for LINE Bot
+จัดรูปแบบวันที่ภาษาไทย (พ.ศ./ค.ศ./วันในสัปดาห์/วันนี้-พรุ่งนี้)
+
+Dates in a window of years around the current year are formatted once at
+import time into a lookup table keyed by the 'YYYY-MM-DD' string, so the
+common case is a single dict lookup. Dates outside the window fall back to
+an LRU-cached parser.
+"""
+
+from collections import namedtuple
+from datetime import date, timedelta
+from functools import lru_cache
+
+THAI_MONTHS = (
+    '', 'มกราคม', 'กุมภาพันธ์', 'มีนาคม', 'เมษายน', 'พฤษภาคม', 'มิถุนายน',
+    'กรกฎาคม', 'สิงหาคม', 'กันยายน', 'ตุลาคม', 'พฤศจิกายน', 'ธันวาคม'
+)
+THAI_MONTHS_SHORT = (
+    '', 'ม.ค.', 'ก.พ.', 'มี.ค.', 'เม.ย.', 'พ.ค.', 'มิ.ย.',
+    'ก.ค.', 'ส.ค.', 'ก.ย.', 'ต.ค.', 'พ.ย.', 'ธ.ค.'
+)
+# date.weekday(): Monday = 0
+THAI_WEEKDAYS = ('จันทร์', 'อังคาร', 'พุธ', 'พฤหัสบดี', 'ศุกร์', 'เสาร์', 'อาทิตย์')
+
+RELATIVE_DAYS = {-1: 'เมื่อวาน', 0: 'วันนี้', 1: 'พรุ่งนี้', 2: 'มะรืนนี้'}
+
+BUDDHIST_ERA_OFFSET = 543
+TABLE_YEARS_BEFORE = 2
+TABLE_YEARS_AFTER = 3
+
+ThaiDate = namedtuple('ThaiDate', ['date', 'be', 'ce', 'full', 'short'])
+
+def _build(date_obj):
+    day, month, year = date_obj.day, date_obj.month, date_obj.year
+    be_year = year + BUDDHIST_ERA_OFFSET
+    return ThaiDate(
+        date=date_obj,
+        be=f"{day} {THAI_MONTHS[month]} {be_year}",
+        ce=f"{day} {THAI_MONTHS[month]} {year}",
+        full=f"วัน{THAI_WEEKDAYS[date_obj.weekday()]}ที่ {day} {THAI_MONTHS[month]} {be_year}",
+        short=f"{day} {THAI_MONTHS_SHORT[month]} {str(be_year)[-2:]}",
+    )
+
+def _build_table(center_year):
+    table = {}
+    current = date(center_year - TABLE_YEARS_BEFORE, 1, 1)
+    end = date(center_year + TABLE_YEARS_AFTER, 12, 31)
+    while current <= end:
+        table[current.isoformat()] = _build(current)
+        current += timedelta(days=1)
+    return table
+
+_CALENDAR = _build_table(date.today().year)
+
+@lru_cache(maxsize=1024)
+def _parse(date_str):
+    try:
+        year, month, day = date_str.split('-')
+        return _build(date(int(year), int(month), int(day)))
+    except (AttributeError, TypeError, ValueError):
+        return None
+
+def lookup(date_str):
+    """ThaiDate for a 'YYYY-MM-DD' string, or None when it is not a valid date"""
+    entry = _CALENDAR.get(date_str) if isinstance(date_str, str) else None
+    return entry or _parse(date_str)
+
+def format_thai_date(date_str):
+    """'2025-08-09' -> '9 สิงหาคม 2568' (Buddhist era); invalid input is returned unchanged"""
+    entry = lookup(date_str)
+    return entry.be if entry else date_str
+
+def format_thai_date_ce(date_str):
+    """'2025-08-09' -> '9 สิงหาคม 2025' (Common era)"""
+    entry = lookup(date_str)
+    return entry.ce if entry else date_str
+
+def format_thai_date_full(date_str):
+    """'2025-08-09' -> 'วันเสาร์ที่ 9 สิงหาคม 2568'"""
+    entry = lookup(date_str)
+    return entry.full if entry else date_str
+
+def format_thai_date_short(date_str):
+    """'2025-08-09' -> '9 ส.ค. 68'"""
+    entry = lookup(date_str)
+    return entry.short if entry else date_str
+
+def relative_day_label(date_str, today=None):
+    """'วันนี้' / 'พรุ่งนี้' / 'มะรืนนี้' / 'เมื่อวาน', or None for other dates"""
+    entry = lookup(date_str)
+    if not entry:
+        return None
+    return RELATIVE_DAYS.get((entry.date - (today or date.today())).days)
+
+def format_thai_date_relative(date_str, today=None):
+    """'9 สิงหาคม 2568 (พรุ่งนี้)' when the date is near today, else the plain BE format"""
+    formatted = format_thai_date(date_str)
+    label = relative_day_label(date_str, today)
+    return f"{formatted} ({label})" if label else formatted
@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+"""
+Conversation state store for LINE Bot
+เก็บสถานะการสนทนา (เมนูค้นหา/เพิ่ม/แก้ไขกิจกรรม) แบบมีวันหมดอายุและจำกัดจำนวน
+
+Works like the dict it replaces (in / [] / []= / del), with limits:
+    - an entry expires USER_STATE_TTL_SECONDS after its last use
+    - past USER_STATE_MAX_ENTRIES the least recently used entry is evicted
+    - a background sweeper drops expired entries every USER_STATE_SWEEP_SECONDS
+States are returned by reference, so handlers keep updating them in place.
+
+Users whose state expired or was evicted are remembered (step only) for
+one more TTL, so their next message can get a "session expired" reply
+instead of being handled as if no flow had started. pop_expired() returns
+that step once; the app only uses it when the message matches no command.
+
+Environment:
+    USER_STATE_TTL_SECONDS=900
+    USER_STATE_MAX_ENTRIES=10000
+    USER_STATE_SWEEP_SECONDS=60
+"""
+
+import logging
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+DEFAULT_TTL = 900
+DEFAULT_MAX_ENTRIES = 10000
+DEFAULT_SWEEP_SECONDS = 60
+
+def deep_sizeof(value):
+    """Approximate bytes held by a state (the dict plus everything it contains)"""
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(deep_sizeof(k) + deep_sizeof(v) for k, v in value.items())
+    elif isinstance(value, (list, tuple, set)):
+        size += sum(deep_sizeof(item) for item in value)
+    return size
+
+class UserStateStore:
+    """Per-user conversation states with TTL, LRU bound and expiry notices"""
+
+    def __init__(self, ttl=DEFAULT_TTL, max_entries=DEFAULT_MAX_ENTRIES, sweep_seconds=DEFAULT_SWEEP_SECONDS,
+                 notice_seconds=None, clock=time.monotonic, logger=None):
+        self.ttl = ttl
+        self.notice_seconds = ttl if notice_seconds is None else notice_seconds  # how long an ended session earns a notice
+        self.max_entries = max_entries
+        self.sweep_seconds = sweep_seconds
+        self.clock = clock
+        self.logger = logger or logging.getLogger(__name__)
+        self._states = OrderedDict()   # user_id -> (expires_at, state), least recently used first
+        self._ended = OrderedDict()    # user_id -> (noticed_until, step) for expired/evicted sessions
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.expired = 0
+        self.evicted = 0
+
+    def _end(self, user_id, state, ended_at):
+        """Forget a state but remember its step for the expiry notice (lock held)"""
+        self._ended.pop(user_id, None)
+        self._ended[user_id] = (ended_at + self.notice_seconds, state.get("step", ""))
+        while len(self._ended) > self.max_entries:
+            self._ended.popitem(last=False)
+
+    def _live(self, user_id, now):
+        """The entry for user_id, expiring it if its time is up (lock held)"""
+        entry = self._states.get(user_id)
+        if entry is not None and entry[0] <= now:
+            del self._states[user_id]
+            self._end(user_id, entry[1], entry[0])
+            self.expired += 1
+            return None
+        return entry
+
+    # ---------- dict interface ----------
+
+    def __contains__(self, user_id):
+        with self._lock:
+            return self._live(user_id, self.clock()) is not None
+
+    def __getitem__(self, user_id):
+        """The state, as a live reference; using it restarts the TTL"""
+        with self._lock:
+            now = self.clock()
+            entry = self._live(user_id, now)
+            if entry is None:
+                raise KeyError(user_id)
+            self._states[user_id] = (now + self.ttl, entry[1])
+            self._states.move_to_end(user_id)
+            return entry[1]
+
+    def get(self, user_id, default=None):
+        try:
+            return self[user_id]
+        except KeyError:
+            return default
+
+    def __setitem__(self, user_id, state):
+        with self._lock:
+            now = self.clock()
+            self._ended.pop(user_id, None)
+            self._states[user_id] = (now + self.ttl, state)
+            self._states.move_to_end(user_id)
+            while len(self._states) > self.max_entries:
+                evicted_id, (_, evicted_state) = self._states.popitem(last=False)
+                self._end(evicted_id, evicted_state, now)
+                self.evicted += 1
+
+    def __delitem__(self, user_id):
+        """Finish a flow; a state the sweeper already removed is not an error"""
+        with self._lock:
+            self._states.pop(user_id, None)
+            self._ended.pop(user_id, None)
+
+    def __len__(self):
+        return len(self._states)
+
+    # ---------- expiry ----------
+
+    def pop_expired(self, user_id):
+        """Step of a session that expired or was evicted since the user's last message, once; else None"""
+        with self._lock:
+            now = self.clock()
+            self._live(user_id, now)  # expire it now if the sweeper has not got to it yet
+            ended = self._ended.pop(user_id, None)
+        if ended is None or ended[0] <= now:
+            return None
+        return ended[1]
+
+    def sweep(self):
+        """Drop expired states and stale expiry notices; returns how many states expired"""
+        with self._lock:
+            now = self.clock()
+            expired = [user_id for user_id, (expires_at, _) in self._states.items() if expires_at <= now]
+            for user_id in expired:
+                expires_at, state = self._states.pop(user_id)
+                self._end(user_id, state, expires_at)
+            self.expired += len(expired)
+            for user_id in [u for u, (until, _) in self._ended.items() if until <= now]:
+                del self._ended[user_id]
+        return len(expired)
+
+    def _run(self):
+        while not self._stop.wait(self.sweep_seconds):
+            try:
+                self.sweep()
+            except Exception as e:
+                self.logger.error(f"Error sweeping user states: {e}")
+
+    def start_sweeper(self):
+        self._thread = threading.Thread(target=self._run, name="user-state-sweeper", daemon=True)
+        self._thread.start()
+        return self._thread
+
+    def stop(self):
+        self._stop.set()
+
+    def stats(self):
+        with self._lock:
+            states = [state for _, state in self._states.values()]
+            pending_notices = len(self._ended)
+        return {
+            "entries": len(states),
+            "bytes": sum(deep_sizeof(state) for state in states),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl,
+            "expired": self.expired,
+            "evicted": self.evicted,
+            "pending_expiry_notices": pending_notices,
+        }
+
+def create_user_state_store_from_env(logger=None):
+    """UserStateStore configured from environment variables, with its sweeper running"""
+    store = UserStateStore(
+        ttl=float(os.getenv('USER_STATE_TTL_SECONDS', DEFAULT_TTL)),
+        max_entries=int(os.getenv('USER_STATE_MAX_ENTRIES', DEFAULT_MAX_ENTRIES)),
+        sweep_seconds=float(os.getenv('USER_STATE_SWEEP_SECONDS', DEFAULT_SWEEP_SECONDS)),
+        logger=logger,
+    )
+    store.start_sweeper()
+    return store